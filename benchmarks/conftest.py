@@ -0,0 +1,83 @@
+"""
+Shared fixtures for the benchmark suite.
+
+Run with:
+    pytest benchmarks/ --scale 1k,100k --benchmark-autosave
+
+Timings come from pytest-benchmark; the peak Python heap of one extra,
+untimed call is attached to each result as extra_info['peak_mb'] so memory
+regressions show up in the saved JSON next to the timings. Compare two saved
+runs with `pytest-benchmark compare`.
+"""
+import tracemalloc
+
+import pytest
+
+from craigsail.synthetic import generate_frame
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--scale', default='1k',
+        help=f'Comma separated listing counts to benchmark at: {", ".join(SCALES)} (default 1k)',
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if 'scale' in metafunc.fixturenames:
+        names = metafunc.config.getoption('scale').split(',')
+        unknown = set(names) - set(SCALES)
+        if unknown:
+            raise pytest.UsageError(f'Unknown --scale value(s) {sorted(unknown)}. Choose from {list(SCALES)}.')
+        metafunc.parametrize('scale', [SCALES[name] for name in names], ids=names, scope='session')
+
+
+_frames = {}
+
+
+@pytest.fixture(scope='session')
+def raw_frame(scale):
+    """
+    Synthetic get_all_daily_postings output at the requested scale. Cached
+    per session; tests must not mutate it.
+    """
+    if scale not in _frames:
+        _frames[scale] = generate_frame(scale, seed=42)
+    return _frames[scale]
+
+
+_peaks = {}
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _peaks:
+        return
+    terminalreporter.section('peak traced memory (MB)')
+    width = max(len(name) for name in _peaks)
+    for name, peak in sorted(_peaks.items(), key=lambda item: item[1], reverse=True):
+        terminalreporter.write_line(f'{name:<{width}}  {peak:>10.2f}')
+
+
+@pytest.fixture
+def run_benchmark(benchmark, request):
+    """
+    Time fn(*args) with pytest-benchmark and record its peak traced memory.
+    Large inputs get fewer rounds so a 1m run finishes in reasonable time.
+    """
+    def run(fn, *args, rounds=5, setup=None):
+        fresh = setup() if setup else args
+        tracemalloc.start()
+        try:
+            fn(*fresh)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['peak_mb'] = _peaks[request.node.name] = round(peak / 1e6, 2)
+
+        if setup:
+            return benchmark.pedantic(fn, setup=lambda: (setup(), {}), rounds=rounds, iterations=1)
+        return benchmark.pedantic(fn, args=args, rounds=rounds, iterations=1)
+
+    return run
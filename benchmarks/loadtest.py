@@ -0,0 +1,172 @@
+"""
+Sustained-load test for the map service.
+
+Builds (or reuses) a synthetic database, starts the service in a subprocess
+and hammers it from a pool of keep-alive client threads for a fixed time,
+then reports requests/sec, latency percentiles and status codes.
+
+    python benchmarks/loadtest.py --rows 100000 --server asgi --concurrency 32
+    python benchmarks/loadtest.py --rows 100000 --server flask   # the dev server, for comparison
+    python benchmarks/loadtest.py --url http://localhost:5001    # an already running service
+
+--cold disables the response cache so every /map request renders from
+sqlite; without it the numbers are mostly cache hits, which is what a busy
+map between sweeps actually sees.
+"""
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from craigsail.db import CraigsailDB  # noqa: E402
+from craigsail.synthetic import generate_frame  # noqa: E402
+
+DEFAULT_PATHS = ['/map?format=binary', '/map', '/categories', '/healthz']
+
+
+def build_database(path, rows):
+    if Path(path).exists():
+        print(f'reusing {path}')
+        return
+    print(f'generating {rows} synthetic listings into {path} ...')
+    started = time.perf_counter()
+    frame = generate_frame(rows, seed=42)
+    CraigsailDB(str(path)).save_listings(frame.drop(columns='attrs'), category='boo')
+    print(f'  done in {time.perf_counter() - started:.1f}s')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, db_path, port, cold):
+    env = dict(os.environ, CRAIGSAIL_DB=str(db_path), PYTHONPATH=str(ROOT))
+    if cold:
+        env['CRAIGSAIL_CACHE_BYTES'] = '0'
+    if kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'web_app.asgi:app',
+                   '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'web_app.app', 'run', '--port', str(port)]
+    process = subprocess.Popen(command, env=env, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/healthz')
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f'{kind} server did not start on port {port}')
+
+
+def client(host, port, paths, until):
+    """
+    One keep-alive connection issuing requests round-robin over paths.
+    """
+    latencies, statuses = [], Counter()
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    index = 0
+    while time.monotonic() < until:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = connection.getresponse()
+            response.read()
+            statuses[response.status] += 1
+        except (OSError, http.client.HTTPException) as exc:
+            statuses[type(exc).__name__] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    return latencies, statuses
+
+
+def run_load(host, port, paths, concurrency, seconds):
+    until = time.monotonic() + seconds
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: client(host, port, paths, until), range(concurrency)))
+
+    latencies = np.array([latency for result, _ in results for latency in result])
+    statuses = sum((result_statuses for _, result_statuses in results), Counter())
+    return latencies, statuses
+
+
+def report(latencies, statuses, seconds, concurrency):
+    print(f'{len(latencies)} requests in {seconds:.0f}s over {concurrency} connections')
+    print(f'  throughput  {len(latencies) / seconds:10.1f} req/s')
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        print(f'  latency     p50 {p50:.1f}ms  p95 {p95:.1f}ms  p99 {p99:.1f}ms  max {latencies.max() * 1000:.1f}ms')
+    print('  statuses    ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)))
+
+
+def get_arguments(argv=None):
+    parser = ArgumentParser(description='Sustained load test for the craigsail map service')
+    parser.add_argument('--url', type=str, default=None,
+                        help='Test an already running service instead of starting one')
+    parser.add_argument('--server', choices=['asgi', 'flask'], default='asgi',
+                        help='Which server to start when --url is not given (default asgi)')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Database to serve; generated if it does not exist')
+    parser.add_argument('--rows', type=int, default=100_000,
+                        help='Synthetic listings to generate (default 100000)')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Concurrent keep-alive connections (default 32)')
+    parser.add_argument('--seconds', type=float, default=20,
+                        help='How long to sustain the load (default 20)')
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS,
+                        help='Request paths, issued round-robin')
+    parser.add_argument('--cold', action='store_true',
+                        help='Disable the response cache so every request renders')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_arguments(argv)
+
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        db_path = args.db or Path(tempfile.gettempdir()) / f'craigsail_load_{args.rows}.db'
+        build_database(db_path, args.rows)
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.server, db_path, port, args.cold)
+
+    try:
+        run_load(host, port, args.paths, min(args.concurrency, 4), 2)  # warm up
+        latencies, statuses = run_load(host, port, args.paths, args.concurrency, args.seconds)
+        report(latencies, statuses, args.seconds, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Full-sweep fetch benchmark against the local craigslist stand-in.
+
+Starts `craigsail fakelist` in a subprocess (or uses one already running),
+points HTTP_PROXY at it and runs an ordinary multi-city search - the real
+python-craigslist fetch path, prep and save - then reports listings/sec,
+per-shard fetch latency and the per-request latency the server measured.
+Nothing leaves the machine.
+
+    python benchmarks/sweeptest.py --cities 16 --listings 250 --fetch-workers 8
+    python benchmarks/sweeptest.py --latency 0.05 --jitter 0.05 --throttle-rate 0.02
+    python benchmarks/sweeptest.py --url http://127.0.0.1:8765   # an already running fakelist
+
+With --nodes N the sweep goes through `craigsail coordinate` instead, with N
+`craigsail worker` subprocesses (each with --fetch-workers threads) standing
+in for separate machines; compare listings/sec across N at a fixed
+--latency to see the sweep scale with node count.
+
+    python benchmarks/sweeptest.py --cities 32 --latency 0.05 --fetch-workers 4 --nodes 4
+"""
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+import http.client
+import io
+import json
+import os
+from pathlib import Path
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from craigsail import cli  # noqa: E402
+from craigsail.cities import SITES  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_stats(host, port):
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request('GET', '/_fakelist/stats')
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def start_fakelist(port, args):
+    command = [
+        sys.executable, '-m', 'craigsail.cli', 'fakelist', '--port', str(port),
+        '--listings', str(args.listings), '--latency', str(args.latency), '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate),
+    ]
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    process = subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            server_stats('127.0.0.1', port)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f'fakelist did not start on port {port}')
+
+
+def start_workers(db_path, data_path, args):
+    command = [
+        sys.executable, '-m', 'craigsail.cli', 'worker', '--db', db_path, '--data_path', data_path,
+        '--fetch-workers', str(args.fetch_workers), '--no-archive', '--poll-seconds', '0.1', '--idle-exit', '5',
+    ]
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return [
+        subprocess.Popen([*command, '--name', f'node{node}'], env=env, cwd=ROOT, stdout=subprocess.DEVNULL)
+        for node in range(args.nodes)
+    ]
+
+
+def run_sweep(proxy, cities, args):
+    """
+    One search over every city through the proxy, or a coordinated sweep
+    over --nodes worker processes. Returns (seconds, exit code, per-shard
+    fetch stage rows from the run log).
+    """
+    os.environ.update(HTTP_PROXY=proxy, http_proxy=proxy, NO_PROXY='', no_proxy='')
+    data_path = tempfile.mkdtemp(prefix='craigsail_sweep_')
+    db_path = str(Path(data_path) / 'craigsail.db')
+    argv = ['--search_category', args.category, '--cities', *cities, '--data_path', data_path]
+    if args.nodes:
+        argv = ['coordinate', *argv, '--poll-seconds', '0.1']
+        workers = start_workers(db_path, data_path, args)
+    else:
+        argv += ['--fetch-workers', str(args.fetch_workers), '--no-archive']
+        workers = []
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        code = cli.main(argv)
+    seconds = time.perf_counter() - started
+    # Workers log their fetch stages when they exit.
+    for worker in workers:
+        worker.wait()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        shards = conn.execute("SELECT city, seconds, rows FROM run_stages WHERE stage = 'fetch'").fetchall()
+    finally:
+        conn.close()
+    return seconds, code, shards
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return f'p50 {p50:.1f}ms  p95 {p95:.1f}ms  p99 {p99:.1f}ms  max {max(values) * 1000:.1f}ms'
+
+
+def report(seconds, code, shards, stats, cities):
+    listings = sum(rows or 0 for _, _, rows in shards)
+    print(f'{listings} listings from {len(shards)} of {len(cities)} shards in {seconds:.1f}s (exit {code})')
+    print(f'  throughput  {listings / seconds:10.1f} listings/s')
+    if shards:
+        print(f'  shard fetch {percentiles([shard_seconds for _, shard_seconds, _ in shards])}')
+    if stats['latencies']:
+        print(f'  request     {percentiles(stats["latencies"])}  ({stats["requests"]} requests)')
+    print('  statuses    ' + ', '.join(f'{status}: {count}' for status, count in sorted(stats['statuses'].items())))
+
+
+def get_arguments(argv=None):
+    parser = ArgumentParser(description='Multi-city sweep benchmark against a local fake craigslist')
+    parser.add_argument('--url', type=str, default=None,
+                        help='Use an already running `craigsail fakelist` instead of starting one')
+    parser.add_argument('--category', type=str, default='boo',
+                        help='Category code to sweep (default boo)')
+    parser.add_argument('--cities', type=int, default=16,
+                        help='Sweep the first N bundled sites (default 16)')
+    parser.add_argument('--fetch-workers', type=int, default=8,
+                        help='Shards fetched concurrently, per node with --nodes (default 8)')
+    parser.add_argument('--nodes', type=int, default=0,
+                        help='Sweep through `craigsail coordinate` and this many worker processes '
+                             '(default 0: one ordinary search)')
+    parser.add_argument('--listings', type=int, default=250,
+                        help='Results per shard when starting the server (default 250)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Server latency per request in seconds (default 0)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Mean exponential extra latency in seconds (default 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered 503 (default 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of requests answered 429 (default 0)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_arguments(argv)
+    cities = list(SITES)[:args.cities]
+
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        process = start_fakelist(port, args)
+
+    try:
+        seconds, code, shards = run_sweep(f'http://{host}:{port}', cities, args)
+        report(seconds, code, shards, server_stats(host, port), cities)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Comparable listings: building the index over a category, and one query
+against a built index.
+"""
+import itertools
+
+import pytest
+
+from craigsail.db import CraigsailDB
+from craigsail.search import Boats
+
+
+@pytest.fixture(scope='module')
+def boats_db(tmp_path_factory, raw_frame):
+    db = CraigsailDB(str(tmp_path_factory.mktemp('bench') / 'comparables.db'))
+    search = Boats(search_category='boo', data_path=str(tmp_path_factory.mktemp('data')))
+    db.save_listings(search.prep_results(raw_frame), category='boo')
+    db.refresh_features('boo')
+    return db
+
+
+def test_build_comparables_index(run_benchmark, boats_db):
+    def build():
+        # A fresh index each round, so the whole category is loaded.
+        boats_db.comparables_indexes.clear()
+        return boats_db.comparables_index('boo')
+
+    run_benchmark(build, rounds=3)
+
+
+def test_comparables_query(run_benchmark, boats_db, raw_frame):
+    listing_ids = itertools.cycle(raw_frame['id'].astype(str).tolist())
+    boats_db.comparables(next(listing_ids))
+
+    run_benchmark(lambda: boats_db.comparables(next(listing_ids), k=20), rounds=50)
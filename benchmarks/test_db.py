@@ -0,0 +1,68 @@
+"""
+SQLite persistence: record building, upserts and the price-drop query.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+
+import numpy as np
+import pytest
+
+from craigsail.db import CraigsailDB
+from craigsail.ingest import IngestWriter
+
+_counter = itertools.count()
+
+
+def fresh_db(tmp_path):
+    return CraigsailDB(str(tmp_path / f'bench_{next(_counter)}.db'))
+
+
+@pytest.fixture(scope='module')
+def frame(raw_frame):
+    return raw_frame.drop(columns='attrs')
+
+
+@pytest.fixture(scope='module')
+def loaded_db(tmp_path_factory, frame):
+    db = CraigsailDB(str(tmp_path_factory.mktemp('bench') / 'loaded.db'))
+    db.save_listings(frame, category='boo')
+    # Knock 10% of prices down so price_drops has something to return.
+    with db.connect() as conn:
+        conn.execute('UPDATE listings SET price = price * 0.9 WHERE rowid % 10 = 0')
+    return db
+
+
+def test_to_records(run_benchmark, tmp_path, frame):
+    db = fresh_db(tmp_path)
+    run_benchmark(db._to_records, frame, 'boo', rounds=3)
+
+
+def test_save_listings_insert(run_benchmark, tmp_path, frame):
+    run_benchmark(lambda db: db.save_listings(frame, category='boo'),
+                  setup=lambda: (fresh_db(tmp_path),), rounds=3)
+
+
+def test_save_listings_unchanged_rerun(run_benchmark, loaded_db, frame):
+    run_benchmark(loaded_db.save_listings, frame, 'boo', rounds=3)
+
+
+@pytest.mark.parametrize('via', ['direct', 'writer'])
+def test_concurrent_shard_saves(run_benchmark, tmp_path, frame, via):
+    # Eight fetch threads landing their shards at once: each calling
+    # save_listings itself, or all feeding one IngestWriter.
+    shards = [frame.iloc[rows] for rows in np.array_split(np.arange(len(frame)), 8)]
+
+    def direct(db):
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda shard: db.save_listings(shard, category='boo'), shards))
+
+    def writer(db):
+        with IngestWriter(db) as ingest, ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda shard: ingest.put(shard, 'boo'), shards))
+
+    run_benchmark(direct if via == 'direct' else writer,
+                  setup=lambda: (fresh_db(tmp_path),), rounds=3)
+
+
+def test_price_drops(run_benchmark, loaded_db):
+    run_benchmark(loaded_db.price_drops)
@@ -0,0 +1,55 @@
+"""
+Attribute expansion and Boats cleaning - the pandas side of a sweep.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from craigsail.extract import extract_fields
+from craigsail.search import Boats
+
+
+@pytest.fixture(scope='module')
+def boats():
+    return Boats(search_category='boo', data_path='benchmarks-data')
+
+
+@pytest.fixture(scope='module')
+def expanded(boats, raw_frame):
+    attribute_df = boats.expand_all_attributes(raw_frame['attrs'])
+    return pd.concat([raw_frame, attribute_df], axis=1).drop('attrs', axis=1)
+
+
+def test_expand_all_attributes(run_benchmark, boats, raw_frame):
+    run_benchmark(boats.expand_all_attributes, raw_frame['attrs'], rounds=3)
+
+
+def test_long_attributes(run_benchmark, boats, raw_frame):
+    # The long-form alternative to expand_all_attributes; compare peak_mb.
+    run_benchmark(boats.long_attributes, raw_frame['attrs'], rounds=3)
+
+
+def test_extract_fields(run_benchmark, boats, raw_frame):
+    # Every extracted column starts empty, so each one is looked for.
+    run_benchmark(extract_fields, raw_frame, 'boo', Boats.TEXT_EXTRACTS, rounds=3)
+
+
+def test_combine_city_sailboats_data(run_benchmark, boats, expanded):
+    run_benchmark(boats.combine_city_sailboats_data, expanded)
+
+
+def test_clean_city_sailboats_data(run_benchmark, boats, expanded):
+    combined = boats.combine_city_sailboats_data(expanded)
+    # clean mutates its input, so every round gets a fresh copy.
+    run_benchmark(boats.clean_city_sailboats_data, setup=lambda: (combined.copy(),))
+
+
+def test_strip_nan_columns(run_benchmark, boats, expanded):
+    run_benchmark(boats.strip_nan_columns, expanded)
+
+
+@pytest.mark.parametrize('workers', [1, os.cpu_count() or 1], ids=lambda workers: f'{workers}w')
+def test_prep_frame(run_benchmark, boats, raw_frame, workers):
+    # Sweeps under MIN_PARALLEL_ROWS always run in-process, so compare at --scale 10k and up.
+    run_benchmark(boats.prep_frame, raw_frame, workers, rounds=1)
@@ -0,0 +1,28 @@
+"""
+The /map endpoint end to end through the Flask test client.
+"""
+import pytest
+
+from craigsail.db import CraigsailDB
+from web_app.app import create_app
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory, raw_frame):
+    db_path = tmp_path_factory.mktemp('bench_web') / 'craigsail.db'
+    CraigsailDB(str(db_path)).save_listings(raw_frame.drop(columns='attrs'), category='boo')
+    return create_app(db_path=str(db_path)).test_client()
+
+
+@pytest.mark.parametrize('encoding', ['json', 'columnar', 'binary'])
+def test_map(run_benchmark, client, encoding):
+    cache = client.application.extensions['craigsail_cache']
+
+    def get_map():
+        # Clear the response cache so each round renders the payload.
+        cache.clear()
+        response = client.get('/map', query_string={'format': encoding})
+        assert response.status_code == 200
+        return response
+
+    run_benchmark(get_map)
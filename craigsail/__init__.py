@@ -3,6 +3,7 @@ Craigsail
 multi-city craigslist search and asset price tracking.
 """
 from .search import Search, Boats, Bikes, RVs, Properties
+from .categories import CATEGORIES
 from .db import CraigsailDB
 
-__all__ = ['Search', 'Boats', 'Bikes', 'RVs', 'Properties', 'CraigsailDB']
+__all__ = ['Search', 'Boats', 'Bikes', 'RVs', 'Properties', 'CATEGORIES', 'CraigsailDB']
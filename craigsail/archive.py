@@ -0,0 +1,198 @@
+"""
+Archive of raw craigslist results.
+
+Every batch get_city_items fetches is appended, before any cleaning, to
+
+    <root>/<category>/<YYYY-MM-DD>/<city>.jsonl.zst
+
+(.jsonl.gz when zstandard is not installed) as one JSON line per result:
+{"fetched": <ISO timestamp>, "result": {...}}. Each append is a complete
+zstd frame or gzip member, and both formats read concatenated frames back
+as one stream, so a partition file is only ever appended to.
+
+`craigsail reprocess` (see reprocess) streams partitions back through the
+current prep_results and save_listings. Improved cleaning then reaches past
+data without another scrape.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import io
+import json
+from pathlib import Path
+import threading
+
+import pandas as pd
+
+from .categories import CATEGORIES
+from .db import SaveResult, _load_zstd
+from .ingest import IngestWriter
+from .search import Search
+
+SUFFIXES = {'zst': '.jsonl.zst', 'gz': '.jsonl.gz'}
+
+Partition = namedtuple('Partition', 'category day city path')
+
+
+class RawArchive:
+    """
+    Append-only, date-partitioned store of raw result batches.
+
+    Usage:
+        archive = RawArchive('data/raw')
+        archive.append('boo', 'sfbay', results)
+        for partition in archive.partitions(since='2026-01-01'):
+            for fetched, result in archive.read(partition.path):
+                ...
+    """
+
+    def __init__(self, root, codec=None):
+        """
+        codec is 'zst' or 'gz'; by default zst when zstandard is installed.
+        Reading handles either, whatever the archive writes.
+        """
+        self.root = Path(root)
+        self.codec = codec or ('zst' if _load_zstd() else 'gz')
+        assert self.codec in SUFFIXES, f'codec must be one of {sorted(SUFFIXES)}. Got {self.codec!r}.'
+        # Fetch threads for different shards can land on the same file.
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Searches are pickled into prep pools; the lock cannot travel.
+        return {'root': self.root, 'codec': self.codec}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def append(self, category, city, results, fetched=None):
+        """
+        Append one batch of raw result dicts. Returns the partition path,
+        or None for an empty batch.
+        """
+        if not results:
+            return None
+
+        fetched = pd.Timestamp(fetched) if fetched is not None else pd.Timestamp.now('UTC')
+        path = self.root.joinpath(category, fetched.strftime('%Y-%m-%d'), city + SUFFIXES[self.codec])
+        stamp = fetched.isoformat()
+        lines = ''.join(
+            json.dumps({'fetched': stamp, 'result': result}, default=str) + '\n'
+            for result in results
+        ).encode('utf-8')
+
+        if self.codec == 'zst':
+            data = _load_zstd().ZstdCompressor().compress(lines)
+        else:
+            data = gzip.compress(lines)
+
+        with self.lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'ab') as handle:
+                handle.write(data)
+        return path
+
+    def partitions(self, since=None, until=None, categories=None):
+        """
+        Partitions whose day falls in [since, until], oldest day first.
+        """
+        since = pd.Timestamp(since).strftime('%Y-%m-%d') if since is not None else ''
+        until = pd.Timestamp(until).strftime('%Y-%m-%d') if until is not None else '9999-12-31'
+
+        found = []
+        for suffix in SUFFIXES.values():
+            for path in self.root.glob(f'*/*/*{suffix}'):
+                category, day = path.parent.parent.name, path.parent.name
+                if since <= day <= until and (not categories or category in categories):
+                    found.append(Partition(category, day, path.name[:-len(suffix)], path))
+        return sorted(found, key=lambda partition: (partition.day, partition.category, partition.city))
+
+    @staticmethod
+    def read(path):
+        """
+        Yield (fetched, result) for every line of a partition file.
+        """
+        path = Path(path)
+        with open(path, 'rb') as raw:
+            if path.name.endswith(SUFFIXES['zst']):
+                zstd = _load_zstd()
+                if not zstd:
+                    raise RuntimeError(f'{path} is zstd compressed; install the zstd extra to read it.')
+                stream = zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            else:
+                stream = gzip.GzipFile(fileobj=raw)
+
+            for line in io.TextIOWrapper(stream, encoding='utf-8'):
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry['fetched'], entry['result']
+
+
+def prep_partition(partition, data_path='.'):
+    """
+    Read a partition and run each fetched batch in it through the
+    category's current prep. Returns [(fetched, prepped frame)] in the order
+    the batches were appended. Runs in a reprocess worker process.
+    """
+    batches = {}
+    for fetched, result in RawArchive.read(partition.path):
+        batches.setdefault(fetched, []).append(result)
+
+    search = CATEGORIES.get(partition.category, Search)(search_category=partition.category, data_path=data_path)
+    return [
+        (fetched, search.prep_results(search.convert_city_dict_to_df(partition.city, results)))
+        for fetched, results in batches.items()
+    ]
+
+
+def prepped_in_order(pool, partitions, window):
+    """
+    Yield (partition, prep_partition(partition)) in partition order, with
+    at most `window` partitions submitted to pool and not yet consumed, so
+    prepped frames cannot pile up ahead of a slow writer.
+    """
+    partitions = iter(partitions)
+    in_flight = deque()
+
+    def submit():
+        partition = next(partitions, None)
+        if partition is not None:
+            in_flight.append((partition, pool.submit(prep_partition, partition)))
+
+    for _ in range(window):
+        submit()
+    while in_flight:
+        partition, future = in_flight.popleft()
+        batches = future.result()
+        submit()
+        yield partition, batches
+
+
+def reprocess(archive, db, since=None, until=None, categories=None, workers=None):
+    """
+    Replay archived partitions through prep_results and save_listings,
+    oldest first. Partitions are read and prepped in a pool of workers
+    processes, at most two per worker ahead of the writer, and every write
+    goes through one IngestWriter. Nothing is fetched and nothing is
+    delisted.
+
+    Returns (partitions reprocessed, SaveResult).
+    """
+    partitions = archive.partitions(since=since, until=until, categories=categories)
+    if not partitions:
+        return 0, SaveResult()
+
+    with IngestWriter(db) as writer:
+        if workers and workers > 1 and len(partitions) > 1:
+            workers = min(workers, len(partitions))
+            with ProcessPoolExecutor(workers) as pool:
+                # In partition order, so replays stay oldest first.
+                for partition, batches in prepped_in_order(pool, partitions, window=workers * 2):
+                    for fetched, df in batches:
+                        writer.put(df, partition.category, observed=fetched)
+        else:
+            for partition in partitions:
+                for fetched, df in prep_partition(partition):
+                    writer.put(df, partition.category, observed=fetched)
+
+    return len(partitions), writer.result
@@ -0,0 +1,132 @@
+"""
+Registry of search categories.
+
+A category is a Search subclass that declares its CATEGORY_CODE,
+COLUMN_ALIASES, PROMOTED_ATTRIBUTES and COLUMN_TYPES (see Search), and
+optionally the TEXT_EXTRACTS filled in from listing text and the
+COMPARABLE_FEATURES and COMPARABLE_LABELS comparables are matched on.
+The CLI looks the --search_category code up here and runs the class's
+vectorised prep_results between fetch and save_listings, so a new
+category gets typed ingest without any change to cli.py.
+
+The built-in categories live in craigsail.search. Other packages add
+categories through an entry point named after the category code:
+
+    [project.entry-points."craigsail.categories"]
+    mca = "mypackage.motorcycles:Motorcycles"
+
+A plugin registered under a built-in code replaces the built-in.
+"""
+from collections.abc import Mapping
+from importlib.metadata import entry_points
+import warnings
+
+from .extract import EXTRACTORS
+from .search import COLUMN_CONVERTERS, Bikes, Boats, Properties, RVs, Search
+
+ENTRY_POINT_GROUP = 'craigsail.categories'
+
+# COLUMN_TYPES a COMPARABLE_FEATURES column may have.
+NUMERIC_TYPES = {'float', 'int', 'year'}
+
+
+def validate_category(cls):
+    """
+    Raise TypeError/ValueError unless cls is a usable category class.
+    """
+    if not (isinstance(cls, type) and issubclass(cls, Search)):
+        raise TypeError(f'A category must be a Search subclass. Got {cls!r}.')
+    if not isinstance(cls.CATEGORY_CODE, str) or not cls.CATEGORY_CODE:
+        raise ValueError(f'{cls.__name__} does not declare a CATEGORY_CODE.')
+
+    unknown_types = set(cls.COLUMN_TYPES.values()) - set(COLUMN_CONVERTERS)
+    if unknown_types:
+        raise ValueError(
+            f'{cls.__name__}.COLUMN_TYPES uses unknown type(s) {sorted(unknown_types)}. '
+            f'Choose from {sorted(COLUMN_CONVERTERS)}.'
+        )
+    not_canonical = set(cls.PROMOTED_ATTRIBUTES) & set(cls.COLUMN_ALIASES)
+    if not_canonical:
+        raise ValueError(
+            f'{cls.__name__}.PROMOTED_ATTRIBUTES lists aliases {sorted(not_canonical)}; '
+            'promote the canonical names instead.'
+        )
+    unknown_extracts = set(cls.TEXT_EXTRACTS.values()) - EXTRACTORS
+    if unknown_extracts:
+        raise ValueError(
+            f'{cls.__name__}.TEXT_EXTRACTS uses unknown extractor(s) {sorted(unknown_extracts)}. '
+            f'Choose from {sorted(EXTRACTORS)}.'
+        )
+    not_numeric = {
+        column for column in cls.COMPARABLE_FEATURES
+        if cls.COLUMN_TYPES.get(column) not in NUMERIC_TYPES
+    }
+    if not_numeric:
+        raise ValueError(
+            f'{cls.__name__}.COMPARABLE_FEATURES names {sorted(not_numeric)}, which '
+            f'COLUMN_TYPES does not type as one of {sorted(NUMERIC_TYPES)}.'
+        )
+    untyped_labels = set(cls.COMPARABLE_LABELS) - set(cls.COLUMN_TYPES)
+    if untyped_labels:
+        raise ValueError(f'{cls.__name__}.COMPARABLE_LABELS names untyped columns {sorted(untyped_labels)}.')
+
+
+class CategoryRegistry(Mapping):
+    """
+    Category code -> Search subclass. Entry point plugins are loaded the
+    first time the registry is read.
+
+    Usage:
+        CATEGORIES['boo']                  # Boats
+        CATEGORIES.get('zip', Search)      # anything unregistered
+        CATEGORIES.register(Motorcycles)   # or use it as a class decorator
+    """
+
+    def __init__(self, classes=(), group=ENTRY_POINT_GROUP):
+        self.group = group
+        self.classes = {}
+        self.discovered = group is None
+        for cls in classes:
+            self.register(cls)
+
+    def register(self, cls):
+        validate_category(cls)
+        self.classes[cls.CATEGORY_CODE] = cls
+        return cls
+
+    def discover(self):
+        """
+        Load the entry point plugins once. A broken plugin is skipped with
+        a warning rather than taking every other category down with it.
+        """
+        if self.discovered:
+            return
+        self.discovered = True
+
+        for entry_point in entry_points(group=self.group):
+            try:
+                cls = entry_point.load()
+                validate_category(cls)
+                if cls.CATEGORY_CODE != entry_point.name:
+                    raise ValueError(
+                        f'entry point name does not match CATEGORY_CODE {cls.CATEGORY_CODE!r}'
+                    )
+            except Exception as exc:
+                warnings.warn(f'Skipping category plugin {entry_point.name!r}: {exc}')
+                continue
+            self.classes[cls.CATEGORY_CODE] = cls
+
+    def __getitem__(self, code):
+        self.discover()
+        return self.classes[code]
+
+    def __iter__(self):
+        self.discover()
+        return iter(self.classes)
+
+    def __len__(self):
+        self.discover()
+        return len(self.classes)
+
+
+CATEGORIES = CategoryRegistry([Boats, Bikes, RVs, Properties])
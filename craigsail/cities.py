@@ -0,0 +1,151 @@
+"""
+Bundled registry of craigslist sites.
+
+craigsail/data/sites.csv maps every US site slug (sfbay) to its display
+name (san francisco bay area), state and an approximate centre. The CLI
+uses it to pick cities by state or by distance (--state, --near and
+--radius-km), and Search.validate_cities(strict=True) checks slugs against
+it without a network round trip. A site craigslist lists under two states
+appears once, under the state it is named after.
+
+Radius lookups go through a grid index of GRID_DEGREES cells, so a query
+only measures the sites in the cells its bounding box covers.
+"""
+from collections import namedtuple
+from collections.abc import Mapping
+import csv
+from importlib.resources import files
+import io
+import math
+from pathlib import Path
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cell size for the spatial index. A 50km radius touches at most a
+# handful of one-degree cells.
+GRID_DEGREES = 1.0
+
+Site = namedtuple('Site', 'slug name state latitude longitude')
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km between two (lat, lon) points.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(latitude, longitude):
+    return math.floor(latitude / GRID_DEGREES), math.floor(longitude / GRID_DEGREES)
+
+
+class CityRegistry(Mapping):
+    """
+    Site slug -> Site, with lookups by display name, state and distance.
+
+    Usage:
+        SITES['sfbay'].name                         # 'san francisco bay area'
+        SITES.in_state('oregon')                    # [Site(...), ...]
+        SITES.near(37.8, -122.4, radius_km=150)     # [(Site, km), ...] nearest first
+    """
+
+    def __init__(self, sites=()):
+        self.sites = {}
+        self.by_state = {}
+        self.by_name = {}
+        self.grid = {}
+        for site in sites:
+            self.add(site)
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Read a registry CSV (slug, name, state, latitude, longitude). The
+        bundled craigsail/data/sites.csv by default.
+        """
+        source = files('craigsail').joinpath('data', 'sites.csv') if path is None else Path(path)
+        rows = csv.DictReader(io.StringIO(source.read_text(encoding='utf-8')))
+        return cls(
+            Site(row['slug'], row['name'], row['state'], float(row['latitude']), float(row['longitude']))
+            for row in rows
+        )
+
+    def add(self, site):
+        if site.slug in self.sites:
+            raise ValueError(f'Duplicate craigslist site {site.slug!r}.')
+        self.sites[site.slug] = site
+        self.by_state.setdefault(site.state.lower(), []).append(site)
+        self.by_name.setdefault(site.name.lower(), []).append(site)
+        self.grid.setdefault(_cell(site.latitude, site.longitude), []).append(site)
+
+    def __getitem__(self, slug):
+        return self.sites[slug]
+
+    def __iter__(self):
+        return iter(self.sites)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def states(self):
+        return sorted({site.state for site in self.sites.values()})
+
+    def in_state(self, state):
+        """
+        Sites in a state, by its name as in globals.CRAIGSLIST_CITIES
+        (case-insensitive). Raises ValueError for an unknown state.
+        """
+        try:
+            return list(self.by_state[state.strip().lower()])
+        except KeyError:
+            raise ValueError(f'Unknown state {state!r}. Choose from {self.states()}.') from None
+
+    def named(self, name):
+        """
+        Sites with this display name, e.g. 'portland'. Several states can
+        share one ('springfield', 'jackson').
+        """
+        return list(self.by_name.get(name.strip().lower(), []))
+
+    def near(self, latitude, longitude, radius_km):
+        """
+        (Site, distance km) for every site whose centre is within radius_km,
+        nearest first.
+        """
+        assert radius_km >= 0, f'radius_km must not be negative. Got {radius_km}.'
+
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        # Longitude degrees shrink towards the poles; cap near them.
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_span, 89.0))), 1e-6)
+        lon_span = min(lat_span / cos_lat, 180.0)
+
+        low_row, low_col = _cell(latitude - lat_span, longitude - lon_span)
+        high_row, high_col = _cell(latitude + lat_span, longitude + lon_span)
+        columns = range(low_col, high_col + 1)
+        if high_col - low_col >= 360 / GRID_DEGREES:
+            columns = range(math.floor(-180 / GRID_DEGREES), math.ceil(180 / GRID_DEGREES))
+
+        found = []
+        for row in range(low_row, high_row + 1):
+            for column in columns:
+                # Wrap across the antimeridian.
+                wrapped = (column * GRID_DEGREES + 180) % 360 - 180
+                for site in self.grid.get((row, math.floor(wrapped / GRID_DEGREES)), ()):
+                    distance = haversine_km(latitude, longitude, site.latitude, site.longitude)
+                    if distance <= radius_km:
+                        found.append((site, distance))
+        return sorted(found, key=lambda pair: pair[1])
+
+    def unknown(self, slugs):
+        """
+        The slugs that are not in the registry, sorted.
+        """
+        return sorted(set(slugs) - set(self.sites))
+
+
+SITES = CityRegistry.load()
@@ -1,35 +1,114 @@
 """
 Command line entry point for craigsail.
+
+A search sweeps every (category, city) shard - from --search_category and
+--cities, or from a --config file - through one shared pool of fetch
+threads. Each fetch thread preps its shard and hands the rows to one
+ingest.IngestWriter, so there is a single sqlite writer, fetching never
+waits on the database lock, and the wall-clock time tracks the slowest
+shard rather than the sum of them.
+
+With --max-age, a shard swept with the same filters within that window is
+answered from the database instead of craigslist.
+
+Listings are scored against each category's deal model as they are saved.
+A search refits a model once it is older than --refit-after; `craigsail
+rescore` refits on demand (from cron, say).
+
+`craigsail coordinate` plans the same sweep as work items that `craigsail
+worker` processes on other nodes claim and fetch, while the coordinator
+remains the one writer (see craigsail.coordinator).
+
+`craigsail fakelist` serves a local stand-in for craigslist (see
+craigsail.fakelist) to load test fetching against.
 """
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+from pathlib import Path
+import re
 import sys
-from argparse import ArgumentParser
+import time
+from argparse import ArgumentParser, ArgumentTypeError
 
-from .db import CraigsailDB
-from .search import Search, Boats, Bikes, RVs, Properties
+import pandas as pd
 
-# Categories with dedicated parsing/cleaning subclasses.
-CATEGORY_CLASSES = {
-    'boo': Boats,
-    'bia': Bikes,
-    'rva': RVs,
-}
+from .categories import CATEGORIES
+from .cities import SITES
+from .db import CraigsailDB, SaveResult
+from .archive import RawArchive, reprocess
+from .coordinator import LEASE_SECONDS, MAX_ATTEMPTS, OPEN_STATES, Worker, WorkQueue
+from .fakelist import FakeCraigslist
+from .ingest import IngestWriter
+from .instrument import RunMetrics, profiled
+from .search import Search
 
+# Category code -> Search subclass, including entry point plugins. Codes
+# not in the registry fall back to the generic Search.
+CATEGORY_CLASSES = CATEGORIES
 
-def get_arguments(argv=None):
-    parser = ArgumentParser(description='Craigsail multi-city search and asset price tracking')
-    parser.add_argument('--search_category', type=str, required=True,
-                        help='Craigslist category code, e.g. boo (boats), bia (bikes), rva (RVs)')
-    parser.add_argument('--data_path', type=str, required=True,
+
+def add_sweep_arguments(parser):
+    """
+    The arguments that say what a sweep covers and where it is stored,
+    shared by a search and `craigsail coordinate`.
+    """
+    parser.add_argument('--search_category', nargs='+', default=None,
+                        help='Craigslist category code(s), e.g. boo (boats), bia (bikes), rva (RVs), '
+                             'rea (real estate), or one added by a plugin')
+    parser.add_argument('--data_path', type=str, default=None,
                         help='Directory to save data into')
-    parser.add_argument('--cities', nargs='+', required=True,
+    parser.add_argument('--cities', nargs='+', default=None,
                         help='Craigslist site slugs, e.g. sfbay seattle newyork')
+    parser.add_argument('--state', nargs='+', default=None,
+                        help='Also sweep every site in these states, e.g. California "New York"')
+    parser.add_argument('--near', type=parse_point, default=None, metavar='LAT,LON',
+                        help='Also sweep every site within --radius-km of this point')
+    parser.add_argument('--radius-km', type=float, default=100.0,
+                        help='Radius for --near (default 100)')
+    parser.add_argument('--config', type=str, default=None,
+                        help='JSON sweep config with categories, cities, filters and paths; '
+                             'command line flags override its top-level values')
     parser.add_argument('--filters', nargs='*', default=[],
                         help='Optional filters as key=value pairs, e.g. max_price=5000')
     parser.add_argument('--db', type=str, default=None,
                         help='Path to the sqlite database. Defaults to <data_path>/craigsail.db')
+    parser.add_argument('--max-age', type=parse_age, default=None,
+                        help='Answer shards swept with the same filters within this long '
+                             '(e.g. 15min, 2h, 1d) from the database; scrape the rest')
+    parser.add_argument('--refit-after', type=parse_age, default='1d',
+                        help='Refit a category\'s deal model after the search once it is older '
+                             'than this (default 1d)')
+    return parser
+
+
+def check_sweep_arguments(parser, args):
+    has_cities = args.cities or args.state or args.near
+    if args.config is None and not (args.search_category and has_cities and args.data_path):
+        parser.error('--search_category, --data_path and one of --cities, --state or --near '
+                     'are required without --config')
+    return args
+
+
+def get_arguments(argv=None):
+    parser = add_sweep_arguments(ArgumentParser(description='Craigsail multi-city search and asset price tracking'))
+    parser.add_argument('--fetch-workers', type=int, default=8,
+                        help='Shards fetched concurrently (default 8)')
     parser.add_argument('--csv', action='store_true',
                         help='Also write a dated CSV snapshot alongside the database')
-    return parser.parse_args(argv)
+    parser.add_argument('--archive-dir', type=str, default=None,
+                        help='Append raw results here for `craigsail reprocess`. Defaults to <data_path>/raw')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='Do not keep the raw results')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Prep large sweeps in this many processes (default: in-process)')
+    parser.add_argument('--profile', choices=['json', 'log'], default=None,
+                        help='Report per-stage timings: json prints a summary at the end, '
+                             'log streams one JSON line per stage to stderr')
+    parser.add_argument('--profile-dump', type=str, default=None,
+                        help='Write a cProfile stats file here (or pyinstrument HTML for a .html path)')
+    return check_sweep_arguments(parser, parser.parse_args(argv))
 
 
 def parse_filters(filter_args):
@@ -55,39 +134,622 @@ def parse_filters(filter_args):
     return filters
 
 
+def parse_point(value):
+    """
+    argparse type for --near: "LAT,LON" in decimal degrees.
+    """
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ArgumentTypeError(f'{value!r} is not LAT,LON, e.g. 37.8,-122.4') from None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ArgumentTypeError(f'{value!r} is not a point on earth')
+    return latitude, longitude
+
+
+def select_cities(args, config_cities=None):
+    """
+    The site slugs named by --cities (or the config), --state and --near,
+    in that order, without repeats.
+    """
+    cities = list(args.cities or config_cities or [])
+    for state in args.state or []:
+        cities.extend(site.slug for site in SITES.in_state(state))
+    if args.near is not None:
+        cities.extend(site.slug for site, _ in SITES.near(*args.near, args.radius_km))
+    return list(dict.fromkeys(cities))
+
+
+def parse_age(value):
+    """
+    argparse type for --max-age and --refit-after: a pandas Timedelta
+    string such as 15min, 2h or 1d, or a bare number of seconds.
+    """
+    value = re.sub(r'(\d)d$', r'\1D', value.strip())  # pandas deprecates a lowercase day unit
+    try:
+        age = pd.Timedelta(float(value), unit='s') if value.replace('.', '', 1).isdigit() else pd.Timedelta(value)
+    except ValueError:
+        raise ArgumentTypeError(f'{value!r} is not a duration, e.g. 15min, 2h or 1d') from None
+    if pd.isna(age) or age < pd.Timedelta(0):
+        raise ArgumentTypeError(f'{value!r} is not a duration, e.g. 15min, 2h or 1d')
+    return age
+
+
+def compact(argv=None):
+    """
+    `craigsail compact` - roll up old price history in place.
+    """
+    parser = ArgumentParser(prog='craigsail compact',
+                            description='Fold old price history into daily/weekly summaries')
+    parser.add_argument('--db', type=str, required=True,
+                        help='Path to the sqlite database')
+    parser.add_argument('--keep-days', type=int, default=90,
+                        help='Keep full resolution for this many days (default 90)')
+    parser.add_argument('--weekly-after-days', type=int, default=365,
+                        help='Collapse to weekly instead of daily past this age (default 365)')
+    parser.add_argument('--archive-dir', type=str, default=None,
+                        help='Move the history of delisted listings here as gzipped JSONL')
+    parser.add_argument('--keep-changes-days', type=int, default=7,
+                        help='Keep the /map/stream change feed for this many days (default 7)')
+    args = parser.parse_args(argv)
+
+    if args.weekly_after_days < args.keep_days:
+        print('error: --weekly-after-days must not be less than --keep-days', file=sys.stderr)
+        return 2
+
+    db = CraigsailDB(args.db)
+    stats = db.compact_price_history(
+        keep_days=args.keep_days,
+        weekly_after_days=args.weekly_after_days,
+        archive_dir=args.archive_dir,
+    )
+    pruned = db.prune_changes(keep_days=args.keep_changes_days)
+    print(
+        f'{args.db}: {stats["deleted"]} observations removed, '
+        f'{stats["daily_rollups"]} daily and {stats["weekly_rollups"]} weekly rollups written, '
+        f'{stats["archived"]} archived, {pruned} change feed rows pruned.'
+    )
+    return 0
+
+
+def refit_deal_models(db, categories, older_than=None):
+    """
+    Refit the deal model of each category whose model is missing or was
+    fit more than older_than ago (every category when older_than is None).
+    Yields (category, model) per refit; model is None when the category
+    has too few priced listings to fit.
+    """
+    now = pd.Timestamp.now('UTC')
+    for category in categories:
+        fitted = db.deal_model_fitted(category)
+        if older_than is None or fitted is None or now - fitted > older_than:
+            yield category, db.fit_deal_model(category, now=now)
+
+
+def rescore(argv=None):
+    """
+    `craigsail rescore` - backfill comparable features, refit deal models
+    and rescore every listing.
+    """
+    parser = ArgumentParser(prog='craigsail rescore',
+                            description='Backfill comparable features, refit per-category deal models '
+                                        'and rescore stored listings')
+    parser.add_argument('--db', type=str, required=True,
+                        help='Path to the sqlite database')
+    parser.add_argument('--search_category', nargs='+', default=None,
+                        help='Only these category codes (default: every category in the database)')
+    parser.add_argument('--older-than', type=parse_age, default=None,
+                        help='Only refit models fit longer ago than this, e.g. 1d')
+    args = parser.parse_args(argv)
+
+    db = CraigsailDB(args.db)
+    categories = args.search_category or db.load_listings()['category'].dropna().unique().tolist()
+    for category in categories:
+        backfilled = db.refresh_features(category)
+        if backfilled:
+            print(f'{category}: comparable features written for {backfilled} listings.')
+    for category, model in refit_deal_models(db, categories, args.older_than):
+        if model is None:
+            print(f'{category}: too few priced listings to fit a deal model.')
+        else:
+            print(f'{category}: deal model fit on {model.rows} listings (scale {model.scale:.3f}); '
+                  'listings rescored.')
+    return 0
+
+
+def serve_fakelist(argv=None):
+    """
+    `craigsail fakelist` - serve the local craigslist stand-in (see
+    craigsail.fakelist) until interrupted.
+    """
+    parser = ArgumentParser(prog='craigsail fakelist',
+                            description='Serve synthetic craigslist pages for fetch load testing')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Interface to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='Port to listen on (default 8765)')
+    parser.add_argument('--listings', type=int, default=250,
+                        help='Results per (site, category) search, 100 to a page (default 250)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds every request waits (default 0)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Mean of an exponential extra wait per request, in seconds (default 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered 503 (default 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of requests answered 429 (default 0)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Synthetic data seed (default 0)')
+    args = parser.parse_args(argv)
+
+    if args.listings < 0 or not 0 <= args.error_rate + args.throttle_rate <= 1:
+        print('error: --listings must be >= 0 and --error-rate + --throttle-rate between 0 and 1',
+              file=sys.stderr)
+        return 2
+
+    server = FakeCraigslist(
+        listings=args.listings, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, seed=args.seed, host=args.host, port=args.port,
+    ).start()
+    print(f'Serving a fake craigslist on {server.url} ({server.pages} result pages per search). '
+          f'Run searches with HTTP_PROXY={server.url} to use it.', flush=True)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+Shard = namedtuple('Shard', 'category city filters')
+
+
+def load_sweep_config(path):
+    """
+    Read a sweep config:
+
+        {
+          "data_path": "data",
+          "db": "data/craigsail.db",
+          "cities": ["sfbay", "seattle"],
+          "filters": {"has_image": true},
+          "categories": {
+            "boo": {"filters": {"max_price": 25000}},
+            "bia": {"cities": ["portland"]},
+            "rva": {}
+          }
+        }
+
+    categories may also be a plain list of codes. Per-category cities
+    replace the top-level ones; per-category filters are merged over them.
+    """
+    with open(path) as handle:
+        config = json.load(handle)
+
+    categories = config.get('categories') or {}
+    if isinstance(categories, list):
+        categories = {code: {} for code in categories}
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError(f'{path}: "categories" must be a non-empty list or object.')
+
+    unknown = sorted(set(config) - {'data_path', 'db', 'cities', 'filters', 'categories'})
+    if unknown:
+        raise ValueError(f'{path}: unknown key(s) {unknown}.')
+
+    config['categories'] = categories
+    return config
+
+
+def plan_shards(args):
+    """
+    Expand the command line and optional config into (category, city,
+    filters) shards, validating every city once. Raises ValueError.
+    """
+    config = load_sweep_config(args.config) if args.config else {'categories': {}}
+    args.data_path = args.data_path or config.get('data_path')
+    args.db = args.db or config.get('db')
+    if args.data_path is None:
+        raise ValueError('no data_path given on the command line or in the config')
+
+    filters = config.get('filters', {}) | parse_filters(args.filters)
+    cities = select_cities(args, config.get('cities'))
+    categories = (
+        {code: config['categories'].get(code, {}) for code in args.search_category}
+        if args.search_category else config['categories']
+    )
+
+    shards = []
+    for category, overrides in categories.items():
+        category_cities = overrides.get('cities', cities)
+        if not category_cities:
+            raise ValueError(f'no cities to sweep for category {category!r}')
+        for city in category_cities:
+            shards.append(Shard(category, city, filters | overrides.get('filters', {})))
+
+    # Fail fast on a mistyped city rather than after a long scrape.
+    valid = Search.validate_cities(sorted({shard.city for shard in shards}), strict=True)
+    normalised = dict(zip(sorted({shard.city for shard in shards}), valid))
+    unique = {}
+    for shard in shards:
+        shard = shard._replace(city=normalised[shard.city])
+        unique.setdefault((shard.category, shard.city), shard)
+    return list(unique.values())
+
+
 def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
     args = get_arguments(argv)
 
-    # Fail fast on a mistyped city rather than after a long scrape.
     try:
-        cities = Search.validate_cities(args.cities, strict=True)
-        filters = parse_filters(args.filters)
-    except ValueError as exc:
+        shards = plan_shards(args)
+    except (ValueError, OSError) as exc:
         print(f'error: {exc}', file=sys.stderr)
         return 2
 
-    search_cls = CATEGORY_CLASSES.get(args.search_category, Search)
-    craig_search = search_cls(
-        search_category=args.search_category,
+    metrics = RunMetrics(log_stream=sys.stderr if args.profile == 'log' else None)
+    with profiled(args.profile_dump):
+        return run_search(args, shards, metrics)
+
+
+def shard_search(shard, args, metrics, archive=None):
+    """
+    The Search instance for one (category, city) shard. Its FILTERS are
+    the defaults merged with the shard's, which is what the sweep log keys
+    freshness on.
+    """
+    search_cls = CATEGORY_CLASSES.get(shard.category, Search)
+    return search_cls(
+        search_category=shard.category,
         data_path=args.data_path,
-        cities=cities,
-        filters=filters,
+        cities=[shard.city],
+        filters=shard.filters,
+        metrics=metrics,
+        archive=archive,
     )
 
+
+def cached_shard(craig_search, shard, db, max_age):
+    """
+    The shard's listings from the database if a sweep with the same
+    filters finished within max_age, else None.
+    """
+    swept = db.last_swept(shard.category, shard.city, craig_search.FILTERS)
+    if swept is None or pd.Timestamp.now('UTC') - swept > max_age:
+        return None
+    try:
+        return db.cached_listings(shard.category, shard.city, craig_search.FILTERS)
+    except ValueError:
+        return None  # filters sqlite cannot answer; scrape instead
+
+
+def fetch_shard(craig_search, shard, args, writer):
+    """
+    Fetch, prep and queue one (category, city) shard for the writer. Runs
+    on a fetch thread and never touches the database itself.
+    """
     timespan, results_df = craig_search.get_all_daily_postings()
-    print(f'Search completed in {timespan}. {len(results_df)} listings found.')
+    results_df = craig_search.prep_results(results_df, workers=args.workers)
+    writer.put(results_df, shard.category)
+
+    # The shard has now been seen in full; anything live in it the sweep
+    # did not return has come down.
+    seen = results_df['id'].dropna().tolist() if 'id' in results_df.columns else []
+    writer.delist(shard.category, shard.city, seen, filters=craig_search.FILTERS)
+    return timespan, results_df
+
+
+def run_search(args, shards, metrics):
+    started = time.perf_counter()
+    categories = list(dict.fromkeys(shard.category for shard in shards))
+    totals = {category: {'cities': 0, 'found': 0, 'cached': 0, 'failed': []} for category in categories}
+    frames = {category: [] for category in categories}
+    slowest = pd.Timedelta(0)
+
+    db_path = args.db or str(Path(args.data_path).joinpath('craigsail.db'))
+    db = CraigsailDB(db_path, metrics=metrics)
+    archive = None if args.no_archive else RawArchive(args.archive_dir or Path(args.data_path).joinpath('raw'))
+
+    stale = []
+    for shard in shards:
+        craig_search = shard_search(shard, args, metrics, archive)
+        cached = None
+        if args.max_age is not None:
+            with metrics.stage('cache', city=shard.city) as stage:
+                cached = cached_shard(craig_search, shard, db, args.max_age)
+                stage['rows'] = 0 if cached is None else len(cached)
+        if cached is None:
+            stale.append((craig_search, shard))
+            continue
+
+        total = totals[shard.category]
+        total['cities'] += 1
+        total['cached'] += 1
+        total['found'] += len(cached)
+        if args.csv:
+            frames[shard.category].append(cached)
+
+    with IngestWriter(db) as writer, \
+         ThreadPoolExecutor(max(1, min(args.fetch_workers, len(stale) or 1))) as pool:
+        futures = {
+            pool.submit(fetch_shard, craig_search, shard, args, writer): shard
+            for craig_search, shard in stale
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            total = totals[shard.category]
+            try:
+                timespan, results_df = future.result()
+            except Exception as exc:
+                # A failed shard queues no delist; the other shards carry on.
+                total['failed'].append(shard.city)
+                print(f'error: {shard.category}/{shard.city} fetch failed: {exc}', file=sys.stderr)
+                continue
+
+            slowest = max(slowest, timespan)
+            total['cities'] += 1
+            total['found'] += len(results_df)
+            if args.csv:
+                frames[shard.category].append(results_df)
+
+    for category, model in refit_deal_models(db, categories, args.refit_after):
+        if model is not None:
+            print(f'{category}: deal model refit on {model.rows} listings.')
+
+    elapsed = pd.Timedelta(seconds=time.perf_counter() - started)
+    print(f'Swept {len(shards)} shards in {elapsed} (slowest fetch {slowest}).')
+    for category, total in totals.items():
+        saved = writer.totals[category]
+        print(
+            f'{category}: {total["found"]} listings from {total["cities"]} cities. '
+            f'{db_path}: {saved.inserted} new, {saved.changed} changed, '
+            f'{saved.touched} unchanged, {saved.price_changes} price observations recorded, '
+            f'{writer.delisted[category]} no longer posted marked delisted.'
+        )
+        if total['cached']:
+            print(f'{category}: {total["cached"]} of those cities answered from the database.')
+        if total['failed']:
+            print(f'{category}: fetch failed for {", ".join(sorted(total["failed"]))}.')
+
+        if args.csv and frames[category]:
+            csv_path = Search(search_category=category, data_path=args.data_path).save_data_as_csv(
+                pd.concat(frames[category], ignore_index=True), f'search_results_{category}'
+            )
+            print(f'CSV snapshot written to {csv_path}.')
+
+    found = sum(total['found'] for total in totals.values())
+    db.record_run(metrics, category=','.join(categories), listings=found)
+    if args.profile == 'json':
+        print(metrics.to_json(indent=2))
+
+    return 1 if any(total['failed'] for total in totals.values()) else 0
+
+
+def coordinate(argv=None):
+    """
+    `craigsail coordinate` - plan a sweep as leased work items for
+    `craigsail worker` processes and write what they fetch.
+    """
+    parser = add_sweep_arguments(ArgumentParser(
+        prog='craigsail coordinate',
+        description='Split a sweep into (category, city) work items for workers on any number of nodes',
+    ))
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help=f'Claims a shard gets before it is given up on (default {MAX_ATTEMPTS})')
+    parser.add_argument('--poll-seconds', type=float, default=1.0,
+                        help='How often to look for fetched shards to write (default 1)')
+    args = check_sweep_arguments(parser, parser.parse_args(argv))
+
+    if args.max_attempts < 1:
+        print('error: --max-attempts must be at least 1', file=sys.stderr)
+        return 2
+    try:
+        shards = plan_shards(args)
+    except (ValueError, OSError) as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 2
+
+    return run_coordinator(args, shards, RunMetrics())
+
+
+def run_coordinator(args, shards, metrics):
+    started = time.perf_counter()
+    categories = list(dict.fromkeys(shard.category for shard in shards))
+    totals = {
+        category: {'cities': 0, 'found': 0, 'cached': 0, 'saved': SaveResult(), 'delisted': 0}
+        for category in categories
+    }
+
+    db_path = args.db or str(Path(args.data_path).joinpath('craigsail.db'))
+    db = CraigsailDB(db_path, metrics=metrics)
+    queue = WorkQueue(db)
+
+    # Items carry the merged FILTERS, which is what the sweep log keys on.
+    planned = []
+    for shard in shards:
+        craig_search = shard_search(shard, args, metrics)
+        cached = None
+        if args.max_age is not None:
+            with metrics.stage('cache', city=shard.city) as stage:
+                cached = cached_shard(craig_search, shard, db, args.max_age)
+                stage['rows'] = 0 if cached is None else len(cached)
+        if cached is None:
+            planned.append(shard._replace(filters=craig_search.FILTERS))
+            continue
+        total = totals[shard.category]
+        total['cities'] += 1
+        total['cached'] += 1
+        total['found'] += len(cached)
+
+    sweep = queue.plan(planned, max_attempts=args.max_attempts)
+    print(f'Sweep {sweep}: {len(planned)} shards queued in {db_path}. '
+          f'Run `craigsail worker --db {db_path} --data_path <dir>` on each node.', flush=True)
+
+    while True:
+        queue.expire()
+        written = queue.write_fetched()
+        for item, saved, delisted in written:
+            total = totals.setdefault(
+                item.category, {'cities': 0, 'found': 0, 'cached': 0, 'saved': SaveResult(), 'delisted': 0}
+            )
+            if item.sweep == sweep:
+                total['cities'] += 1
+                total['found'] += saved.inserted + saved.updated
+            total['saved'] += saved
+            total['delisted'] += delisted
+        if written:
+            continue
+        if not any(queue.progress(sweep).get(state) for state in OPEN_STATES):
+            break
+        time.sleep(args.poll_seconds)
+
+    failed = {}
+    for category, city, error in queue.failures(sweep):
+        failed.setdefault(category, []).append(city)
+        print(f'error: {category}/{city} fetch failed: {error}', file=sys.stderr)
+
+    for category, model in refit_deal_models(db, categories, args.refit_after):
+        if model is not None:
+            print(f'{category}: deal model refit on {model.rows} listings.')
+
+    elapsed = pd.Timedelta(seconds=time.perf_counter() - started)
+    print(f'Swept {len(shards)} shards in {elapsed}.')
+    for category, total in totals.items():
+        saved = total['saved']
+        print(
+            f'{category}: {total["found"]} listings from {total["cities"]} cities. '
+            f'{db_path}: {saved.inserted} new, {saved.changed} changed, '
+            f'{saved.touched} unchanged, {saved.price_changes} price observations recorded, '
+            f'{total["delisted"]} no longer posted marked delisted.'
+        )
+        if total['cached']:
+            print(f'{category}: {total["cached"]} of those cities answered from the database.')
+        if failed.get(category):
+            print(f'{category}: fetch failed for {", ".join(sorted(failed[category]))}.')
+
+    found = sum(total['found'] for total in totals.values())
+    db.record_run(metrics, category=','.join(categories), listings=found)
+    return 1 if failed else 0
+
+
+def work(argv=None):
+    """
+    `craigsail worker` - claim, fetch and post work items from sweeps
+    planned by `craigsail coordinate` against the same database.
+    """
+    parser = ArgumentParser(prog='craigsail worker',
+                            description='Fetch (category, city) work items for a craigsail coordinator')
+    parser.add_argument('--db', type=str, required=True,
+                        help='Path to the coordinator\'s sqlite database, on storage every node shares')
+    parser.add_argument('--data_path', type=str, required=True,
+                        help='Local directory for this node\'s raw archive and scratch files')
+    parser.add_argument('--name', type=str, default=None,
+                        help='Worker name recorded on its leases (default <hostname>-<pid>)')
+    parser.add_argument('--sweep', type=str, default=None,
+                        help='Only claim items from this sweep (default: any)')
+    parser.add_argument('--fetch-workers', type=int, default=8,
+                        help='Shards fetched concurrently (default 8)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Prep large shards in this many processes (default: in-process)')
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS,
+                        help=f'How long a claim lasts without renewal (default {LEASE_SECONDS})')
+    parser.add_argument('--poll-seconds', type=float, default=1.0,
+                        help='How often to look for work when idle (default 1)')
+    parser.add_argument('--idle-exit', type=parse_age, default='1min',
+                        help='Exit after finding nothing to claim for this long, e.g. 30s, 10min '
+                             '(default 1min)')
+    parser.add_argument('--forever', action='store_true',
+                        help='Keep polling for new sweeps instead of exiting when idle')
+    parser.add_argument('--archive-dir', type=str, default=None,
+                        help='Append raw results here for `craigsail reprocess`. Defaults to <data_path>/raw')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='Do not keep the raw results')
+    args = parser.parse_args(argv)
 
-    db_path = args.db or str(craig_search.SAVE_PATH.joinpath('craigsail.db'))
-    db = CraigsailDB(db_path)
-    inserted, updated, price_changes = db.save_listings(results_df, category=args.search_category)
-    print(f'{db_path}: {inserted} new, {updated} updated, {price_changes} price observations recorded.')
+    if args.fetch_workers < 1 or args.lease_seconds <= 0:
+        print('error: --fetch-workers must be at least 1 and --lease-seconds positive', file=sys.stderr)
+        return 2
+
+    metrics = RunMetrics()
+    db = CraigsailDB(args.db, metrics=metrics)
+    archive = None if args.no_archive else RawArchive(args.archive_dir or Path(args.data_path).joinpath('raw'))
 
-    if args.csv:
-        csv_path = craig_search.save_data_as_csv(results_df, 'search_results')
-        print(f'CSV snapshot written to {csv_path}.')
+    def fetch(item):
+        shard = Shard(item.category, item.city, item.filters)
+        craig_search = shard_search(shard, args, metrics, archive)
+        _, results_df = craig_search.get_all_daily_postings()
+        results_df = craig_search.prep_results(results_df, workers=args.workers)
+        return db.to_records(results_df, shard.category)
 
+    worker = Worker(
+        WorkQueue(db, lease_seconds=args.lease_seconds), fetch, name=args.name, slots=args.fetch_workers,
+        sweep=args.sweep, poll_seconds=args.poll_seconds,
+        idle_seconds=None if args.forever else args.idle_exit.total_seconds(),
+    )
+    counts = worker.run()
+    db.record_run(metrics, category=f'worker:{worker.name}', listings=counts['rows'])
+    print(f'{worker.name}: {counts["posted"]} shards ({counts["rows"]} listings) posted, {counts["failed"]} failed, '
+          f'{counts["lost"]} lost to an expired lease.')
     return 0
 
 
+def reprocess_archive(argv=None):
+    """
+    `craigsail reprocess` - replay archived raw results through the current
+    prep and save_listings without touching the network.
+    """
+    parser = ArgumentParser(prog='craigsail reprocess',
+                            description='Re-run prep and save over archived raw results')
+    parser.add_argument('--archive-dir', type=str, required=True,
+                        help='Raw archive written by earlier searches, e.g. data/raw')
+    parser.add_argument('--db', type=str, required=True,
+                        help='Path to the sqlite database')
+    parser.add_argument('--since', type=str, default=None,
+                        help='First day to replay, e.g. 2026-01-01 (default: the whole archive)')
+    parser.add_argument('--until', type=str, default=None,
+                        help='Last day to replay (default: today)')
+    parser.add_argument('--search_category', nargs='+', default=None,
+                        help='Only replay these category codes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Partitions prepped in parallel (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    try:
+        since, until = (pd.Timestamp(day) if day else None for day in (args.since, args.until))
+    except ValueError as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 2
+
+    partitions, saved = reprocess(
+        RawArchive(args.archive_dir),
+        CraigsailDB(args.db),
+        since=since,
+        until=until,
+        categories=args.search_category,
+        workers=args.workers,
+    )
+    print(
+        f'{args.archive_dir}: {partitions} partitions reprocessed into {args.db}: '
+        f'{saved.inserted} new, {saved.changed} changed, {saved.touched} unchanged, '
+        f'{saved.price_changes} price observations recorded.'
+    )
+    return 0
+
+
+# Subcommands dispatched on the first argument. A bare `craigsail --search_category ...`
+# still runs a search.
+COMMANDS = {
+    'compact': compact,
+    'coordinate': coordinate,
+    'fakelist': serve_fakelist,
+    'reprocess': reprocess_archive,
+    'rescore': rescore,
+    'worker': work,
+}
+
+
 if __name__ == '__main__':
     raise SystemExit(main())
@@ -0,0 +1,238 @@
+"""
+Comparable listings.
+
+A category declares the typed columns that make two of its listings
+comparable (Search.COMPARABLE_FEATURES, each with a weight) and the text
+columns a comparable should share (Search.COMPARABLE_LABELS). For boats
+that is year, LOA and engine hours, then make and propulsion type.
+
+feature_rows turns listings into those features; CraigsailDB keeps them in
+the listing_features table so an index never has to decompress and parse
+attribute JSON. A ComparablesIndex holds one category's features as a
+NumPy matrix: each numeric column standardised and weighted, plus the
+listing's position on the globe, indexed with a KD-tree (scipy's cKDTree,
+or a brute-force NumPy scan when scipy is not installed). After an ingest
+it loads only the feature rows written since it last looked and rebuilds
+the tree from the matrix it already holds.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from .cities import EARTH_RADIUS_KM
+from .search import COLUMN_CONVERTERS
+
+# One standard deviation of a feature counts the same as this many km
+# between two listings.
+LOCATION_KM = 250.0
+
+# What a differing label (make, propulsion type) adds to a distance, in
+# standard deviations. Labels only rerank the KD-tree's candidates.
+LABEL_PENALTY = 1.0
+
+# Candidates fetched per comparable asked for, so label reranking has
+# something to choose from.
+CANDIDATE_FACTOR = 4
+
+# scipy is optional; without it queries scan the whole matrix, which is
+# still only milliseconds at a few hundred thousand rows.
+spatial = None
+
+
+def _load_spatial():
+    """
+    Import scipy.spatial on first use. Returns the module, or False when
+    scipy is not installed.
+    """
+    global spatial
+    if spatial is None:
+        try:
+            from scipy import spatial as module
+        except ImportError:
+            module = False
+        spatial = module
+    return spatial
+
+
+def _label(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    text = str(value).strip().lower()
+    return text or None
+
+
+def feature_rows(search_class, category, listings):
+    """
+    listing_features rows for a frame of listings with id, content_hash,
+    latitude, longitude and the attributes JSON text. Returns tuples of
+    (listing_id, category, content_hash, vector, labels, latitude,
+    longitude); vector is the float64 bytes of the COMPARABLE_FEATURES
+    values, NaN where a listing does not say.
+    """
+    attributes = [json.loads(text) if text else {} for text in listings['attributes']]
+    columns = [
+        COLUMN_CONVERTERS['float'](pd.Series([attrs.get(column) for attrs in attributes], dtype=object))
+        for column in search_class.COMPARABLE_FEATURES
+    ]
+    vectors = (
+        np.column_stack([column.to_numpy(dtype=float) for column in columns])
+        if columns else np.empty((len(listings), 0))
+    )
+    labels = [
+        json.dumps([_label(attrs.get(column)) for column in search_class.COMPARABLE_LABELS])
+        for attrs in attributes
+    ]
+
+    return [
+        (listing_id, category, content_hash, vector.tobytes(), label,
+         None if pd.isna(latitude) else latitude, None if pd.isna(longitude) else longitude)
+        for listing_id, content_hash, latitude, longitude, vector, label in zip(
+            listings['id'], listings['content_hash'], listings['latitude'], listings['longitude'],
+            vectors, labels,
+        )
+    ]
+
+
+def _globe(latitude, longitude):
+    """
+    Points on a sphere whose chord lengths approximate km / LOCATION_KM.
+    Listings without a geotag sit at the centre, as far from everything
+    as each other, so they rank on features alone.
+    """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    points = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    return np.nan_to_num(points * (EARTH_RADIUS_KM / LOCATION_KM))
+
+
+class ComparablesIndex:
+    """
+    Nearest-neighbour index over one category's listing_features rows.
+
+    Usage:
+        index = ComparablesIndex(Boats)
+        index.update(rows)          # (seq, listing_id, vector, labels, latitude, longitude)
+        index.query('7612345678', k=20)     # [(listing_id, distance), ...]
+    """
+
+    def __init__(self, search_class):
+        self.features = list(search_class.COMPARABLE_FEATURES)
+        self.label_columns = list(search_class.COMPARABLE_LABELS)
+        self.weights = np.array(list(search_class.COMPARABLE_FEATURES.values()), dtype=float)
+
+        self.ids = []
+        self.positions = {}
+        self.values = np.empty((0, len(self.features)))
+        self.coords = np.empty((0, 3))
+        self.labels = []
+
+        # Newest listing_features seq loaded, and the data_version it was
+        # loaded at (see CraigsailDB.comparables_index).
+        self.seq = 0
+        self.data_version = None
+        self.points = None
+        self.tree = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, listing_id):
+        return listing_id in self.positions
+
+    def update(self, rows):
+        """
+        Apply listing_features rows newer than self.seq: new listings are
+        appended, re-featured ones overwritten in place. Rebuilds the tree
+        when anything changed. Returns the number of rows applied.
+        """
+        rows = [row for row in rows if row[0] > self.seq]
+        if not rows:
+            return 0
+
+        values = np.frombuffer(b''.join(row[2] for row in rows), dtype=float)
+        values = values.reshape(len(rows), len(self.features))
+        coords = _globe(
+            np.array([row[4] for row in rows], dtype=float),
+            np.array([row[5] for row in rows], dtype=float),
+        )
+
+        appended = []
+        for offset, (seq, listing_id, _, labels, _, _) in enumerate(rows):
+            position = self.positions.get(listing_id)
+            if position is None:
+                self.positions[listing_id] = len(self.ids) + len(appended)
+                appended.append(offset)
+                self.labels.append(json.loads(labels))
+            else:
+                self.values[position] = values[offset]
+                self.coords[position] = coords[offset]
+                self.labels[position] = json.loads(labels)
+            self.seq = max(self.seq, seq)
+
+        self.ids.extend(rows[offset][1] for offset in appended)
+        self.values = np.concatenate([self.values, values[appended]])
+        self.coords = np.concatenate([self.coords, coords[appended]])
+        self.build()
+        return len(rows)
+
+    def build(self):
+        """
+        Standardise the feature matrix and rebuild the KD-tree over it.
+        """
+        # Mean and spread over the values listings actually state; a column
+        # nobody fills in is left unscaled.
+        known = ~np.isnan(self.values)
+        counts = np.maximum(known.sum(axis=0), 1)
+        mean = np.where(known, self.values, 0.0).sum(axis=0) / counts
+        std = np.sqrt((np.where(known, self.values - mean, 0.0) ** 2).sum(axis=0) / counts)
+        std = np.where(std > 0, std, 1.0)
+        # A missing value sits at the mean, so it neither helps nor hurts.
+        scaled = np.nan_to_num((self.values - mean) / std) * self.weights
+
+        self.points = np.ascontiguousarray(np.hstack([scaled, self.coords]))
+        module = _load_spatial()
+        self.tree = module.cKDTree(self.points) if module and len(self.points) else None
+
+    def features_of(self, listing_id):
+        """
+        {feature or label column: value} for one indexed listing.
+        """
+        position = self.positions[listing_id]
+        values = {
+            column: None if np.isnan(value) else float(value)
+            for column, value in zip(self.features, self.values[position])
+        }
+        return values | dict(zip(self.label_columns, self.labels[position]))
+
+    def query(self, listing_id, k=20):
+        """
+        The k listings nearest to listing_id, nearest first, as
+        [(listing_id, distance)]. Raises KeyError for a listing that is not
+        indexed.
+        """
+        assert k > 0, f'k must be positive. Got {k}.'
+        position = self.positions[listing_id]
+        wanted = min(len(self.ids), k * CANDIDATE_FACTOR + 1)
+        target = self.points[position]
+
+        if self.tree is not None:
+            distances, candidates = self.tree.query(target, k=wanted)
+            distances, candidates = np.atleast_1d(distances), np.atleast_1d(candidates)
+        else:
+            squared = ((self.points - target) ** 2).sum(axis=1)
+            candidates = np.argpartition(squared, wanted - 1)[:wanted]
+            distances = np.sqrt(squared[candidates])
+
+        labels = self.labels[position]
+        scored = []
+        for distance, candidate in zip(distances, candidates):
+            if candidate == position:
+                continue
+            mismatches = sum(
+                1 for mine, theirs in zip(labels, self.labels[candidate])
+                if mine is not None and theirs is not None and mine != theirs
+            )
+            scored.append((float(np.sqrt(distance ** 2 + mismatches * LABEL_PENALTY ** 2)), self.ids[candidate]))
+
+        scored.sort()
+        return [(candidate, distance) for distance, candidate in scored[:k]]
@@ -0,0 +1,358 @@
+"""
+Sweeps spread over several machines.
+
+A single `craigsail` search fetches every shard from one process. `craigsail
+coordinate` plans the same sweep but, instead of fetching it, writes one
+work item per (category, city) shard into the work_items table. `craigsail
+worker` processes - on this machine or any other that opens the same
+database file - claim items, fetch and prep their shard, and post the rows
+back as compressed batches in work_results. The coordinator stays the only
+process that writes listings: it drains fetched items into the listings,
+price history and sweep log in its own transactions. Adding workers adds
+fetch capacity without adding writers to the hot tables.
+
+    queue = WorkQueue(db)
+    sweep = queue.plan(shards)                       # coordinator
+    item = queue.claim('node-2')                     # worker
+    queue.post(item, 'node-2', db.to_records(df, item.category))
+    queue.write_fetched()                            # coordinator
+
+A claim is a lease. The worker holds the item until lease_until and renews
+it while it works. Claiming is one UPDATE ... RETURNING inside a write
+transaction, so two workers never hold the same item. When a lease runs
+out (its worker stalled or died) the item goes back to the pool, up to the
+item's max_attempts claims, and the stale holder can no longer post: a post
+only lands while the poster still holds the lease it claimed. Each shard is
+therefore written once per sweep however many workers touched it.
+
+Leases compare time.time() across machines, so the nodes' clocks need to
+agree to well within the lease length.
+"""
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+
+from .db import _compress, _decompress
+
+# How long a claim holds an item without a renewal, in seconds.
+LEASE_SECONDS = 300
+
+# Claims an item gets before it is marked failed.
+MAX_ATTEMPTS = 3
+
+# Records per work_results row.
+BATCH_ROWS = 5000
+
+# Items whose results write_fetched commits in one transaction.
+WRITE_ITEMS = 8
+
+PENDING = 'pending'
+LEASED = 'leased'
+FETCHED = 'fetched'
+DONE = 'done'
+FAILED = 'failed'
+
+# States a sweep is still waiting on.
+OPEN_STATES = (PENDING, LEASED, FETCHED)
+
+WorkItem = namedtuple('WorkItem', 'id sweep category city filters attempts')
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def _locked(exc):
+    return isinstance(exc, sqlite3.OperationalError) and 'locked' in str(exc)
+
+
+class WorkQueue:
+    """
+    The work_items and work_results tables of a CraigsailDB.
+
+    Every state change runs in a BEGIN IMMEDIATE transaction, so it holds
+    the database's write lock from its first read, and retries for up to
+    busy_seconds while another process holds it.
+    """
+
+    def __init__(self, db, lease_seconds=LEASE_SECONDS, busy_seconds=30):
+        self.db = db
+        self.metrics = db.metrics
+        self.lease_seconds = lease_seconds
+        self.busy_seconds = busy_seconds
+
+    @contextmanager
+    def transaction(self):
+        deadline = time.monotonic() + self.busy_seconds
+        with self.db.connect() as conn:
+            while True:
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    break
+                except sqlite3.OperationalError as exc:
+                    if not _locked(exc) or time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+            yield conn
+
+    def plan(self, shards, sweep=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Queue one pending item per (category, city, filters) shard. Returns
+        the sweep id, a fresh one unless sweep is given; re-planning a
+        shard the sweep already holds is a no-op.
+        """
+        assert max_attempts >= 1, f'max_attempts must be >= 1. Got {max_attempts}.'
+        sweep = sweep or f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime())}-{uuid.uuid4().hex[:6]}'
+        with self.transaction() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO work_items (sweep, category, city, filters, max_attempts) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [
+                    (sweep, shard.category, shard.city, json.dumps(shard.filters, sort_keys=True), max_attempts)
+                    for shard in shards
+                ],
+            )
+        return sweep
+
+    def claim(self, worker, sweep=None, now=None):
+        """
+        Lease the oldest pending item, or one whose lease has expired, to
+        worker. Returns a WorkItem, or None when there is nothing to claim.
+        """
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            row = conn.execute(
+                """
+                UPDATE work_items SET
+                    state = 'leased', worker = :worker, lease_until = :until, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM work_items
+                    WHERE (state = 'pending' OR (state = 'leased' AND lease_until < :now))
+                      AND attempts < max_attempts
+                      AND (:sweep IS NULL OR sweep = :sweep)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING id, sweep, category, city, filters, attempts
+                """,
+                {'worker': worker, 'until': now + self.lease_seconds, 'now': now, 'sweep': sweep},
+            ).fetchone()
+        if row is None:
+            return None
+        return WorkItem(row['id'], row['sweep'], row['category'], row['city'], json.loads(row['filters']),
+                        row['attempts'])
+
+    def renew(self, items, worker, now=None):
+        """
+        Push back the lease of each item worker still holds. Returns the
+        ids of those it no longer holds.
+        """
+        now = time.time() if now is None else now
+        lost = []
+        with self.transaction() as conn:
+            for item in items:
+                renewed = conn.execute(
+                    'UPDATE work_items SET lease_until = ? '
+                    "WHERE id = ? AND worker = ? AND attempts = ? AND state = 'leased'",
+                    (now + self.lease_seconds, item.id, worker, item.attempts),
+                ).rowcount
+                if not renewed:
+                    lost.append(item.id)
+        return lost
+
+    def post(self, item, worker, records, batch_rows=BATCH_ROWS):
+        """
+        Hand a claimed item's records (from CraigsailDB.to_records) to the
+        coordinator. Returns False, and stores nothing, if worker no longer
+        holds the lease it claimed.
+        """
+        batches = [
+            (len(batch), *_compress(json.dumps(batch, default=str)))
+            for batch in (records[start:start + batch_rows] for start in range(0, len(records), batch_rows))
+        ]
+        with self.metrics.stage('post', city=item.city) as stage, self.transaction() as conn:
+            stage['rows'] = len(records)
+            stage['bytes'] = sum(len(data) for _, _, data in batches)
+            held = conn.execute(
+                "UPDATE work_items SET state = 'fetched', rows = ?, lease_until = NULL, error = NULL "
+                "WHERE id = ? AND worker = ? AND attempts = ? AND state = 'leased'",
+                (len(records), item.id, worker, item.attempts),
+            ).rowcount
+            if not held:
+                return False
+            conn.executemany(
+                'INSERT INTO work_results (item_id, rows, codec, data) VALUES (?, ?, ?, ?)',
+                [(item.id, rows, codec, data) for rows, codec, data in batches],
+            )
+        return True
+
+    def release(self, item, worker, error):
+        """
+        Give up a claimed item after a failed fetch. It goes back to
+        pending, or to failed once it has used its attempts.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                """
+                UPDATE work_items SET
+                    state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_until = NULL, error = ?
+                WHERE id = ? AND worker = ? AND attempts = ? AND state = 'leased'
+                """,
+                (str(error), item.id, worker, item.attempts),
+            )
+
+    def expire(self, now=None):
+        """
+        Fail the items whose last allowed lease ran out without a post.
+        Returns how many.
+        """
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                (now,),
+            ).rowcount
+
+    def write_fetched(self, max_items=WRITE_ITEMS, when=None):
+        """
+        Save the records of up to max_items fetched items (from any sweep),
+        delist what each shard no longer shows and mark the items done, in
+        one transaction. Returns [(WorkItem, SaveResult, delisted)].
+        """
+        written = []
+        with self.metrics.stage('save') as stage, self.transaction() as conn:
+            items = conn.execute(
+                "SELECT id, sweep, category, city, filters, attempts FROM work_items "
+                "WHERE state = 'fetched' ORDER BY id LIMIT ?",
+                (max_items,),
+            ).fetchall()
+            rows = 0
+            for row in items:
+                item = WorkItem(row['id'], row['sweep'], row['category'], row['city'],
+                                json.loads(row['filters']), row['attempts'])
+                records = []
+                for batch in conn.execute(
+                    'SELECT codec, data FROM work_results WHERE item_id = ? ORDER BY id', (item.id,),
+                ):
+                    records.extend(json.loads(_decompress(batch['codec'], batch['data'])))
+
+                saved = self.db.write_records(conn, records)
+                # Seen is what the shard returned, as in cli.fetch_shard.
+                delisted = self.db.write_delisted(
+                    conn, item.category, item.city, [record['id'] for record in records],
+                    when=when, filters=item.filters,
+                )
+                conn.execute("UPDATE work_items SET state = 'done' WHERE id = ?", (item.id,))
+                conn.execute('DELETE FROM work_results WHERE item_id = ?', (item.id,))
+                written.append((item, saved, delisted))
+                rows += len(records)
+            stage['rows'] = rows
+            stage['batches'] = len(items)
+        return written
+
+    def progress(self, sweep):
+        """
+        {state: item count} for a sweep.
+        """
+        with self.db.connect() as conn:
+            return dict(conn.execute(
+                'SELECT state, COUNT(*) FROM work_items WHERE sweep = ? GROUP BY state', (sweep,),
+            ).fetchall())
+
+    def failures(self, sweep):
+        """
+        [(category, city, error)] for the sweep's failed items.
+        """
+        with self.db.connect() as conn:
+            return [
+                tuple(row) for row in conn.execute(
+                    "SELECT category, city, error FROM work_items WHERE sweep = ? AND state = 'failed' "
+                    'ORDER BY id', (sweep,),
+                )
+            ]
+
+
+class Worker:
+    """
+    Claims and fetches work items on a pool of fetch threads until there
+    has been nothing to claim for idle_seconds (forever when None).
+
+    fetch(item) returns the item's records; it runs on a fetch thread. The
+    claiming thread renews every held lease a third of the way through it,
+    posts results and releases the items whose fetch raised.
+
+    Usage:
+        worker = Worker(WorkQueue(db), fetch, slots=8)
+        worker.run()               # {'posted': ..., 'rows': ..., 'failed': ..., 'lost': ...}
+    """
+
+    def __init__(self, queue, fetch, name=None, slots=4, sweep=None, poll_seconds=1.0, idle_seconds=60.0,
+                 log_stream=sys.stderr):
+        assert slots >= 1, f'slots must be >= 1. Got {slots}.'
+        self.queue = queue
+        self.fetch = fetch
+        self.name = name or default_worker_name()
+        self.slots = slots
+        self.sweep = sweep
+        self.poll_seconds = poll_seconds
+        self.idle_seconds = idle_seconds
+        self.log_stream = log_stream
+        self.counts = {'posted': 0, 'rows': 0, 'failed': 0, 'lost': 0}
+
+    def run(self):
+        held = {}
+        renewed = idle_since = time.monotonic()
+        with ThreadPoolExecutor(self.slots, thread_name_prefix='craigsail-worker') as pool:
+            while True:
+                claimed = False
+                while len(held) < self.slots:
+                    item = self.queue.claim(self.name, self.sweep)
+                    if item is None:
+                        break
+                    claimed = True
+                    held[pool.submit(self.fetch, item)] = item
+
+                if held or claimed:
+                    idle_since = time.monotonic()
+                elif self.idle_seconds is not None and time.monotonic() - idle_since >= self.idle_seconds:
+                    break
+
+                if not held:
+                    time.sleep(self.poll_seconds)
+                    continue
+                done, _ = wait(held, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(held.pop(future), future)
+
+                if held and time.monotonic() - renewed >= self.queue.lease_seconds / 3:
+                    self.queue.renew(list(held.values()), self.name)
+                    renewed = time.monotonic()
+        return dict(self.counts)
+
+    def _finish(self, item, future):
+        try:
+            records = future.result()
+        except Exception as exc:
+            self.queue.release(item, self.name, exc)
+            self.counts['failed'] += 1
+            self._log(f'error: {item.category}/{item.city} fetch failed: {exc}')
+            return
+        if self.queue.post(item, self.name, records):
+            self.counts['posted'] += 1
+            self.counts['rows'] += len(records)
+        else:
+            # Someone else has the item now; their results will be written.
+            self.counts['lost'] += 1
+            self._log(f'warning: {item.category}/{item.city} lease expired before its results were posted')
+
+    def _log(self, message):
+        if self.log_stream is not None:
+            print(message, file=self.log_stream)
@@ -1,23 +1,83 @@
 """
 sqlite3 persistence for craigsail.
 
-Two tables:
+Tables:
 
   listings      one row per craigslist posting, keyed by the craigslist id.
                 Re-running a search updates the existing row rather than
                 appending a duplicate.
 
+  blobs         compressed posting bodies and attribute JSON, keyed by a
+                hash of their content. listings only carries the hashes, so
+                the hot table stays small enough for the price/geo queries
+                to run out of the page cache, and an unchanged body is never
+                rewritten.
+
   price_history one row per (listing, price) change, appended only when the
                 price actually moves. This is what backs price tracking and
                 buy-level alerts.
+
+  price_rollups daily/weekly open/low/high/close per listing, standing in
+                for the price_history rows older than the compaction window
+                that they replaced (see CraigsailDB.compact_price_history).
+
+  sweeps        one row per completed (category, city) sweep, with a hash
+                of the search filters it ran with. Listings a sweep no
+                longer sees are marked delisted, which is how live listings
+                are told apart from sold/removed ones. The CLI's --max-age
+                answers from the database instead of scraping when a sweep
+                with the same filters finished recently enough.
+
+  listing_features
+                per-listing features for comparables(): the category's
+                COMPARABLE_FEATURES as packed floats, its COMPARABLE_LABELS
+                and location. Rewritten (with a new seq) whenever a
+                listing's content changes, so an in-memory index catches up
+                by reading the rows past the last seq it saw.
+
+  listing_attributes
+                every posted attribute as a (listing_id, key, value) row,
+                keys folded through the category's COLUMN_ALIASES. Written
+                with the listing whenever its content changes; attributes()
+                and load_listings(attributes=...) pivot just the keys they
+                are asked for.
+
+  deal_models   one fitted deals.DealModel per category. save_listings
+                scores the listings it writes against it into
+                listings.deal_score; fit_deal_model refits and rescores the
+                whole category.
+
+  listing_changes
+                append-only feed of map-visible changes (insert, price,
+                delist) in commit order, read by the web app's /map/stream.
+
+  work_items,   a distributed sweep (see craigsail.coordinator): one leased
+  work_results  item per (category, city) shard for `craigsail worker`
+                processes to claim, and the compressed record batches they
+                post back for the coordinator to write.
+
+  runs,         per-run stage timings and counters from instrument.RunMetrics,
+  run_stages    kept for trend analysis of ingest performance.
 """
 from contextlib import contextmanager
 from pathlib import Path
+import gzip
+import hashlib
 import json
 import sqlite3
+import threading
+import time
+import zlib
 
+import numpy as np
 import pandas as pd
 
+from .categories import CATEGORIES
+from .comparables import ComparablesIndex, feature_rows
+from .deals import DealModel
+from .instrument import NULL_METRICS
+from .search import Search
+
 # Columns promoted out of the craigslist payload into real table columns.
 # Anything else the API returns is kept in the `attributes` JSON blob so we
 # never silently drop data.
@@ -57,16 +117,27 @@ CREATE TABLE IF NOT EXISTS listings (
     last_updated  TEXT,
     created       TEXT,
     repost_of     TEXT,
-    body          TEXT,
-    attributes    TEXT,
+    body_hash     TEXT,
+    attributes_hash TEXT,
+    content_hash  TEXT,
     first_seen    TEXT NOT NULL,
-    last_seen     TEXT NOT NULL
+    last_seen     TEXT NOT NULL,
+    delisted_at   TEXT,
+    days_on_market REAL,
+    final_price   REAL,
+    deal_score    REAL
 );
 
 CREATE INDEX IF NOT EXISTS idx_listings_city     ON listings (city);
 CREATE INDEX IF NOT EXISTS idx_listings_category ON listings (category);
 CREATE INDEX IF NOT EXISTS idx_listings_price    ON listings (price);
 
+CREATE TABLE IF NOT EXISTS blobs (
+    hash  TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data  BLOB NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS price_history (
     id         INTEGER PRIMARY KEY AUTOINCREMENT,
     listing_id TEXT NOT NULL,
@@ -76,8 +147,293 @@ CREATE TABLE IF NOT EXISTS price_history (
 );
 
 CREATE INDEX IF NOT EXISTS idx_price_history_listing ON price_history (listing_id);
+
+CREATE TABLE IF NOT EXISTS price_rollups (
+    listing_id   TEXT NOT NULL,
+    period       TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    open         REAL,
+    low          REAL,
+    high         REAL,
+    close        REAL,
+    observations INTEGER NOT NULL,
+    PRIMARY KEY (listing_id, period, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sweeps (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL,
+    city     TEXT NOT NULL,
+    finished TEXT NOT NULL,
+    seen     INTEGER NOT NULL,
+    delisted INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sweeps_shard ON sweeps (category, city, finished);
+
+CREATE TABLE IF NOT EXISTS listing_changes (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    listing_id TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    changed    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS listing_features (
+    seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+    listing_id   TEXT NOT NULL UNIQUE,
+    category     TEXT NOT NULL,
+    content_hash TEXT,
+    vector       BLOB NOT NULL,
+    labels       TEXT NOT NULL,
+    latitude     REAL,
+    longitude    REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_features_category ON listing_features (category, seq);
+
+CREATE TABLE IF NOT EXISTS listing_attributes (
+    listing_id TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    PRIMARY KEY (listing_id, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_listing_attributes_key ON listing_attributes (key, value);
+
+CREATE TABLE IF NOT EXISTS deal_models (
+    category TEXT PRIMARY KEY,
+    fitted   TEXT NOT NULL,
+    rows     INTEGER NOT NULL,
+    model    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS work_items (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    sweep        TEXT NOT NULL,
+    category     TEXT NOT NULL,
+    city         TEXT NOT NULL,
+    filters      TEXT NOT NULL,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    worker       TEXT,
+    lease_until  REAL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    rows         INTEGER,
+    error        TEXT,
+    UNIQUE (sweep, category, city)
+);
+
+CREATE INDEX IF NOT EXISTS idx_work_items_state ON work_items (state, lease_until);
+
+CREATE TABLE IF NOT EXISTS work_results (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id  INTEGER NOT NULL,
+    rows     INTEGER NOT NULL,
+    codec    TEXT NOT NULL,
+    data     BLOB NOT NULL,
+    FOREIGN KEY (item_id) REFERENCES work_items (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_work_results_item ON work_results (item_id);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT,
+    started  TEXT NOT NULL,
+    seconds  REAL,
+    listings INTEGER,
+    metrics  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS run_stages (
+    run_id     INTEGER NOT NULL,
+    stage      TEXT NOT NULL,
+    city       TEXT,
+    seconds    REAL,
+    rows       INTEGER,
+    bytes      INTEGER,
+    statements INTEGER,
+    FOREIGN KEY (run_id) REFERENCES runs (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_stages_run ON run_stages (run_id);
 """
 
+# Indexes over columns that migrate() may have to add first, so they are
+# created after it runs rather than in SCHEMA.
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_sweeps_filters ON sweeps (category, city, filter_hash, finished);
+CREATE INDEX IF NOT EXISTS idx_listings_live
+    ON listings (category, city) WHERE delisted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_listings_sold
+    ON listings (category, days_on_market, final_price) WHERE delisted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_listings_deal
+    ON listings (category, deal_score) WHERE delisted_at IS NULL;
+"""
+
+
+# Columns added to listings after the first release. Older database files are
+# brought up to date by CraigsailDB.migrate() when they are opened.
+LISTING_COLUMNS = {
+    'body_hash': 'TEXT',
+    'attributes_hash': 'TEXT',
+    'content_hash': 'TEXT',
+    'delisted_at': 'TEXT',
+    'days_on_market': 'REAL',
+    'final_price': 'REAL',
+    'deal_score': 'REAL',
+}
+
+# Likewise for sweeps.
+SWEEP_COLUMNS = {
+    'filter_hash': 'TEXT',
+}
+
+# Search filters a cached answer can honour, and the SQL each one becomes
+# (see filter_predicates). bundle_duplicates only changes how craigslist
+# pages results, so it has no predicate.
+CACHEABLE_FILTERS = {'query', 'search_titles', 'has_image', 'min_price', 'max_price', 'bundle_duplicates'}
+
+# price_drops(order_by=) -> ORDER BY clause.
+PRICE_DROP_ORDERS = {
+    'change': 'change ASC',
+    'deal': 'l.deal_score IS NULL, l.deal_score DESC',
+}
+
+# Text columns that live compressed in `blobs` rather than on listings.
+BLOB_COLUMNS = ['body', 'attributes']
+
+# zstandard compresses posting text noticeably better and faster than zlib,
+# but it is an optional dependency. Each blob records the codec it was written
+# with, so a database can mix both.
+zstd = None
+
+
+def _load_zstd():
+    """
+    Import zstandard on first use. Returns the module, or False when it is
+    not installed.
+    """
+    global zstd
+    if zstd is None:
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = False
+        zstd = zstandard
+    return zstd
+
+
+def _content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _compress(text):
+    """
+    Compress text for the blobs table. Returns (codec, data).
+    """
+    raw = text.encode('utf-8')
+    zstandard = _load_zstd()
+    if zstandard:
+        return 'zstd', zstandard.ZstdCompressor(level=9).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+
+def _decompress(codec, data):
+    """
+    Inverse of _compress. Registered on every connection as the `inflate`
+    SQL function so blobs are only decompressed when a query selects them.
+    """
+    if data is None:
+        return None
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    if codec == 'zstd':
+        zstandard = _load_zstd()
+        if not zstandard:
+            raise ImportError(
+                'This database holds zstd-compressed blobs. '
+                'Install zstandard with `pip install zstandard` to read them.'
+            )
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    raise ValueError(f'Unknown blob codec {codec!r}.')
+
+
+def _record_hash(record):
+    """
+    Hash of everything save_listings would write for a record, bar the
+    first_seen/last_seen timestamps. Equal hashes mean the stored row is
+    already up to date.
+    """
+    content = {key: value for key, value in record.items() if key not in ('first_seen', 'last_seen')}
+    return _content_hash(json.dumps(content, sort_keys=True, default=str))
+
+
+def filters_hash(filters):
+    """
+    Stable hash of a search's filters dict, so sweeps run with the same
+    filters can be found again whatever order the keys were given in.
+    """
+    return _content_hash(json.dumps(filters or {}, sort_keys=True, default=str))
+
+
+def filter_predicates(filters):
+    """
+    Turn a search's FILTERS into SQL over listings, aliased l, with the
+    posting body joined in as b. Returns (clauses, params). Raises
+    ValueError for a filter the database cannot answer (search_distance,
+    posted_today, ...).
+
+    query matches every whitespace-separated term case-insensitively, in
+    the title, or in the title or body when search_titles is false. That
+    is close to, not exactly, craigslist's own matching.
+    """
+    unsupported = set(filters) - CACHEABLE_FILTERS
+    if unsupported:
+        raise ValueError(f'Cannot answer filter(s) {sorted(unsupported)} from the database.')
+
+    clauses, params = [], []
+    if filters.get('has_image'):
+        clauses.append('l.has_image = 1')
+    if filters.get('min_price') is not None:
+        clauses.append('l.price >= ?')
+        params.append(float(filters['min_price']))
+    if filters.get('max_price') is not None:
+        clauses.append('l.price <= ?')
+        params.append(float(filters['max_price']))
+    for term in str(filters.get('query') or '').split():
+        pattern = f'%{term}%'
+        if filters.get('search_titles'):
+            clauses.append('l.name LIKE ?')
+            params.append(pattern)
+        else:
+            clauses.append("(l.name LIKE ? OR COALESCE(inflate(b.codec, b.data), '') LIKE ?)")
+            params.extend([pattern, pattern])
+    return clauses, params
+
+
+def _float_or_none(value):
+    return None if value is None or pd.isna(value) else float(value)
+
+
+def _week_start(dates):
+    """
+    Monday (as YYYY-MM-DD) of the week each ISO date/timestamp string falls in.
+    """
+    days = pd.to_datetime(dates.str[:10])
+    return (days - pd.to_timedelta(days.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d')
+
+
+def _text_or_none(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return str(value)
+
 
 def _parse_geotag(geotag):
     """
@@ -102,6 +458,46 @@ def _parse_geotag(geotag):
     return None, None
 
 
+class SaveResult(tuple):
+    """
+    What save_listings did. Unpacks as (inserted, updated, price_changes);
+    `updated` is further split into `changed` (rewritten) and `touched`
+    (content unchanged, only last_seen bumped).
+    """
+
+    def __new__(cls, inserted=0, changed=0, touched=0, price_changes=0):
+        result = super().__new__(cls, (inserted, changed + touched, price_changes))
+        result.changed = changed
+        result.touched = touched
+        return result
+
+    @property
+    def inserted(self):
+        return self[0]
+
+    @property
+    def updated(self):
+        return self[1]
+
+    @property
+    def price_changes(self):
+        return self[2]
+
+    def __add__(self, other):
+        return SaveResult(
+            self.inserted + other.inserted,
+            self.changed + other.changed,
+            self.touched + other.touched,
+            self.price_changes + other.price_changes,
+        )
+
+    def __repr__(self):
+        return (
+            f'SaveResult(inserted={self.inserted}, changed={self.changed}, '
+            f'touched={self.touched}, price_changes={self.price_changes})'
+        )
+
+
 class CraigsailDB:
     """
     Thin wrapper over a sqlite3 database file.
@@ -110,12 +506,22 @@ class CraigsailDB:
         db = CraigsailDB('data/craigsail.db')
         db.save_listings(df, category='boo')
         db.price_history('7612345678')
+
+    Pass an instrument.RunMetrics as metrics to count statements and time
+    commits and save_listings stages.
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, metrics=None):
         self.db_path = Path(db_path)
+        self.metrics = metrics or NULL_METRICS
         if self.db_path.parent != Path(''):
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Category -> ComparablesIndex, built on the first comparables() call.
+        # Web requests share them, so updates and queries take turns.
+        self.comparables_indexes = {}
+        self.comparables_lock = threading.RLock()
+        # Category -> (fitted, DealModel), reloaded when deal_models changes.
+        self.deal_models = {}
         self.create_tables()
 
     @contextmanager
@@ -125,9 +531,14 @@ class CraigsailDB:
         """
         conn = sqlite3.connect(str(self.db_path))
         conn.row_factory = sqlite3.Row
+        conn.create_function('inflate', 2, _decompress, deterministic=True)
+        if self.metrics is not NULL_METRICS:
+            conn.set_trace_callback(lambda statement: self.metrics.count('db_statements'))
         try:
             yield conn
+            start = time.perf_counter()
             conn.commit()
+            self.metrics.count('db_commit_seconds', time.perf_counter() - start)
         except Exception:
             conn.rollback()
             raise
@@ -137,13 +548,93 @@ class CraigsailDB:
     def create_tables(self):
         with self.connect() as conn:
             conn.executescript(SCHEMA)
+        self.migrate()
+
+    def migrate(self):
+        """
+        Bring a database file written by an older craigsail up to the
+        current schema: add missing listings columns, and move inline
+        body/attributes text into the compressed blobs table. The file is
+        vacuumed once after moving text so the freed pages are returned.
+        """
+        with self.connect() as conn:
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(listings)')}
+
+            for column, declaration in LISTING_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE listings ADD COLUMN {column} {declaration}')
+            sweep_columns = {row['name'] for row in conn.execute('PRAGMA table_info(sweeps)')}
+            for column, declaration in SWEEP_COLUMNS.items():
+                if column not in sweep_columns:
+                    conn.execute(f'ALTER TABLE sweeps ADD COLUMN {column} {declaration}')
+            conn.executescript(MIGRATED_INDEXES)
+
+            legacy = [column for column in BLOB_COLUMNS if column in existing]
+            if not legacy:
+                return
+
+            rows = conn.execute(f'SELECT id, {", ".join(legacy)} FROM listings').fetchall()
+            for row in rows:
+                hashes = {
+                    f'{column}_hash': self._store_blob(conn, _text_or_none(row[column]))
+                    for column in legacy
+                }
+                assignments = ', '.join(f'{column} = :{column}' for column in hashes)
+                conn.execute(f'UPDATE listings SET {assignments} WHERE id = :id', hashes | {'id': row['id']})
+
+            for column in legacy:
+                conn.execute(f'ALTER TABLE listings DROP COLUMN {column}')
+
+        # VACUUM cannot run inside the transaction above.
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    def _store_blob(self, conn, text, previous_hash=None):
+        """
+        Content-address text into the blobs table and return its hash.
+        Compression only happens for content the database has not seen, so
+        a re-seen listing with an unchanged body costs one hash and no write.
+        """
+        if text is None:
+            return None
+
+        digest = _content_hash(text)
+        if digest == previous_hash:
+            return digest
+
+        if conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone() is None:
+            codec, data = _compress(text)
+            conn.execute(
+                'INSERT INTO blobs (hash, codec, data) VALUES (?, ?, ?)',
+                (digest, codec, data),
+            )
+        return digest
+
+    def prune_blobs(self):
+        """
+        Delete blobs no listing references any more (a body that was since
+        edited, say). Returns the number of blobs removed.
+        """
+        with self.connect() as conn:
+            return conn.execute(
+                """
+                DELETE FROM blobs WHERE hash NOT IN (
+                    SELECT body_hash FROM listings WHERE body_hash IS NOT NULL
+                    UNION
+                    SELECT attributes_hash FROM listings WHERE attributes_hash IS NOT NULL
+                )
+                """
+            ).rowcount
 
-    def _to_records(self, df, category):
+    def _to_records(self, df, category, observed=None):
         """
         Reshape a search DataFrame into rows matching the listings table.
         Unknown columns are folded into the `attributes` JSON blob.
         """
-        now = pd.Timestamp.utcnow().isoformat()
+        now = observed or pd.Timestamp.now('UTC').isoformat()
         records = []
 
         for _, row in df.iterrows():
@@ -184,86 +675,602 @@ class CraigsailDB:
                 'last_updated': str(data.get('last_updated')) if data.get('last_updated') is not None else None,
                 'created': str(data.get('created')) if data.get('created') is not None else None,
                 'repost_of': str(data.get('repost_of')) if data.get('repost_of') is not None else None,
-                'body': data.get('body'),
+                'body': _text_or_none(data.get('body')),
                 'attributes': json.dumps(extras, default=str),
                 'first_seen': now,
                 'last_seen': now,
             })
+            records[-1]['content_hash'] = _record_hash(records[-1])
 
         return records
 
-    def save_listings(self, df, category):
+    def save_listings(self, df, category, observed=None):
         """
         Upsert listings, recording a price_history row whenever a listing is
-        new or its price has changed. Returns (inserted, updated, price_changes).
+        new or its price has changed. Returns a SaveResult, which unpacks as
+        (inserted, updated, price_changes).
+
+        Rows whose content hash matches the stored one only have last_seen
+        bumped, in one batched statement, instead of a full rewrite.
+
+        New, relisted and repriced listings are appended to listing_changes
+        in the same transaction.
+
+        observed is when the results were fetched (an ISO timestamp, now by
+        default). Replaying an older observation, as `craigsail reprocess`
+        does, refreshes the derived content but never moves a listing's
+        price, price history or last_seen backwards, and does not relist
+        what was delisted after it.
+        """
+        records = self.to_records(df, category, observed)
+        if not records:
+            return SaveResult()
+
+        with self.metrics.stage('save') as stage, self.connect() as conn:
+            stage['rows'] = len(records)
+            statements_before = self.metrics.counters.get('db_statements', 0)
+            result = self.write_records(conn, records)
+            stage['statements'] = self.metrics.counters.get('db_statements', 0) - statements_before
+
+        return result
+
+    def to_records(self, df, category, observed=None):
+        """
+        The listings rows save_listings would write for df. This is the
+        pandas-heavy half of a save and needs no connection, so callers
+        feeding a single writer (see ingest.IngestWriter) run it on their
+        own thread.
         """
         assert isinstance(df, pd.DataFrame), f'df must be a pandas DataFrame. Got {type(df)}.'
 
-        records = self._to_records(df, category)
+        with self.metrics.stage('to_records') as stage:
+            records = self._to_records(df, category, observed)
+            stage['rows'] = len(records)
+        return records
+
+    def write_records(self, conn, records):
+        """
+        Upsert records from to_records inside the caller's transaction on
+        conn. Returns a SaveResult.
+        """
         if not records:
-            return 0, 0, 0
+            return SaveResult()
 
-        inserted = updated = price_changes = 0
+        inserted = changed = price_changes = 0
+        touched = []
+        relisted = []
+        changes = []
+        rewritten = {}
 
-        with self.connect() as conn:
-            for record in records:
-                existing = conn.execute(
-                    'SELECT id, price FROM listings WHERE id = ?', (record['id'],)
-                ).fetchone()
+        existing_rows = self._existing_rows(conn, [record['id'] for record in records])
 
-                if existing is None:
-                    conn.execute(
-                        """
-                        INSERT INTO listings (
-                            id, name, url, city, category, price, where_, geotag,
-                            latitude, longitude, has_image, datetime, last_updated,
-                            created, repost_of, body, attributes, first_seen, last_seen
-                        ) VALUES (
-                            :id, :name, :url, :city, :category, :price, :where_, :geotag,
-                            :latitude, :longitude, :has_image, :datetime, :last_updated,
-                            :created, :repost_of, :body, :attributes, :first_seen, :last_seen
-                        )
-                        """,
-                        record,
+        for record in records:
+            existing = existing_rows.get(record['id'])
+
+            # An observation older than the stored one only refreshes content.
+            replayed = existing is not None and record['last_seen'] < existing['last_seen']
+            if replayed:
+                record['price'] = existing['price']
+                record['last_seen'] = existing['last_seen']
+                del record['content_hash']
+                record['content_hash'] = _record_hash(record)
+
+            relist = (
+                existing is not None and existing['delisted_at'] is not None
+                and record['last_seen'] > existing['delisted_at']
+            )
+            if relist:
+                relisted.append((record['id'],))
+                changes.append((record['id'], 'insert', record['last_seen']))
+
+            if existing is not None and existing['content_hash'] == record['content_hash']:
+                touched.append((record['last_seen'], record['id']))
+                continue
+
+            for column in BLOB_COLUMNS:
+                previous = existing[f'{column}_hash'] if existing is not None else None
+                record[f'{column}_hash'] = self._store_blob(conn, record[column], previous)
+            rewritten[record['id']] = record
+
+            if existing is None:
+                conn.execute(
+                    """
+                    INSERT INTO listings (
+                        id, name, url, city, category, price, where_, geotag,
+                        latitude, longitude, has_image, datetime, last_updated,
+                        created, repost_of, body_hash, attributes_hash, content_hash,
+                        first_seen, last_seen
+                    ) VALUES (
+                        :id, :name, :url, :city, :category, :price, :where_, :geotag,
+                        :latitude, :longitude, :has_image, :datetime, :last_updated,
+                        :created, :repost_of, :body_hash, :attributes_hash, :content_hash,
+                        :first_seen, :last_seen
                     )
-                    inserted += 1
+                    """,
+                    record,
+                )
+                inserted += 1
+                changes.append((record['id'], 'insert', record['last_seen']))
+                conn.execute(
+                    'INSERT INTO price_history (listing_id, price, observed) VALUES (?, ?, ?)',
+                    (record['id'], record['price'], record['last_seen']),
+                )
+                price_changes += 1
+            else:
+                conn.execute(
+                    """
+                    UPDATE listings SET
+                        name = :name, url = :url, city = :city, category = :category,
+                        price = :price, where_ = :where_, geotag = :geotag,
+                        latitude = :latitude, longitude = :longitude,
+                        has_image = :has_image, datetime = :datetime,
+                        last_updated = :last_updated, created = :created,
+                        repost_of = :repost_of, body_hash = :body_hash,
+                        attributes_hash = :attributes_hash, content_hash = :content_hash,
+                        last_seen = :last_seen
+                    WHERE id = :id
+                    """,
+                    record,
+                )
+                changed += 1
+
+                if existing['price'] != record['price']:
                     conn.execute(
                         'INSERT INTO price_history (listing_id, price, observed) VALUES (?, ?, ?)',
                         (record['id'], record['price'], record['last_seen']),
                     )
                     price_changes += 1
-                else:
-                    conn.execute(
-                        """
-                        UPDATE listings SET
-                            name = :name, url = :url, city = :city, category = :category,
-                            price = :price, where_ = :where_, geotag = :geotag,
-                            latitude = :latitude, longitude = :longitude,
-                            has_image = :has_image, datetime = :datetime,
-                            last_updated = :last_updated, created = :created,
-                            repost_of = :repost_of, body = :body,
-                            attributes = :attributes, last_seen = :last_seen
-                        WHERE id = :id
-                        """,
-                        record,
+                    changes.append((record['id'], 'price', record['last_seen']))
+
+            # A listing can appear twice in one sweep (reposts, paging
+            # overlap); the second copy must see the first as existing.
+            existing_rows[record['id']] = {
+                key: record[key]
+                for key in ('price', 'content_hash', 'body_hash', 'attributes_hash', 'last_seen')
+            } | {'delisted_at': existing['delisted_at'] if existing is not None and not relist else None}
+
+        conn.executemany('UPDATE listings SET last_seen = ? WHERE id = ?', touched)
+        conn.executemany(
+            'UPDATE listings SET delisted_at = NULL, days_on_market = NULL, final_price = NULL '
+            'WHERE id = ?',
+            relisted,
+        )
+        conn.executemany(
+            'INSERT INTO listing_changes (listing_id, kind, changed) VALUES (?, ?, ?)', changes
+        )
+        if rewritten:
+            frame = pd.DataFrame(list(rewritten.values()))
+            for category, listings in frame.groupby('category', sort=False):
+                self._write_features(conn, category, listings)
+                self._write_attributes(conn, category, listings)
+        self._set_meta(conn, 'last_ingest', records[0]['last_seen'])
+        if inserted or changed or relisted:
+            self._bump_data_version(conn)
+
+        return SaveResult(inserted, changed, len(touched), price_changes)
+
+    def _existing_rows(self, conn, ids, chunk_size=500):
+        """
+        Fetch the columns save_listings compares against for every id in
+        one query per chunk, rather than one SELECT per record.
+        """
+        ids = list(dict.fromkeys(ids))
+        rows = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in conn.execute(
+                'SELECT id, price, content_hash, body_hash, attributes_hash, last_seen, delisted_at '
+                f'FROM listings WHERE id IN ({placeholders})',
+                chunk,
+            ):
+                rows[row['id']] = row
+        return rows
+
+    def record_run(self, metrics, category=None, listings=None):
+        """
+        Store a RunMetrics summary: one runs row with the full JSON, and one
+        run_stages row per stage/city so timings can be trended in SQL.
+        Returns the run id.
+        """
+        summary = metrics.summary()
+        with self.connect() as conn:
+            run_id = conn.execute(
+                'INSERT INTO runs (category, started, seconds, listings, metrics) VALUES (?, ?, ?, ?, ?)',
+                (category, summary['started'], summary['seconds'], listings, json.dumps(summary, default=str)),
+            ).lastrowid
+            conn.executemany(
+                'INSERT INTO run_stages (run_id, stage, city, seconds, rows, bytes, statements) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (run_id, record['stage'], record['city'], record['seconds'],
+                     record.get('rows'), record.get('bytes'), record.get('statements'))
+                    for record in metrics.stages
+                ],
+            )
+        return run_id
+
+    def mark_delisted(self, category, city, seen_ids, when=None, filters=None):
+        """
+        Record a completed (category, city) sweep and mark every live listing
+        in that shard which the sweep did not see as delisted, in a single
+        set-based UPDATE. days_on_market (first_seen to last_seen) and
+        final_price are frozen on the row at the same time.
+
+        An empty seen_ids is treated as a failed sweep rather than a market
+        where everything sold, and delists nothing. filters, the search's
+        FILTERS, are logged with the sweep for last_swept, and limit the
+        delisting to the listings the sweep could have returned: a sweep
+        with max_price=5000 says nothing about an $8000 boat. A sweep with
+        filters sqlite cannot express (see filter_predicates) delists
+        nothing. Returns the number of listings delisted.
+        """
+        with self.connect() as conn:
+            return self.write_delisted(conn, category, city, seen_ids, when, filters)
+
+    def write_delisted(self, conn, category, city, seen_ids, when=None, filters=None):
+        """
+        mark_delisted inside the caller's transaction on conn.
+        """
+        when = when or pd.Timestamp.now('UTC').isoformat()
+        seen_ids = [(str(listing_id),) for listing_id in seen_ids]
+        delisted = 0
+
+        try:
+            clauses, params = filter_predicates(filters or {})
+        except ValueError:
+            clauses = None  # cannot tell which listings the sweep covered
+
+        if seen_ids and clauses is not None:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS sweep_seen (id TEXT PRIMARY KEY)')
+            conn.execute('DELETE FROM temp.sweep_seen')
+            conn.executemany('INSERT OR IGNORE INTO temp.sweep_seen (id) VALUES (?)', seen_ids)
+            delisted_ids = conn.execute(
+                """
+                UPDATE listings SET
+                    delisted_at = ?,
+                    days_on_market = julianday(last_seen) - julianday(first_seen),
+                    final_price = price
+                WHERE id IN (
+                    SELECT l.id FROM listings l
+                    LEFT JOIN blobs b ON b.hash = l.body_hash
+                    WHERE l.category = ? AND l.city = ?
+                      AND l.delisted_at IS NULL
+                      AND l.id NOT IN (SELECT id FROM temp.sweep_seen)
+                """ + ''.join(f' AND {clause}' for clause in clauses) + """
+                )
+                RETURNING id
+                """,
+                [when, category, city, *params],
+            ).fetchall()
+            delisted = len(delisted_ids)
+            if delisted:
+                conn.executemany(
+                    "INSERT INTO listing_changes (listing_id, kind, changed) VALUES (?, 'delist', ?)",
+                    [(row['id'], when) for row in delisted_ids],
+                )
+                self._bump_data_version(conn)
+
+        conn.execute(
+            'INSERT INTO sweeps (category, city, finished, seen, delisted, filter_hash) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (category, city, when, len(seen_ids), delisted, filters_hash(filters)),
+        )
+
+        return delisted
+
+    def last_swept(self, category, city, filters=None):
+        """
+        When the last sweep of (category, city) with exactly these filters
+        finished, as a UTC Timestamp, or None if there has not been one.
+        Sweeps that saw nothing are ignored, as mark_delisted treats those
+        as failed.
+        """
+        with self.connect() as conn:
+            row = conn.execute(
+                'SELECT MAX(finished) FROM sweeps '
+                'WHERE category = ? AND city = ? AND filter_hash = ? AND seen > 0',
+                (category, city, filters_hash(filters)),
+            ).fetchone()
+        return None if row[0] is None else pd.Timestamp(row[0])
+
+    def cached_listings(self, category, city, filters):
+        """
+        The live listings a (category, city) search with these filters
+        would return, answered from the database. Raises ValueError for
+        filters filter_predicates cannot express.
+        """
+        clauses, params = filter_predicates(filters)
+        query = (
+            'SELECT l.* FROM listings l '
+            'LEFT JOIN blobs b ON b.hash = l.body_hash '
+            'WHERE l.category = ? AND l.city = ? AND l.delisted_at IS NULL'
+        )
+        query += ''.join(f' AND {clause}' for clause in clauses)
+
+        with self.connect() as conn:
+            return pd.read_sql_query(query, conn, params=[category, city, *params])
+
+    def refresh_features(self, category):
+        """
+        Write listing_features rows (and deal scores) for the category's
+        listings that have none yet or whose content changed since theirs
+        was written - listings saved before features existed, or under an
+        older COMPARABLE_FEATURES. save_listings keeps them current after
+        that. Run by fit_deal_model, and so by `craigsail rescore`; the
+        comparables index only reads. Returns the number of rows written.
+        """
+        with self.metrics.stage('features') as stage, self.connect() as conn:
+            stale = pd.read_sql_query(
+                'SELECT l.id, l.content_hash, l.latitude, l.longitude, l.price, l.city, '
+                'inflate(a.codec, a.data) AS attributes '
+                'FROM listings l '
+                'LEFT JOIN listing_features f ON f.listing_id = l.id '
+                'LEFT JOIN blobs a ON a.hash = l.attributes_hash '
+                'WHERE l.category = ? AND (f.listing_id IS NULL OR f.content_hash IS NOT l.content_hash)',
+                conn,
+                params=[category],
+            )
+            stage['rows'] = self._write_features(conn, category, stale)
+            if stage['rows']:
+                self._bump_data_version(conn)
+        return stage['rows']
+
+    def _write_features(self, conn, category, listings):
+        """
+        Write listing_features rows for a frame of listings (id,
+        content_hash, latitude, longitude, price, city and attributes JSON)
+        and score them against the category's deal model, if it has one.
+        Returns the number of rows written.
+        """
+        if listings.empty:
+            return 0
+
+        search_class = CATEGORIES.get(category, Search)
+        rows = feature_rows(search_class, category, listings)
+        # REPLACE deletes and reinserts, so a re-featured listing gets a
+        # new seq and index updates pick it up.
+        conn.executemany(
+            'INSERT OR REPLACE INTO listing_features '
+            '(listing_id, category, content_hash, vector, labels, latitude, longitude) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+
+        model = self._deal_model(conn, category)
+        if model is not None:
+            vectors = np.frombuffer(b''.join(row[3] for row in rows), dtype=float)
+            scores = model.score(vectors, listings['price'].tolist(), listings['city'].tolist())
+            conn.executemany(
+                'UPDATE listings SET deal_score = ? WHERE id = ?',
+                [
+                    (None if np.isnan(score) else float(score), listing_id)
+                    for score, listing_id in zip(scores, listings['id'])
+                ],
+            )
+        return len(rows)
+
+    def refresh_attributes(self, category):
+        """
+        Write listing_attributes rows for the category's listings that have
+        none - those saved before the table existed. save_listings keeps
+        them current after that. Returns the number of rows written.
+        """
+        with self.metrics.stage('attributes') as stage, self.connect() as conn:
+            missing = pd.read_sql_query(
+                'SELECT l.id, inflate(a.codec, a.data) AS attributes '
+                'FROM listings l '
+                'LEFT JOIN blobs a ON a.hash = l.attributes_hash '
+                'WHERE l.category = ? '
+                'AND NOT EXISTS (SELECT 1 FROM listing_attributes la WHERE la.listing_id = l.id)',
+                conn,
+                params=[category],
+            )
+            stage['rows'] = self._write_attributes(conn, category, missing)
+        return stage['rows']
+
+    def _write_attributes(self, conn, category, listings):
+        """
+        Replace the listing_attributes rows of a frame of listings (id and
+        attributes JSON) with the `attrs` each one was saved with. Returns
+        the number of rows written.
+        """
+        if listings.empty:
+            return 0
+
+        search_class = CATEGORIES.get(category, Search)
+        attrs = pd.Series(
+            [json.loads(attributes or '{}').get('attrs') for attributes in listings['attributes']],
+            index=listings['id'].astype(str).to_numpy(),
+        )
+        long_df = search_class.long_attributes(attrs)
+
+        conn.executemany(
+            'DELETE FROM listing_attributes WHERE listing_id = ?', [(listing_id,) for listing_id in attrs.index]
+        )
+        conn.executemany(
+            'INSERT INTO listing_attributes (listing_id, key, value) VALUES (?, ?, ?)',
+            long_df[['row', 'key', 'value']].itertuples(index=False, name=None),
+        )
+        return len(long_df)
+
+    def attributes(self, keys, category=None, ids=None):
+        """
+        The listing_attributes values of `keys` as a wide frame indexed by
+        listing id, one column per key in the order given. Only listings
+        with at least one of the keys are returned. Narrow to a category
+        or a list of ids.
+        """
+        keys = list(keys)
+        assert keys, 'attributes needs at least one key.'
+
+        query = (
+            'SELECT la.listing_id, la.key, la.value FROM listing_attributes la '
+            f'WHERE la.key IN ({", ".join("?" * len(keys))})'
+        )
+        params = list(keys)
+        if category:
+            query += ' AND la.listing_id IN (SELECT id FROM listings WHERE category = ?)'
+            params.append(category)
+
+        with self.connect() as conn:
+            if ids is None:
+                long_df = pd.read_sql_query(query, conn, params=params)
+            else:
+                ids = [str(listing_id) for listing_id in ids]
+                # One query per chunk, under sqlite's bound-parameter limit.
+                long_df = pd.concat([
+                    pd.read_sql_query(
+                        f'{query} AND la.listing_id IN ({", ".join("?" * len(chunk))})',
+                        conn, params=params + chunk,
                     )
-                    updated += 1
+                    for chunk in (ids[start:start + 500] for start in range(0, len(ids), 500))
+                ] or [pd.DataFrame(columns=['listing_id', 'key', 'value'])])
 
-                    if existing['price'] != record['price']:
-                        conn.execute(
-                            'INSERT INTO price_history (listing_id, price, observed) VALUES (?, ?, ?)',
-                            (record['id'], record['price'], record['last_seen']),
-                        )
-                        price_changes += 1
+        if long_df.empty:
+            return pd.DataFrame(columns=keys, index=pd.Index([], dtype=object, name='id'), dtype=object)
+        wide = long_df.pivot(index='listing_id', columns='key', values='value')
+        return wide.reindex(columns=keys).rename_axis(index='id', columns=None)
 
-        return inserted, updated, price_changes
+    def _deal_model(self, conn, category):
+        """
+        The category's fitted DealModel, or None. Parsed once per fit.
+        """
+        row = conn.execute('SELECT fitted, model FROM deal_models WHERE category = ?', (category,)).fetchone()
+        if row is None:
+            return None
+        cached = self.deal_models.get(category)
+        if cached is None or cached[0] != row['fitted']:
+            cached = self.deal_models[category] = (row['fitted'], DealModel.from_json(row['model']))
+        return cached[1]
 
-    def load_listings(self, category=None, city=None, with_geo_only=False):
+    def deal_model_fitted(self, category):
         """
-        Read listings back as a DataFrame.
+        When the category's deal model was last fit, as a UTC Timestamp, or
+        None if it never has been.
         """
-        query = 'SELECT * FROM listings WHERE 1=1'
-        params = []
+        with self.connect() as conn:
+            row = conn.execute('SELECT fitted FROM deal_models WHERE category = ?', (category,)).fetchone()
+        return None if row is None else pd.Timestamp(row['fitted'])
+
+    def fit_deal_model(self, category, now=None):
+        """
+        Fit the category's DealModel over every stored listing with a price,
+        store it, and rescore the whole category with it in one batch.
+        Returns the model, or None (leaving any earlier model in place) when
+        there are too few priced listings to fit.
+        """
+        self.refresh_features(category)
+        search_class = CATEGORIES.get(category, Search)
+        now = pd.Timestamp.now('UTC') if now is None else pd.Timestamp(now)
+
+        with self.metrics.stage('fit_deal_model') as stage, self.connect() as conn:
+            listings = pd.read_sql_query(
+                'SELECT l.id, l.price, l.city, f.vector FROM listings l '
+                'JOIN listing_features f ON f.listing_id = l.id WHERE l.category = ?',
+                conn,
+                params=[category],
+            )
+            stage['rows'] = len(listings)
+            vectors = np.frombuffer(b''.join(listings['vector']), dtype=float)
+            prices, cities = listings['price'].tolist(), listings['city'].tolist()
+
+            model = DealModel.fit(list(search_class.COMPARABLE_FEATURES), vectors, prices, cities)
+            if model is None:
+                return None
+
+            conn.execute(
+                'INSERT INTO deal_models (category, fitted, rows, model) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (category) DO UPDATE SET '
+                'fitted = excluded.fitted, rows = excluded.rows, model = excluded.model',
+                (category, now.isoformat(), model.rows, model.to_json()),
+            )
+            scores = model.score(vectors, prices, cities)
+            conn.executemany(
+                'UPDATE listings SET deal_score = ? WHERE id = ?',
+                [
+                    (None if np.isnan(score) else float(score), listing_id)
+                    for score, listing_id in zip(scores, listings['id'])
+                ],
+            )
+            self._bump_data_version(conn)
+        return model
+
+    def comparables_index(self, category):
+        """
+        The category's ComparablesIndex, brought up to date with any ingest
+        since it was last used by loading only the listing_features rows
+        written since. Read-only: listings without features stay out of the
+        index until refresh_features backfills them.
+        """
+        version = self.data_version()
+        with self.comparables_lock:
+            index = self.comparables_indexes.get(category)
+            if index is None:
+                index = self.comparables_indexes[category] = ComparablesIndex(CATEGORIES.get(category, Search))
+            if index.data_version != version:
+                with self.connect() as conn:
+                    rows = conn.execute(
+                        'SELECT seq, listing_id, vector, labels, latitude, longitude '
+                        'FROM listing_features WHERE category = ? AND seq > ? ORDER BY seq',
+                        (category, index.seq),
+                    ).fetchall()
+                with self.metrics.stage('comparables_index') as stage:
+                    stage['rows'] = index.update(rows)
+                index.data_version = version
+        return index
+
+    def comparables(self, listing_id, k=20):
+        """
+        The k listings most like listing_id in its category, nearest first:
+        matched on the category's COMPARABLE_FEATURES and location, with
+        differing COMPARABLE_LABELS counting against a match. Delisted
+        listings are included, with their final_price. Raises KeyError for
+        an unknown listing.
+        """
+        listing_id = str(listing_id)
+        with self.connect() as conn:
+            row = conn.execute('SELECT category FROM listings WHERE id = ?', (listing_id,)).fetchone()
+        if row is None:
+            raise KeyError(listing_id)
+
+        with self.comparables_lock:
+            index = self.comparables_index(row['category'])
+            matches = index.query(listing_id, k)
+            ids = [match_id for match_id, _ in matches]
+            features = pd.DataFrame([index.features_of(match_id) for match_id in ids], index=ids)
+        if not matches:
+            return pd.DataFrame(columns=['id', 'distance'])
+
+        placeholders = ', '.join('?' * len(ids))
+        with self.connect() as conn:
+            listings = pd.read_sql_query(
+                'SELECT id, name, url, city, price, latitude, longitude, first_seen, last_seen, '
+                f'delisted_at, final_price FROM listings WHERE id IN ({placeholders})',
+                conn,
+                params=ids,
+            )
+
+        distances = pd.Series(dict(matches), name='distance')
+        return (
+            listings.set_index('id')
+            .join(features)
+            .join(distances)
+            .loc[ids]
+            .rename_axis('id')
+            .reset_index()
+        )
+
+    def sold_within(self, days, category=None, city=None):
+        """
+        Delisted listings that came down within `days` of first being seen -
+        a proxy for "sold within N days at price P".
+        """
+        query = (
+            'SELECT id, name, url, city, category, final_price, days_on_market, delisted_at '
+            'FROM listings WHERE delisted_at IS NOT NULL AND days_on_market <= ?'
+        )
+        params = [days]
 
         if category:
             query += ' AND category = ?'
@@ -271,34 +1278,388 @@ class CraigsailDB:
         if city:
             query += ' AND city = ?'
             params.append(city)
-        if with_geo_only:
-            query += ' AND latitude IS NOT NULL AND longitude IS NOT NULL'
+        query += ' ORDER BY days_on_market ASC'
 
         with self.connect() as conn:
             return pd.read_sql_query(query, conn, params=params)
 
+    def load_listings(
+        self, category=None, city=None, with_geo_only=False, with_blobs=False, live_only=False,
+        top_deals=None, attributes=None,
+    ):
+        """
+        Read listings back as a DataFrame.
+
+        body and attributes are only decompressed and returned when
+        with_blobs=True - the map and price queries never need them.
+        live_only=True leaves out delisted listings. top_deals=N returns
+        only the N live listings with the highest deal_score, best first,
+        read in order off idx_listings_deal. attributes, a list of
+        attribute keys, adds a column per key from listing_attributes.
+        """
+        if with_blobs:
+            query = (
+                'SELECT l.*, inflate(b.codec, b.data) AS body, inflate(a.codec, a.data) AS attributes '
+                'FROM listings l '
+                'LEFT JOIN blobs b ON b.hash = l.body_hash '
+                'LEFT JOIN blobs a ON a.hash = l.attributes_hash '
+                'WHERE 1=1'
+            )
+        else:
+            query = 'SELECT l.* FROM listings l WHERE 1=1'
+        params = []
+
+        if category:
+            query += ' AND l.category = ?'
+            params.append(category)
+        if city:
+            query += ' AND l.city = ?'
+            params.append(city)
+        if with_geo_only:
+            query += ' AND l.latitude IS NOT NULL AND l.longitude IS NOT NULL'
+        if live_only or top_deals is not None:
+            query += ' AND l.delisted_at IS NULL'
+        if top_deals is not None:
+            query += ' AND l.deal_score IS NOT NULL ORDER BY l.deal_score DESC LIMIT ?'
+            params.append(int(top_deals))
+
+        with self.connect() as conn:
+            listings = pd.read_sql_query(query, conn, params=params)
+        if not attributes:
+            return listings
+
+        # By id when city or top_deals narrowed the listings below their category.
+        narrowed = city or top_deals is not None
+        wide = self.attributes(attributes, category=category, ids=listings['id'] if narrowed else None)
+        return listings.join(wide, on='id')
+
     def price_history(self, listing_id):
         """
-        Full observed price trail for a single listing, oldest first.
+        A single listing's price observations, oldest first.
+
+        A day or week that compact_price_history folded comes back as one
+        row: the period's closing price, observed on the date the period
+        starts. The listing's first observation and everything newer than
+        the compaction window are returned as recorded.
         """
         with self.connect() as conn:
             return pd.read_sql_query(
-                'SELECT price, observed FROM price_history '
-                'WHERE listing_id = ? ORDER BY observed ASC',
+                """
+                SELECT price, observed FROM (
+                    SELECT id, price, observed,
+                           id = (SELECT MIN(id) FROM price_history WHERE listing_id = ?) AS first
+                    FROM price_history WHERE listing_id = ?
+                    UNION ALL
+                    SELECT NULL, close, period_start, 0 FROM price_rollups WHERE listing_id = ?
+                )
+                ORDER BY first DESC, observed, id
+                """,
                 conn,
-                params=[str(listing_id)],
+                params=[str(listing_id)] * 3,
+            )
+
+    def get_meta(self, key, default=None):
+        with self.connect() as conn:
+            return self._meta(conn, key, default)
+
+    def compact_price_history(self, keep_days=90, weekly_after_days=365, archive_dir=None, now=None):
+        """
+        Downsample old price_history so it stops growing without bound.
+
+        Observations newer than keep_days are left alone. Older ones are
+        folded per listing per day, and anything older than
+        weekly_after_days per week, into a price_rollups row with the
+        period's open/low/high/close and observation count, and the rows
+        folded in are deleted. A period is only folded when it replaces at
+        least two rows, so compaction never adds rows. A listing's first
+        observation is never folded, so price_drops answers exactly as it
+        did before; price_history reports each folded period as one row.
+
+        With archive_dir, the history of delisted listings is appended to a
+        gzipped JSONL file there and then deleted from the database, all
+        but each listing's first observation.
+
+        Safe to re-run: watermarks in the meta table make each run pick up
+        where the last one stopped. Returns a dict of counts.
+        """
+        assert weekly_after_days >= keep_days, 'weekly_after_days must not be less than keep_days.'
+        now = pd.Timestamp.now('UTC') if now is None else pd.Timestamp(now)
+        daily_cutoff = (now - pd.Timedelta(days=keep_days)).normalize()
+        weekly_cutoff = (now - pd.Timedelta(days=weekly_after_days)).normalize()
+        weekly_cutoff -= pd.Timedelta(days=weekly_cutoff.weekday())  # whole weeks only
+
+        stats = {'archived': 0, 'daily_rollups': 0, 'weekly_rollups': 0, 'deleted': 0}
+
+        with self.connect() as conn:
+            daily_from = self._meta(conn, 'compacted_daily_until', '')
+            weekly_from = self._meta(conn, 'compacted_weekly_until', '')
+
+            rows = self._foldable_history(conn, daily_from, daily_cutoff.isoformat())
+            if archive_dir is not None and not rows.empty:
+                archived, stats['archived'] = self._archive_delisted_history(conn, rows, archive_dir, now)
+                stats['deleted'] += self._delete_archived_history(conn, archived)
+                rows = rows[~rows['listing_id'].isin(archived)]
+
+            daily, folded = self._fold(rows, rows['observed'].str[:10])
+            stats['daily_rollups'] = self._merge_rollups(conn, daily, 'day')
+            stats['deleted'] += self._delete_folded(conn, folded)
+            if not rows.empty:
+                self._set_meta(conn, 'compacted_daily_until', daily_cutoff.isoformat())
+
+            # Weekly pass: fold the day rollups and the single observations
+            # the daily pass left alone into weeks.
+            if weekly_cutoff.isoformat() > weekly_from:
+                rows = self._foldable_history(conn, weekly_from, weekly_cutoff.isoformat())
+                days = pd.read_sql_query(
+                    "SELECT listing_id, period_start AS observed, open, low, high, close, observations "
+                    "FROM price_rollups WHERE period = 'day' AND period_start >= ? AND period_start < ?",
+                    conn,
+                    params=[weekly_from[:10], weekly_cutoff.strftime('%Y-%m-%d')],
+                )
+                pieces = pd.concat([rows, days.assign(id=None)], ignore_index=True)
+                weeks, folded = self._fold(pieces, _week_start(pieces['observed']))
+                stats['weekly_rollups'] = self._merge_rollups(conn, weeks, 'week')
+                stats['deleted'] += self._delete_folded(conn, folded)
+                self._set_meta(conn, 'compacted_weekly_until', weekly_cutoff.isoformat())
+
+        return stats
+
+    def changes_since(self, seq, category=None, city=None, limit=1000):
+        """
+        listing_changes after seq, oldest first, joined to each listing's
+        current map fields. Inserts and price changes of listings without
+        coordinates are left out; they never appear on the map.
+        """
+        query = (
+            'SELECT c.seq, c.kind, c.listing_id AS id, l.name, l.url, l.city, l.price, '
+            'l.where_, l.latitude, l.longitude '
+            'FROM listing_changes c JOIN listings l ON l.id = c.listing_id '
+            "WHERE c.seq > ? AND (c.kind = 'delist' OR (l.latitude IS NOT NULL AND l.longitude IS NOT NULL))"
+        )
+        params = [int(seq)]
+
+        if category:
+            query += ' AND l.category = ?'
+            params.append(category)
+        if city:
+            query += ' AND l.city = ?'
+            params.append(city)
+        query += ' ORDER BY c.seq LIMIT ?'
+        params.append(limit)
+
+        with self.connect() as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    def latest_change(self):
+        """
+        Sequence number of the newest listing_changes row, 0 when empty.
+        """
+        with self.connect() as conn:
+            return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM listing_changes').fetchone()[0]
+
+    def prune_changes(self, keep_days=7, now=None):
+        """
+        Drop listing_changes older than keep_days. A stream client that
+        reconnects from before the cutoff simply misses those deltas and
+        should reload /map. Returns the number of rows deleted.
+        """
+        now = pd.Timestamp.now('UTC') if now is None else pd.Timestamp(now)
+        cutoff = (now - pd.Timedelta(days=keep_days)).isoformat()
+        with self.connect() as conn:
+            return conn.execute('DELETE FROM listing_changes WHERE changed < ?', (cutoff,)).rowcount
+
+    def data_version(self):
+        """
+        Counter bumped by every write that changes what the listing queries
+        return. Cheap to read, so callers can key caches on it.
+        """
+        return int(self.get_meta('data_version', 0))
+
+    def last_ingest(self):
+        """
+        When save_listings last ran, as an ISO timestamp (or None) - the
+        freshness of the data without scanning listings.
+        """
+        return self.get_meta('last_ingest')
+
+    @staticmethod
+    def _bump_data_version(conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('data_version', 1) "
+            'ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1'
+        )
+
+    @staticmethod
+    def _meta(conn, key, default=None):
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row['value']
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute(
+            'INSERT INTO meta (key, value) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+            (key, str(value)),
+        )
+
+    @staticmethod
+    def _foldable_history(conn, start, end):
+        """
+        price_history rows observed in [start, end) as compaction pieces,
+        leaving out each listing's first observation.
+        """
+        rows = pd.read_sql_query(
+            'SELECT id, listing_id, price, observed FROM price_history ph '
+            'WHERE observed >= ? AND observed < ? '
+            'AND id > (SELECT MIN(id) FROM price_history WHERE listing_id = ph.listing_id) '
+            'ORDER BY id',
+            conn,
+            params=[start, end],
+        )
+        return rows.assign(
+            open=rows['price'], low=rows['price'], high=rows['price'], close=rows['price'], observations=1,
+        ).drop(columns='price')
+
+    @staticmethod
+    def _fold(pieces, period_start):
+        """
+        Group compaction pieces into one OHLC row per listing per period,
+        for the periods with at least two pieces. Returns the rollups and
+        the pieces they replace.
+        """
+        keys = ['listing_id', 'period_start']
+        pieces = pieces.assign(period_start=period_start).sort_values(['listing_id', 'observed'], kind='stable')
+        pieces = pieces[pieces.groupby(keys)['observed'].transform('size') >= 2]
+        if pieces.empty:
+            return pd.DataFrame(), pieces
+
+        rollups = pieces.groupby(keys, sort=False).agg(
+            low=('low', 'min'),
+            high=('high', 'max'),
+            observations=('observations', 'sum'),
+        )
+        rollups['open'] = pieces.drop_duplicates(keys, keep='first').set_index(keys)['open']
+        rollups['close'] = pieces.drop_duplicates(keys, keep='last').set_index(keys)['close']
+        return rollups.reset_index(), pieces
+
+    @staticmethod
+    def _delete_folded(conn, folded):
+        """
+        Delete the price_history rows and day rollups that _fold replaced.
+        Returns how many price_history rows went.
+        """
+        if folded.empty:
+            return 0
+
+        raw = folded['id'].notna()
+        conn.executemany(
+            "DELETE FROM price_rollups WHERE listing_id = ? AND period = 'day' AND period_start = ?",
+            folded.loc[~raw, ['listing_id', 'observed']].itertuples(index=False, name=None),
+        )
+        conn.executemany(
+            'DELETE FROM price_history WHERE id = ?',
+            ((int(row_id),) for row_id in folded.loc[raw, 'id']),
+        )
+        return int(raw.sum())
+
+    @staticmethod
+    def _merge_rollups(conn, rollups, period):
+        if rollups.empty:
+            return 0
+
+        conn.executemany(
+            """
+            INSERT INTO price_rollups (
+                listing_id, period, period_start, open, low, high, close, observations
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (listing_id, period, period_start) DO UPDATE SET
+                low = MIN(COALESCE(low, excluded.low), COALESCE(excluded.low, low)),
+                high = MAX(COALESCE(high, excluded.high), COALESCE(excluded.high, high)),
+                close = excluded.close,
+                observations = observations + excluded.observations
+            """,
+            [
+                (row.listing_id, period, row.period_start,
+                 _float_or_none(row.open), _float_or_none(row.low),
+                 _float_or_none(row.high), _float_or_none(row.close), int(row.observations))
+                for row in rollups.itertuples(index=False)
+            ],
+        )
+        return len(rollups)
+
+    @staticmethod
+    def _archive_delisted_history(conn, rows, archive_dir, now):
+        """
+        Append the history (observations, then rollups) of delisted
+        listings touched by this compaction run to
+        <archive_dir>/price_history_<date>.jsonl.gz. Returns the archived
+        listing ids and how many lines were written.
+        """
+        listing_ids = list(rows['listing_id'].unique())
+        delisted = set()
+        for start in range(0, len(listing_ids), 500):
+            chunk = listing_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            delisted.update(
+                row[0] for row in conn.execute(
+                    f'SELECT id FROM listings WHERE id IN ({placeholders}) AND delisted_at IS NOT NULL',
+                    chunk,
+                )
             )
+        if not delisted:
+            return delisted, 0
+
+        archive_dir = Path(archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_path = archive_dir.joinpath(f'price_history_{now.strftime("%Y-%m-%d")}.jsonl.gz')
+
+        archived = 0
+        with gzip.open(archive_path, 'at', encoding='utf-8') as archive:
+            for listing_id in sorted(delisted):
+                for row in conn.execute(
+                    'SELECT listing_id, price, observed FROM price_history '
+                    'WHERE listing_id = ? ORDER BY id',
+                    (listing_id,),
+                ):
+                    archive.write(json.dumps(dict(row)) + '\n')
+                    archived += 1
+                for row in conn.execute(
+                    'SELECT * FROM price_rollups WHERE listing_id = ? ORDER BY period_start',
+                    (listing_id,),
+                ):
+                    archive.write(json.dumps(dict(row)) + '\n')
+                    archived += 1
+        return delisted, archived
+
+    @staticmethod
+    def _delete_archived_history(conn, listing_ids):
+        """
+        Delete the archived history of listing_ids, all but each listing's
+        first observation. Returns how many price_history rows went.
+        """
+        deleted = 0
+        for listing_id in listing_ids:
+            conn.execute('DELETE FROM price_rollups WHERE listing_id = ?', (listing_id,))
+            deleted += conn.execute(
+                'DELETE FROM price_history WHERE listing_id = ? '
+                'AND id > (SELECT MIN(id) FROM price_history WHERE listing_id = ?)',
+                (listing_id, listing_id),
+            ).rowcount
+        return deleted
 
-    def price_drops(self, category=None):
+    def price_drops(self, category=None, order_by='change'):
         """
         Listings whose latest price is below their first observed price -
-        the buy-signal query the README describes.
+        the buy-signal query the README describes. Biggest drop first, or
+        with order_by='deal' best deal_score first.
         """
+        assert order_by in PRICE_DROP_ORDERS, f'order_by must be one of {sorted(PRICE_DROP_ORDERS)}. Got {order_by!r}.'
         query = """
         SELECT
             l.id, l.name, l.url, l.city, l.price AS current_price,
             first.price AS first_price,
-            (l.price - first.price) AS change
+            (l.price - first.price) AS change,
+            l.deal_score
         FROM listings l
         JOIN (
             SELECT listing_id, price
@@ -315,7 +1676,7 @@ class CraigsailDB:
         if category:
             query += ' AND l.category = ?'
             params.append(category)
-        query += ' ORDER BY change ASC'
+        query += f' ORDER BY {PRICE_DROP_ORDERS[order_by]}'
 
         with self.connect() as conn:
             return pd.read_sql_query(query, conn, params=params)
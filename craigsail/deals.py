@@ -0,0 +1,171 @@
+"""
+Deal scores.
+
+A DealModel is a hedonic price model for one category: a robust (Huber)
+regression of log price on the category's COMPARABLE_FEATURES and city,
+fit by iteratively reweighted least squares over the listings stored so
+far. A listing's deal_score is how far its price sits below what the
+model expects, in robust standard deviations of log price:
+
+    deal_score =  2.0   priced well under comparable listings
+    deal_score =  0.0   priced as the model expects
+    deal_score = -2.0   priced well over
+
+CraigsailDB stores one fitted model per category in deal_models, scores
+listings as they are saved, and refits with fit_deal_model (which
+`craigsail rescore` and the search CLI run on a schedule).
+"""
+import json
+
+import numpy as np
+
+# Huber's tuning constant: 95% efficiency on normal residuals.
+HUBER_K = 1.345
+
+# Fewer priced listings than this and a category is not fit at all.
+MIN_FIT_ROWS = 30
+
+# A city gets its own price level once it has this many listings; the rest
+# share the baseline.
+MIN_CITY_ROWS = 20
+
+MAX_ITERATIONS = 50
+
+
+def _robust_scale(residuals):
+    # Median absolute deviation, scaled to match a normal's standard deviation.
+    scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+    return scale if scale > 0 else max(float(np.std(residuals)), 1e-6)
+
+
+def huber_irls(X, y, k=HUBER_K, max_iterations=MAX_ITERATIONS, tolerance=1e-8):
+    """
+    Huber M-estimate of y ~ X by iteratively reweighted least squares.
+    Returns (coefficients, residual scale).
+    """
+    coefficients = np.linalg.lstsq(X, y, rcond=None)[0]
+    for _ in range(max_iterations):
+        residuals = y - X @ coefficients
+        scale = _robust_scale(residuals)
+        standardised = np.abs(residuals) / scale
+        weights = np.where(standardised <= k, 1.0, k / np.maximum(standardised, 1e-12))
+
+        root = np.sqrt(weights)
+        updated = np.linalg.lstsq(X * root[:, None], y * root, rcond=None)[0]
+        converged = np.max(np.abs(updated - coefficients)) < tolerance
+        coefficients = updated
+        if converged:
+            break
+    return coefficients, _robust_scale(y - X @ coefficients)
+
+
+class DealModel:
+    """
+    Fitted hedonic price model for one category.
+
+    Usage:
+        model = DealModel.fit(features, vectors, prices, cities)
+        model.score(vectors, prices, cities)     # deal_score per row, NaN unpriced
+        DealModel.from_json(model.to_json())
+    """
+
+    def __init__(self, features, means, stds, missing, cities, coefficients, scale, rows):
+        self.features = list(features)
+        self.means = np.asarray(means, dtype=float)
+        self.stds = np.asarray(stds, dtype=float)
+        # Which features get a "not stated" indicator column.
+        self.missing = np.asarray(missing, dtype=bool)
+        self.cities = list(cities)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.scale = float(scale)
+        self.rows = int(rows)
+
+    @classmethod
+    def fit(cls, features, vectors, prices, cities):
+        """
+        Fit on rows of feature vectors (NaN where not stated), prices and
+        city slugs. Unpriced rows are skipped. Returns None when fewer than
+        MIN_FIT_ROWS rows have a price.
+        """
+        vectors, prices, cities = _arrays(vectors, prices, cities, len(features))
+        priced = np.isfinite(prices) & (prices > 0)
+        if priced.sum() < MIN_FIT_ROWS:
+            return None
+        vectors, prices, cities = vectors[priced], prices[priced], cities[priced]
+
+        known = ~np.isnan(vectors)
+        counts = np.maximum(known.sum(axis=0), 1)
+        means = np.where(known, vectors, 0.0).sum(axis=0) / counts
+        stds = np.sqrt((np.where(known, vectors - means, 0.0) ** 2).sum(axis=0) / counts)
+        stds = np.where(stds > 0, stds, 1.0)
+        missing = (~known).any(axis=0) & known.any(axis=0)
+
+        names, city_counts = np.unique(cities, return_counts=True)
+        # The most common city is the baseline the others are measured
+        # against, along with every city too small for a level of its own.
+        baseline = names[np.argmax(city_counts)]
+        levels = sorted(
+            str(name) for name, count in zip(names, city_counts)
+            if count >= MIN_CITY_ROWS and name != baseline
+        )
+
+        model = cls(features, means, stds, missing, levels, [], 0.0, len(prices))
+        coefficients, scale = huber_irls(model.design(vectors, cities), np.log(prices))
+        model.coefficients, model.scale = coefficients, scale
+        return model
+
+    def design(self, vectors, cities):
+        """
+        The regression's design matrix: intercept, standardised features
+        (missing at the mean), missing indicators and city levels.
+        """
+        known = ~np.isnan(vectors)
+        standardised = np.where(known, (vectors - self.means) / self.stds, 0.0)
+        indicators = (~known[:, self.missing]).astype(float)
+        levels = (cities[:, None] == np.array(self.cities, dtype=object)[None, :]).astype(float)
+        return np.hstack([np.ones((len(vectors), 1)), standardised, indicators, levels])
+
+    def predict(self, vectors, cities):
+        """
+        Expected log price per row.
+        """
+        vectors, _, cities = _arrays(vectors, None, cities, len(self.features))
+        return self.design(vectors, cities) @ self.coefficients
+
+    def score(self, vectors, prices, cities):
+        """
+        deal_score per row: (expected - actual log price) / scale. NaN where
+        a row has no usable price.
+        """
+        vectors, prices, cities = _arrays(vectors, prices, cities, len(self.features))
+        priced = np.isfinite(prices) & (prices > 0)
+        scores = np.full(len(prices), np.nan)
+        if priced.any():
+            expected = self.design(vectors[priced], cities[priced]) @ self.coefficients
+            scores[priced] = (expected - np.log(prices[priced])) / self.scale
+        return scores
+
+    def to_json(self):
+        return json.dumps({
+            'features': self.features,
+            'means': self.means.tolist(),
+            'stds': self.stds.tolist(),
+            'missing': self.missing.tolist(),
+            'cities': self.cities,
+            'coefficients': self.coefficients.tolist(),
+            'scale': self.scale,
+            'rows': self.rows,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+
+def _arrays(vectors, prices, cities, width):
+    cities = np.array(['' if city is None else str(city) for city in cities], dtype=object)
+    vectors = np.asarray(vectors, dtype=float).reshape(len(cities), width)
+    prices = None if prices is None else np.asarray(
+        [np.nan if price is None else price for price in prices], dtype=float
+    )
+    return vectors, prices, cities
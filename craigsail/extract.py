@@ -0,0 +1,251 @@
+"""
+Make, model, year, length and engine hours from listing text.
+
+Posters often leave the typed attributes blank and put everything in the
+title instead ("1979 Catalina 27 - new sails"). A category lists the
+columns it wants filled this way in Search.TEXT_EXTRACTS; prep_results
+fills whichever of them a listing's attrs left empty, from `name` first
+and then, for the listings still missing something, from `body`.
+
+Makes come from the dictionary bundled as craigsail/data/makes.csv
+(category, make, aliases). Each category's aliases are compiled into one
+regular expression shaped like a trie - shared prefixes are matched once,
+so "catalina|cal|cape dory" becomes "ca(?:talina|l|pe dory)" - and the
+pandas str.extract loop runs it over a whole column in C. The numeric
+fields use fixed patterns compiled once per process, and only run over
+texts containing one of their TRIGGERS words.
+"""
+from collections import defaultdict
+import csv
+from functools import lru_cache
+from importlib.resources import files
+import io
+from pathlib import Path
+import re
+
+import pandas as pd
+
+# A number followed by this is a length or engine hours, not a model or year.
+NOT_A_MEASUREMENT = r"(?!\s*(?:'|’|ft\b|feet\b|foot\b|hours\b|hrs?\b))"
+
+# A model follows its make: up to two words, then a number that is not a
+# year or a measurement ("Catalina 27", "Oceanis 331", "Fuel EX 8"). A
+# year-like number straight after the make is a model too ("Hunter 2000"),
+# captured apart so it is not read as the year.
+MODEL_PATTERN = (
+    r'(?:[\s\-/]+(?P<year_model>(?:19|20)\d\d)\b' + NOT_A_MEASUREMENT +
+    r'|(?:[\s\-/]+(?P<model>(?:[a-z][a-z\-]{1,15}\s+){0,2}'
+    r'(?!(?:19|20)\d\d\b)\d{1,4}' + NOT_A_MEASUREMENT + r'[a-z]{0,3})\b)?)'
+)
+
+YEAR = r'\b((?:19|20)\d\d)\b' + NOT_A_MEASUREMENT
+
+# Titles carry a bare year; in a body a year needs a label, or it could
+# be the year the sails were replaced.
+PATTERNS = {
+    'year': {
+        'name': re.compile(YEAR, re.IGNORECASE),
+        'body': re.compile(r'(?:year|built|model year|mfg|manufactured)\W{0,3}' + YEAR, re.IGNORECASE),
+    },
+    'length': {
+        'name': re.compile(r"(?<![\d.])(\d{1,3}(?:\.\d)?)\s*(?:'|’|ft\b|feet\b|foot\b|-foot\b|footer\b)", re.IGNORECASE),
+        'body': re.compile(
+            r"(?:(?<![\d.])(\d{1,3}(?:\.\d)?)\s*(?:'|’|ft\b|feet\b|foot\b|-foot\b|footer\b)"
+            r'|\bloa\W{0,3}(\d{1,3}(?:\.\d)?))',
+            re.IGNORECASE,
+        ),
+    },
+    'hours': {
+        'name': re.compile(r'(?<![\d.])(\d[\d,]{0,6})\s*(?:engine\s+)?(?:hours|hrs|hr)\b', re.IGNORECASE),
+        'body': re.compile(
+            r'(?:(?<![\d.])(\d[\d,]{0,6})\s*(?:engine\s+)?(?:hours|hrs|hr)\b'
+            r'|\bhours\W{0,3}(\d[\d,]{0,6})\b)',
+            re.IGNORECASE,
+        ),
+    },
+}
+
+# Words one of which a text must contain for the pattern to match it. A
+# plain substring test is far cheaper than running the regex, and most
+# bodies never mention hours or a length.
+TRIGGERS = {
+    'year': {'body': ('year', 'built', 'mfg', 'manufactured')},
+    'length': {
+        'name': ("'", '’', 'ft', 'feet', 'foot'),
+        'body': ("'", '’', 'ft', 'feet', 'foot', 'loa'),
+    },
+    'hours': {
+        'name': ('hour', 'hr'),
+        'body': ('hour', 'hr'),
+    },
+}
+
+# Plausible ranges; anything outside is a misread rather than a value.
+BOUNDS = {
+    'year': (1900, 2100),
+    'length': (4, 300),
+    'hours': (0, 100_000),
+}
+
+EXTRACTORS = {'make', 'model', *PATTERNS}
+
+
+def trie_pattern(words):
+    """
+    A regex alternation matching exactly `words`, factored into a trie so
+    the engine never re-reads a shared prefix. Longer words win over their
+    prefixes ("cape dory" before "cal").
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        ends = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends:
+            return f'(?:{body})?'
+        return body
+
+    return build(trie)
+
+
+class MakeDictionary:
+    """
+    Category code -> {alias: make}, read from makes.csv.
+
+    Usage:
+        MAKES.aliases('boo')['oday']      # "O'Day"
+    """
+
+    def __init__(self, rows=()):
+        self.makes = defaultdict(dict)
+        for category, make, aliases in rows:
+            for alias in aliases.split('|'):
+                self.makes[category][alias.strip().lower()] = make
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Read a makes CSV (category, make, aliases separated by |). The
+        bundled craigsail/data/makes.csv by default.
+        """
+        source = files('craigsail').joinpath('data', 'makes.csv') if path is None else Path(path)
+        rows = csv.DictReader(io.StringIO(source.read_text(encoding='utf-8')))
+        return cls((row['category'], row['make'], row['aliases']) for row in rows)
+
+    def aliases(self, category):
+        return dict(self.makes.get(category, {}))
+
+
+MAKES = MakeDictionary.load()
+
+
+@lru_cache(maxsize=None)
+def make_pattern(category):
+    """
+    The compiled make (and following model) pattern for a category, or
+    None when the dictionary has no makes for it.
+    """
+    aliases = MAKES.aliases(category)
+    if not aliases:
+        return None
+    return re.compile(
+        rf'(?<![a-z0-9])(?P<make>{trie_pattern(aliases)})(?![a-z0-9&]){MODEL_PATTERN}',
+        re.IGNORECASE,
+    )
+
+
+def _first_group(matches):
+    # Patterns with alternatives capture into one of several groups. (A
+    # column-wise fillna; bfill(axis=1) transposes and is ~100x slower.)
+    if not isinstance(matches, pd.DataFrame):
+        return matches
+    first = matches.iloc[:, 0]
+    for column in matches.columns[1:]:
+        first = first.fillna(matches[column])
+    return first
+
+
+def _triggered(lowered, words):
+    hit = pd.Series(False, index=lowered.index)
+    for word in words:
+        hit |= lowered.str.contains(word, regex=False)
+    return hit
+
+
+def extract_from(text, category, kinds, source='name'):
+    """
+    {kind: Series} for each kind found in a Series of text, None where not
+    found. source ('name' or 'body') picks the patterns to use.
+    """
+    text = text.fillna('').astype(str)
+    lowered = None
+    found = {}
+    pattern = make_pattern(category)
+
+    if {'make', 'model'} & set(kinds) and pattern is not None:
+        matches = text.str.extract(pattern)
+        aliases = MAKES.aliases(category)
+        found['make'] = matches['make'].str.lower().map(aliases)
+        found['model'] = matches['model'].str.strip().fillna(matches['year_model'])
+
+    for kind in kinds:
+        if kind not in PATTERNS:
+            continue
+        candidates = text
+        words = TRIGGERS[kind].get(source)
+        if words:
+            lowered = text.str.lower() if lowered is None else lowered
+            candidates = text[_triggered(lowered, words)]
+        values = _first_group(candidates.str.extract(PATTERNS[kind][source], expand=True)).astype(object)
+        numbers = pd.to_numeric(values.astype(str).str.replace(',', '', regex=False), errors='coerce')
+        low, high = BOUNDS[kind]
+        numbers = numbers.where(numbers.between(low, high))
+        if kind == 'year' and source == 'name' and pattern is not None and numbers.notna().any():
+            # "Hunter 2000" names a model; leave the year to the body.
+            year_models = pd.to_numeric(candidates[numbers.notna()].str.extract(pattern)['year_model'])
+            numbers = numbers.mask(year_models.reindex(numbers.index) == numbers)
+        found[kind] = numbers.reindex(text.index)
+
+    return {kind: found[kind] for kind in kinds if kind in found}
+
+
+def extract_fields(df, category, extracts):
+    """
+    Fill the columns of `extracts` ({column: kind}) that are missing in df
+    from its name, then from its body for the rows still missing one.
+    Returns {column: filled Series}; the values are raw (strings/floats),
+    for the category's COLUMN_TYPES to coerce.
+    """
+    columns = {
+        column: df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        for column in extracts
+    }
+    # make and model come out of one pattern, so they are looked for together.
+    groups = defaultdict(list)
+    for column, kind in extracts.items():
+        groups[('make', 'model') if kind in ('make', 'model') else (kind,)].append(column)
+
+    for source in ('name', 'body'):
+        if source not in df.columns:
+            continue
+        for group, group_columns in groups.items():
+            missing = pd.concat([columns[column].isna() for column in group_columns], axis=1).any(axis=1)
+            if not missing.any():
+                continue
+            kinds = {extracts[column] for column in group_columns}
+            found = extract_from(df.loc[missing, source], category, kinds, source)
+            for column in group_columns:
+                kind = extracts[column]
+                if kind in found:
+                    value = found[kind].reindex(df.index)
+                    columns[column] = columns[column].astype(object).where(columns[column].notna(), value)
+
+    return columns
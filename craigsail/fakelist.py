@@ -0,0 +1,324 @@
+"""
+A local stand-in for craigslist, for load testing the fetch layer.
+
+FakeCraigslist serves the pages python-craigslist reads - the site list at
+www.craigslist.org/about/sites, search result pages and posting detail
+pages - for every site in the bundled registry (craigsail.cities) and any
+category code. Listings come from craigsail.synthetic, seeded per (site,
+category), so the same server settings always serve the same sweep.
+
+It answers as an HTTP proxy. python-craigslist fetches plain http:// URLs
+through requests, which honours HTTP_PROXY, so pointing that at the server
+sends the unmodified CraigslistForSale path - including the site list it
+downloads on import - to it instead of the network:
+
+    with FakeCraigslist(listings=250, latency=0.05, throttle_rate=0.01) as server:
+        with server.proxied():
+            Boats(search_category='boo', data_path='data', cities=['sfbay']).get_all_daily_postings()
+
+or, for a whole CLI run, `craigsail fakelist --port 8765` in one shell and
+`HTTP_PROXY=http://127.0.0.1:8765 craigsail ...` in another.
+
+Each request waits latency seconds plus an exponential jitter, then fails
+with a 503 at error_rate or a 429 (with Retry-After) at throttle_rate. The
+site list is never delayed or failed. GET /_fakelist/stats on the server
+itself returns request counts by status and every request's service time.
+"""
+from contextlib import contextmanager
+import html
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+import zlib
+
+from .cities import SITES
+from .synthetic import CITY_CENTROIDS, generate_frame
+
+# python-craigslist asks for the next page until one comes back short.
+RESULTS_PER_PAGE = 100
+
+# Where synthetic geotags fall for a site generate_frame has no centroid for.
+DEFAULT_CENTROID = (39.5, -98.35)
+
+# Environment variables requests reads its proxy from.
+PROXY_VARIABLES = ('HTTP_PROXY', 'http_proxy')
+
+
+class FakeCraigslist:
+    """
+    Threaded HTTP server answering craigslist requests from synthetic data.
+
+    Usage:
+        server = FakeCraigslist(listings=500, latency=0.02).start()
+        server.url                  # 'http://127.0.0.1:<port>'
+        server.stats()              # {'requests': ..., 'statuses': ..., 'latencies': [...]}
+        server.stop()
+
+    listings is how many results each (site, category) search returns,
+    RESULTS_PER_PAGE to a page. latency and jitter are in seconds;
+    error_rate and throttle_rate are fractions of requests.
+    """
+
+    def __init__(
+        self, listings=250, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+        seed=0, host='127.0.0.1', port=0,
+    ):
+        assert listings >= 0, f'listings must be >= 0. Got {listings}.'
+        assert 0 <= error_rate + throttle_rate <= 1, 'error_rate + throttle_rate must be between 0 and 1.'
+        self.listings = listings
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.shards = {}
+        self.statuses = {}
+        self.latencies = []
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def pages(self):
+        """
+        Result pages per (site, category) search.
+        """
+        return max(1, math.ceil(self.listings / RESULTS_PER_PAGE))
+
+    def start(self):
+        self.server = ThreadingHTTPServer(self.address, _handler(self))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fakelist', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextmanager
+    def proxied(self):
+        """
+        Route this process's plain-http requests (python-craigslist's)
+        through the server for the duration of the block.
+        """
+        saved = {name: os.environ.get(name) for name in (*PROXY_VARIABLES, 'NO_PROXY', 'no_proxy')}
+        os.environ.update({name: self.url for name in PROXY_VARIABLES})
+        os.environ['NO_PROXY'] = os.environ['no_proxy'] = ''
+        try:
+            yield self
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': len(self.latencies),
+                'statuses': dict(self.statuses),
+                'latencies': list(self.latencies),
+            }
+
+    def shard(self, site, category):
+        """
+        The synthetic listings one (site, category) search serves, as
+        {'rows': [...], 'by_id': {id: row}}. Built on first request.
+        """
+        key = (site, category)
+        with self.lock:
+            if key not in self.shards:
+                self.shards[key] = self._generate(site, category)
+            return self.shards[key]
+
+    def _generate(self, site, category):
+        tag = zlib.crc32(f'{site}/{category}'.encode())
+        frame = generate_frame(self.listings, seed=(self.seed, tag), cities=[site])
+        # Ids unique across shards, newest first as sort=date returns them.
+        frame['id'] = [str(7_000_000_000 + (tag % 100_000) * 10_000 + index) for index in range(len(frame))]
+        frame = frame.sort_values('datetime', ascending=False, kind='stable')
+
+        offset = (0.0, 0.0)
+        if site not in CITY_CENTROIDS and site in SITES:
+            offset = (SITES[site].latitude - DEFAULT_CENTROID[0], SITES[site].longitude - DEFAULT_CENTROID[1])
+
+        rows = []
+        for row in frame.to_dict('records'):
+            row['geotag'] = _geotag(row['geotag'], offset)
+            row['path'] = f'/{category}/d/{row["id"]}.html'
+            rows.append(row)
+        return {'rows': rows, 'by_id': {row['id']: row for row in rows}}
+
+    def outcome(self):
+        """
+        The status an ordinary request gets: 200, or an injected 503/429.
+        """
+        with self.lock:
+            draw = self.random.random()
+            delay = self.latency + (self.random.expovariate(1 / self.jitter) if self.jitter else 0.0)
+        if draw < self.error_rate:
+            return 503, delay
+        if draw < self.error_rate + self.throttle_rate:
+            return 429, delay
+        return 200, delay
+
+    def record(self, status, seconds):
+        with self.lock:
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            self.latencies.append(seconds)
+
+
+def _geotag(geotag, offset):
+    # Synthetic geotags are a tuple, a stringified tuple or None.
+    if geotag is None:
+        return None
+    if isinstance(geotag, str):
+        geotag = tuple(float(part) for part in geotag.strip('()').split(','))
+    return round(geotag[0] + offset[0], 5), round(geotag[1] + offset[1], 5)
+
+
+def _handler(fake):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            started = time.perf_counter()
+            parts = urlsplit(self.path)
+            host = (parts.hostname or self.headers.get('Host', '')).split(':')[0]
+            path = parts.path
+
+            if not host.endswith('craigslist.org'):
+                if path == '/_fakelist/stats':
+                    return self.send(200, json.dumps(fake.stats()), 'application/json')
+                return self.send(404, 'not found')
+
+            if host == 'www.craigslist.org':
+                if path == '/about/sites':
+                    return self.send(200, sites_page())
+                return self.send(404, 'not found')
+
+            status, delay = fake.outcome()
+            time.sleep(delay)
+            if status != 200:
+                self.send(status, 'try again later', headers={'Retry-After': '1'} if status == 429 else None)
+            else:
+                status = self.route(host.split('.')[0], path, parse_qs(parts.query))
+            fake.record(status, time.perf_counter() - started)
+
+        def route(self, site, path, query):
+            if site not in SITES:
+                return self.send(404, 'no such site')
+
+            segments = path.strip('/').split('/')
+            if len(segments) == 2 and segments[0] == 'search':
+                start = int(query.get('s', ['0'])[0])
+                return self.send(200, search_page(site, segments[1], fake.shard(site, segments[1])['rows'], start))
+            if len(segments) == 3 and segments[1] == 'd' and segments[2].endswith('.html'):
+                row = fake.shard(site, segments[0])['by_id'].get(segments[2][:-len('.html')])
+                if row is None:
+                    return self.send(404, 'this posting has been deleted')
+                return self.send(200, detail_page(row))
+            return self.send(404, 'not found')
+
+        def send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+            return status
+
+    return Handler
+
+
+def _text(value):
+    # Missing synthetic text arrives as None or NaN.
+    return isinstance(value, str) and value != ''
+
+
+def sites_page():
+    """
+    www.craigslist.org/about/sites: a link per site.
+    """
+    links = ''.join(
+        f'<li><a href="https://{slug}.craigslist.org/">{html.escape(site.name)}</a></li>'
+        for slug, site in SITES.items()
+    )
+    return f'<html><body><div class="box box_1"><ul>{links}</ul></div></body></html>'
+
+
+def search_page(site, category, rows, start):
+    """
+    One page of search results from `start`, in craigslist's markup.
+    """
+    items = []
+    for row in rows[start:start + RESULTS_PER_PAGE]:
+        repost = f' data-repost-of="{row["repost_of"]}"' if _text(row['repost_of']) else ''
+        price = f'<span class="result-price">{html.escape(row["price"])}</span>' if _text(row['price']) else ''
+        hood = f'<span class="result-hood"> ({html.escape(row["where"])})</span>' if _text(row['where']) else ''
+        tags = '<span class="result-tags">pic map</span>' if row['has_image'] else ''
+        items.append(
+            f'<li class="result-row" data-pid="{row["id"]}"{repost}>'
+            f'<p class="result-info"><time class="result-date" datetime="{row["datetime"]}">'
+            f'{row["datetime"]}</time>'
+            f'<a href="{row["path"]}" class="result-title hdrlnk">{html.escape(row["name"])}</a>'
+            f'<span class="result-meta">{price}{hood}{tags}</span></p></li>'
+        )
+    return (
+        f'<html><head><title>{html.escape(site)} {html.escape(category)}</title></head><body>'
+        f'<span class="totalcount">{len(rows)}</span>'
+        f'<ul class="rows">{"".join(items)}</ul></body></html>'
+    )
+
+
+def detail_page(row):
+    """
+    A posting's detail page: map, body, posted time, images and attributes.
+    """
+    geotag = row['geotag']
+    map_div = (
+        f'<div id="map" data-latitude="{geotag[0]}" data-longitude="{geotag[1]}"></div>'
+        if geotag else ''
+    )
+    created = row['created'].replace(' ', 'T') + ':00-0700'
+    attrs = ''.join(f'<span>{html.escape(attr)}</span>' for attr in row['attrs'])
+    return (
+        f'<html><body><h1 class="postingtitle">{html.escape(row["name"])}</h1>{map_div}'
+        f'<p class="attrgroup">{attrs}</p>'
+        f'<section id="postingbody"><div class="print-qrcode-container">QR Code Link to This Post</div>'
+        f'{html.escape(row["body"])}</section>'
+        f'<div class="postinginfos"><p class="postinginfo">post id: {row["id"]}</p>'
+        f'<p class="postinginfo reveal">posted: <time class="date timeago" datetime="{created}">'
+        f'{row["created"]}</time></p></div></body></html>'
+    )
@@ -0,0 +1,179 @@
+"""
+Single-writer ingest.
+
+sqlite takes one writer at a time, so fetch threads that call save_listings
+themselves only queue up behind each other on the database lock. Instead
+they hand record batches to an IngestWriter: one thread that owns every
+write, drains a bounded queue and commits several batches per transaction.
+
+    with IngestWriter(db) as writer:          # starts the writer thread
+        writer.put(df, 'boo')                 # from any number of threads
+        writer.delist('boo', 'sfbay', ids)
+    writer.result                             # SaveResult totals
+
+Turning a DataFrame into rows (to_records) happens on the calling thread,
+so the writer spends its time in sqlite. When the queue is full, put blocks
+until the writer catches up, which keeps memory bounded however far the
+fetchers run ahead.
+"""
+from collections import defaultdict
+import queue
+import threading
+import time
+
+from .db import SaveResult
+
+SAVE = 'save'
+DELIST = 'delist'
+
+# Tells the writer thread to commit what it has and exit.
+_STOP = object()
+
+
+def _job_rows(job):
+    return len(job[2]) if job[0] == SAVE else 1
+
+
+class IngestWriter:
+    """
+    Commits save and delist jobs from many threads in one writer thread.
+
+    A group commit closes once it holds batch_rows records, or
+    flush_seconds after its first job arrived, whichever comes first.
+    max_batches bounds the queue. Jobs for one shard are committed in the
+    order they were put, so a delist always sees its shard's saves.
+    """
+
+    def __init__(self, db, max_batches=32, batch_rows=5000, flush_seconds=0.5):
+        self.db = db
+        self.metrics = db.metrics
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=max_batches)
+
+        # Per category, filled in by the writer thread.
+        self.totals = defaultdict(SaveResult)
+        self.delisted = defaultdict(int)
+        self.commits = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='craigsail-ingest', daemon=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Commit whatever made it onto the queue but leave the original
+            # exception to propagate.
+            try:
+                self.close()
+            except Exception:
+                pass
+
+    @property
+    def result(self):
+        """
+        SaveResult totals across every category.
+        """
+        return sum(self.totals.values(), SaveResult())
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, df, category, observed=None):
+        """
+        Queue a search DataFrame for saving. Blocks while the queue is full.
+        Returns the number of records queued.
+        """
+        records = self.db.to_records(df, category, observed)
+        if records:
+            self._enqueue((SAVE, category, records))
+        return len(records)
+
+    def delist(self, category, city, seen_ids, filters=None):
+        """
+        Queue a mark_delisted for a finished (category, city) sweep.
+        """
+        self._enqueue((DELIST, category, city, list(seen_ids), filters))
+
+    def close(self):
+        """
+        Commit everything queued, stop the writer thread and return the
+        SaveResult totals. Re-raises a failure from the writer thread.
+        """
+        if self.thread.is_alive() and self.error is None:
+            self.queue.put(_STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError('ingest writer failed') from self.error
+        return self.result
+
+    def _enqueue(self, job):
+        start = time.perf_counter()
+        while True:
+            # A dead writer never drains the queue; fail the producer instead
+            # of letting it block forever.
+            if self.error is not None:
+                raise RuntimeError('ingest writer failed') from self.error
+            try:
+                self.queue.put(job, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.metrics.count('ingest_wait_seconds', time.perf_counter() - start)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self.queue.get()
+            if job is _STOP:
+                break
+
+            group = [job]
+            rows = _job_rows(job)
+            deadline = time.monotonic() + self.flush_seconds
+            while rows < self.batch_rows:
+                try:
+                    job = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                group.append(job)
+                rows += _job_rows(job)
+
+            try:
+                self._commit(group, rows)
+            except Exception as exc:
+                self.error = exc
+                return
+
+    def _commit(self, group, rows):
+        saved = defaultdict(SaveResult)
+        delisted = defaultdict(int)
+
+        with self.metrics.stage('save') as stage, self.db.connect() as conn:
+            stage['rows'] = rows
+            stage['batches'] = len(group)
+            for job in group:
+                if job[0] == SAVE:
+                    _, category, records = job
+                    saved[category] += self.db.write_records(conn, records)
+                else:
+                    _, category, city, seen_ids, filters = job
+                    with self.metrics.stage('delist', city=city) as delist_stage:
+                        delist_stage['rows'] = self.db.write_delisted(
+                            conn, category, city, seen_ids, filters=filters
+                        )
+                    delisted[category] += delist_stage['rows']
+
+        # Only counted once the transaction has committed.
+        for category, result in saved.items():
+            self.totals[category] += result
+        for category, count in delisted.items():
+            self.delisted[category] += count
+        self.commits += 1
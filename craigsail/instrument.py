@@ -0,0 +1,138 @@
+"""
+Lightweight timers and counters for a craigsail run.
+
+A RunMetrics is handed to Search and CraigsailDB; each stage of a sweep
+(fetching a city, building records, writing to sqlite, delisting) runs
+inside `metrics.stage(...)`, which times it and keeps whatever counters the
+stage sets on the yielded record. The CLI prints the result with --profile
+and stores it per run in the database (CraigsailDB.record_run).
+
+NULL_METRICS is the default everywhere: it has the same interface and
+records nothing, so uninstrumented calls pay only for a context manager.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import sys
+import time
+
+import pandas as pd
+
+
+class RunMetrics:
+    """
+    Stage timings and counters for one run.
+
+    Usage:
+        metrics = RunMetrics()
+        with metrics.stage('fetch', city='sfbay') as stage:
+            stage['rows'] = len(results)
+        metrics.count('db_statements')
+        metrics.summary()
+    """
+
+    def __init__(self, log_stream=None):
+        """
+        With log_stream, every finished stage is also written to it as one
+        JSON line - a structured log of the run as it happens.
+        """
+        self.started = pd.Timestamp.now('UTC')
+        self.stages = []
+        self.counters = defaultdict(float)
+        self.log_stream = log_stream
+
+    @contextmanager
+    def stage(self, name, city=None):
+        record = {'stage': name, 'city': city}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self.stages.append(record)
+            if self.log_stream is not None:
+                self.log_stream.write(json.dumps(record, default=str) + '\n')
+                self.log_stream.flush()
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def summary(self):
+        """
+        Totals per stage (seconds, calls and summed counters), per-city
+        detail, and run-wide counters, as plain JSON-serialisable data.
+        """
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'seconds': 0.0, 'calls': 0})
+            total['calls'] += 1
+            for key, value in record.items():
+                if key in ('stage', 'city'):
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] = total.get(key, 0) + value
+
+        return {
+            'started': self.started.isoformat(),
+            'seconds': (pd.Timestamp.now('UTC') - self.started).total_seconds(),
+            'stages': totals,
+            'cities': [record for record in self.stages if record['city'] is not None],
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.summary(), default=str, **kwargs)
+
+
+class NullMetrics(RunMetrics):
+    """
+    RunMetrics that records nothing.
+    """
+
+    @contextmanager
+    def stage(self, name, city=None):
+        yield {}
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+@contextmanager
+def profiled(path):
+    """
+    Profile the enclosed block and dump the result to path. An .html path
+    uses pyinstrument if it is installed; anything else is a cProfile stats
+    file for `python -m pstats` or snakeviz.
+    """
+    if path is None:
+        yield
+        return
+
+    if str(path).endswith('.html'):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            path = str(path)[:-len('.html')] + '.prof'
+            print(f'pyinstrument is not installed; writing cProfile stats to {path} instead.', file=sys.stderr)
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(path, 'w') as handle:
+                    handle.write(profiler.output_html())
+            return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
@@ -4,9 +4,71 @@ multi-city search and asset price tracking
 
 https://github.com/juliomalegria/python-craigslist
 """
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import difflib
+from itertools import repeat
 from pathlib import Path
+import json
+import math
 import pandas as pd
+from .cities import SITES
+from .extract import extract_fields
 from .globals import CRAIGSLIST_CITIES, SALE_CATEGORIES, FILTER_OPTIONS
+from .instrument import NULL_METRICS
+
+# Sweeps smaller than this are prepped in-process even when workers are
+# requested; starting a process pool and pickling the slices costs more.
+MIN_PARALLEL_ROWS = 5_000
+
+# The dtype pandas infers for a column of strings (object before pandas 3).
+TEXT_DTYPE = pd.Series(['']).dtype
+
+# Four digit model years in free text ("1979 Catalina 27", "year: 2004").
+YEAR_PATTERN = r'\b(1[89]\d\d|20\d\d)\b'
+
+
+def _ints_or_none(values):
+    # Object column of python ints and None, so it serialises to JSON as
+    # 1979 rather than 1979.0 or a pandas NA.
+    return values.astype('Int64').astype(object).where(values.notna(), None)
+
+
+def _to_float(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    digits = values.astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+    return pd.to_numeric(digits, errors='coerce')
+
+
+def _to_int(values):
+    return _ints_or_none(_to_float(values).round())
+
+
+def _to_year(values):
+    years = values.astype(str).str.extract(YEAR_PATTERN, expand=False)
+    return _ints_or_none(pd.to_numeric(years, errors='coerce'))
+
+
+def _to_text(values):
+    return values.where(values.isna(), values.astype(str).str.strip())
+
+
+def _to_bool(values):
+    if pd.api.types.is_bool_dtype(values):
+        return values
+    return values.astype(str).str.strip().str.lower().isin(['1', 'true', 'yes', 'y'])
+
+
+# The column types a category's COLUMN_TYPES may name, each a vectorised
+# converter from raw craigslist text.
+COLUMN_CONVERTERS = {
+    'float': _to_float,
+    'int': _to_int,
+    'year': _to_year,
+    'text': _to_text,
+    'bool': _to_bool,
+}
 
 # `craigslist.base` fetches the list of all craigslist sites over the network
 # at import time. Import lazily so that importing craigsail (and running the
@@ -39,19 +101,46 @@ class Search():
     with one of the search categories provided 
     in the url string of any craigslist 
     top-level category.
+
+    Subclasses registered in craigsail.categories
+    declare their category below; prep_results
+    turns those declarations into a vectorised
+    prep that runs between fetch and save.
     """
 
+    # Craigslist category code, e.g. 'boo'.
+    CATEGORY_CODE = None
+    # Attribute names as posted (often spanish) -> canonical name.
+    COLUMN_ALIASES = {}
+    # Canonical attributes lifted out of `attrs` into their own columns.
+    PROMOTED_ATTRIBUTES = ()
+    # Column -> one of COLUMN_CONVERTERS.
+    COLUMN_TYPES = {'price': 'float'}
+    # Column -> one of extract.EXTRACTORS ('make', 'model', 'year', 'length',
+    # 'hours'), filled from the title and body when attrs leave it empty.
+    TEXT_EXTRACTS = {}
+    # Shorthand for TEXT_EXTRACTS = {column: 'year'}.
+    YEAR_FROM_TITLE = None
+    # Numeric columns comparable listings are matched on -> weight, and text
+    # columns a comparable should share (see craigsail.comparables).
+    COMPARABLE_FEATURES = {}
+    COMPARABLE_LABELS = ()
+
     def __init__(
         self,
         search_category=None,
         data_path=None,
         cities=None,
         filters=None,
+        metrics=None,
+        archive=None,
     ):
         """
         cities is a list of craigslist site slugs (e.g. ['sfbay', 'seattle']).
         filters is a dict of python-craigslist filter options, merged over
-        the defaults below.
+        the defaults below. metrics is an optional instrument.RunMetrics
+        that per-city fetch timings are recorded on. archive is an optional
+        archive.RawArchive every raw result batch is appended to.
         """
         assert isinstance(search_category, str), f'search_category arg should be str. Got {type(search_category)}.'
         assert isinstance(data_path, str), f'data_path must be a string. Got {type(data_path)}.'
@@ -64,6 +153,8 @@ class Search():
         self.CITIES = []
         self.CATEGORY = search_category
         self.SAVE_PATH = Path(data_path)
+        self.METRICS = metrics or NULL_METRICS
+        self.ARCHIVE = archive
 
         if filters:
             self.add_filters(**filters)
@@ -90,11 +181,10 @@ class Search():
         Normalise a list of craigslist site slugs (strip + lowercase).
 
         With strict=True the slugs are additionally checked against the
-        authoritative site list from python-craigslist and a ValueError is
-        raised for any that do not exist. That check costs a network request,
-        so it is opt-in and used at the CLI boundary rather than on every
-        instantiation. Checking is skipped silently if the site list cannot
-        be reached, so offline use still works.
+        bundled site registry (craigsail.cities), and a ValueError is raised
+        for any that do not exist. Slugs the registry does not know, such
+        as non-US sites, are looked up in python-craigslist's live site list
+        when it can be reached.
         """
         assert not isinstance(cities, str), 'cities must be a list of city slugs, not a single string.'
 
@@ -103,20 +193,27 @@ class Search():
         if not strict:
             return cleaned
 
-        try:
-            from craigslist.base import ALL_SITES
-        except Exception:
-            return cleaned  # offline / dependency missing - accept as given
-
-        if not ALL_SITES:
-            return cleaned
+        unknown = SITES.unknown(cleaned)
+        if unknown:
+            try:
+                from craigslist.base import ALL_SITES
+            except Exception:
+                ALL_SITES = None  # offline - the registry is all there is
+            if ALL_SITES:
+                unknown = sorted(set(unknown) - set(ALL_SITES))
 
-        unknown = sorted(set(cleaned) - set(ALL_SITES))
         if unknown:
+            hints = {
+                city: [site.slug for site in SITES.named(city)]
+                or difflib.get_close_matches(city, list(SITES), n=3)
+                for city in unknown
+            }
+            suggestions = '; '.join(f'{city}: {", ".join(match)}' for city, match in hints.items() if match)
             raise ValueError(
                 f'Unknown craigslist site(s): {unknown}. '
                 'Use the site subdomain (e.g. "sfbay", "seattle", "newyork"). '
-                'See craigsail.globals.CRAIGSLIST_CITIES for cities by state.'
+                + (f'Did you mean {suggestions}? ' if suggestions else '')
+                + 'See craigsail.cities.SITES for every site by state.'
             )
         return cleaned
 
@@ -212,15 +309,159 @@ class Search():
 
     def strip_nan_columns(self, df):
         """
-        Loop over each col and check if 
-        all values NaN. Remove col from 
-        df if so. 
+        Remove every column whose values
+        are all NaN, in one selection
+        rather than a drop per column.
+        Returns df itself when there
+        are none to remove.
+        """
+
+        has_values = df.notna().any().to_numpy()
+        return df if has_values.all() else df.loc[:, has_values]
+
+    @staticmethod
+    def attribute_columns(attrs):
+        """
+        Every attribute name in a sweep's attrs, in order of first
+        appearance - the columns expand_all_attributes would produce for
+        the whole sweep, without building any frames.
+        """
+        names = {}
+        for attributes in attrs:
+            if attributes is None or (not isinstance(attributes, (list, tuple, pd.Series)) and pd.isna(attributes)):
+                continue
+            for item in attributes:
+                pair = str(item).split(':', 1)
+                if len(pair) == 2:
+                    names.setdefault(pair[0])
+        return list(names)
+
+    @classmethod
+    def long_attributes(cls, attrs):
+        """
+        A sweep's `attrs` lists as one long frame with a (row, key, value)
+        row per attribute, where row is the listing's label in attrs.
+        Memory grows with the attributes actually posted rather than with
+        listings x distinct keys, as a wide frame's would. Keys are folded
+        through COLUMN_ALIASES onto their canonical names; a canonical name
+        wins over an alias, the first value wins within a listing, and
+        empty values are dropped.
+        """
+        items = attrs[attrs.map(lambda value: isinstance(value, (list, tuple)))].explode().dropna()
+        pairs = items.astype(str).str.split(':', n=1, expand=True)
+        if pairs.shape[1] != 2:
+            return pd.DataFrame({'row': [], 'key': [], 'value': []}).astype({'key': TEXT_DTYPE, 'value': TEXT_DTYPE})
+
+        keys = pairs[0].str.strip()
+        long_df = pd.DataFrame({
+            'row': pairs.index,
+            'key': keys.replace(cls.COLUMN_ALIASES),
+            'alias': keys.isin(list(cls.COLUMN_ALIASES)),
+            'value': pairs[1].str.strip(),
+        })
+        long_df = long_df[(long_df['key'] != '') & (long_df['value'].fillna('') != '')]
+        long_df = long_df.sort_values(['row', 'alias'], kind='stable').drop_duplicates(['row', 'key'])
+        return long_df.drop(columns='alias').reset_index(drop=True)
+
+    def promote_attributes(self, df):
+        """
+        Lift PROMOTED_ATTRIBUTES out of the `attrs` lists into columns,
+        pivoting only those keys out of long_attributes. `attrs` itself is
+        kept, so everything else still reaches the attributes blob.
+        """
+        promoted = list(self.PROMOTED_ATTRIBUTES)
+        if not promoted or 'attrs' not in df.columns:
+            return df
+
+        long_df = self.long_attributes(df['attrs'].reset_index(drop=True))
+        long_df = long_df[long_df['key'].isin(promoted)]
+        wide = long_df.pivot(index='row', columns='key', values='value') if len(long_df) else pd.DataFrame()
+        # Text dtype even for an all-missing column, so slices prepped
+        # separately concatenate to the same dtypes.
+        wide = wide.reindex(index=range(len(df)), columns=promoted).astype(TEXT_DTYPE).set_axis(df.index)
+
+        return df.assign(**{
+            column: df[column].fillna(wide[column]) if column in df.columns else wide[column]
+            for column in promoted
+        })
+
+    def apply_column_types(self, df):
+        """
+        Coerce each COLUMN_TYPES column present in df to its type.
+        """
+        return df.assign(**{
+            column: COLUMN_CONVERTERS[kind](df[column])
+            for column, kind in self.COLUMN_TYPES.items()
+            if column in df.columns
+        })
+
+    def refine(self, df):
+        """
+        Hook for category fixes the declarations
+        cannot express. Runs last in prep_slice.
+        """
+        return df
+
+    def prep_slice(self, df):
+        """
+        The declarative prep for one slice of raw results.
+        """
+        df = self.apply_column_types(self.promote_attributes(df))
+        return self.refine(self.extract_from_text(df))
+
+    def extract_from_text(self, df):
+        """
+        Fill the TEXT_EXTRACTS columns a listing's attrs left empty from its
+        name and body (see craigsail.extract), typed per COLUMN_TYPES.
+        """
+        extracts = dict(self.TEXT_EXTRACTS)
+        if self.YEAR_FROM_TITLE:
+            extracts.setdefault(self.YEAR_FROM_TITLE, 'year')
+        if not extracts or df.empty:
+            return df
+
+        filled = extract_fields(df, self.CATEGORY_CODE or self.CATEGORY, extracts)
+        return df.assign(**{
+            column: COLUMN_CONVERTERS[self.COLUMN_TYPES.get(column, 'text')](values)
+            for column, values in filled.items()
+        })
+
+    def prep_results(self, df, workers=None):
+        """
+        Typed, attribute-promoted frame for save_listings, built from the
+        category's declarations. Tolerates raw results without `attrs`
+        (the base Search declares nothing but a numeric price).
         """
+        with self.METRICS.stage('prep') as stage:
+            stage['rows'] = len(df)
+            prepped, stage['workers'] = self.map_partitions('prep_slice', df, workers)
+        return prepped
+
+    def map_partitions(self, method, df, workers=None, partition='rows', *args):
+        """
+        Run self.<method>(slice, *args) over df. With workers > 1 the frame
+        is split - into balanced row chunks, or one slice per city with
+        partition='city' - and the slices run in a process pool, then go
+        back in their original order. Small frames stay in-process.
+        Returns (frame, workers used).
+        """
+        assert partition in ('rows', 'city'), f'partition must be "rows" or "city". Got {partition!r}.'
+
+        if not workers or workers <= 1 or len(df) < MIN_PARALLEL_ROWS:
+            return getattr(self, method)(df, *args), 1
+
+        if partition == 'city':
+            parts = [part for _, part in df.groupby('city', sort=False)]
+        else:
+            chunk = math.ceil(len(df) / (workers * 4))  # several per worker evens out slow slices
+            parts = [df.iloc[start:start + chunk] for start in range(0, len(df), chunk)]
 
-        for col in df.columns: 
-            if df[col].isnull().all():
-                df = df.drop(col, axis=1)
-        return df 
+        # The pool pickles the search; RunMetrics may hold a stream.
+        worker = copy.copy(self)
+        worker.METRICS = NULL_METRICS
+        with ProcessPoolExecutor(workers) as pool:
+            results = pool.map(_call_method, repeat(worker), repeat(method), parts, *(repeat(arg) for arg in args))
+            return pd.concat(results).sort_index(), workers
 
     def get_city_items(self, city):
         """
@@ -229,10 +470,23 @@ class Search():
         """
         
         results = list()
-        search_cls = _load_clfs()
-        city_items = search_cls(site=city, category=self.CATEGORY, filters=self.FILTERS)
-        for result in city_items.get_results(sort_by='newest', geotagged=True, include_details=True):
-            results.append(result)
+        with self.METRICS.stage('fetch', city=city) as stage:
+            search_cls = _load_clfs()
+            city_items = search_cls(site=city, category=self.CATEGORY, filters=self.FILTERS)
+            for result in city_items.get_results(sort_by='newest', geotagged=True, include_details=True):
+                results.append(result)
+
+            # python-craigslist hides the raw responses, so bytes are
+            # derived from what came back - only when someone is measuring.
+            stage['rows'] = len(results)
+            if self.METRICS is not NULL_METRICS:
+                stage['bytes'] = sum(len(json.dumps(result, default=str)) for result in results)
+
+        if self.ARCHIVE is not None:
+            with self.METRICS.stage('archive', city=city) as stage:
+                stage['rows'] = len(results)
+                self.ARCHIVE.append(self.CATEGORY, city, results)
+
         city_df = self.convert_city_dict_to_df(city, results)
 
         return city_df 
@@ -343,6 +597,44 @@ class Boats(Search):
         'tipo de propulsión': 'boat_propulsion_type',
     }
 
+    CATEGORY_CODE = 'boo'
+    PROMOTED_ATTRIBUTES = (
+        'year manufactured',
+        'condition',
+        'length overall (LOA)',
+        'engine hours (total)',
+        'make / manufacturer',
+        'model name / number',
+        'propulsion type',
+        'boat_propulsion_type',
+    )
+    COLUMN_TYPES = {
+        'price': 'float',
+        'year manufactured': 'year',
+        'length overall (LOA)': 'float',
+        'engine hours (total)': 'float',
+        'condition': 'text',
+        'make / manufacturer': 'text',
+        'model name / number': 'text',
+        'propulsion type': 'text',
+        'boat_propulsion_type': 'text',
+    }
+    TEXT_EXTRACTS = {
+        'make / manufacturer': 'make',
+        'model name / number': 'model',
+        'year manufactured': 'year',
+        'length overall (LOA)': 'length',
+        'engine hours (total)': 'hours',
+    }
+    # Length matters most to what a boat sells for; hours are often missing
+    # or guessed.
+    COMPARABLE_FEATURES = {
+        'year manufactured': 1.0,
+        'length overall (LOA)': 2.0,
+        'engine hours (total)': 0.5,
+    }
+    COMPARABLE_LABELS = ('make / manufacturer', 'propulsion type')
+
     def combine_city_sailboats_data(self, df, eval_cols=()):
         """
         Coalesce aliased/spanish attribute columns into their canonical
@@ -375,36 +667,12 @@ class Boats(Search):
         # assert isinstance(clean_cols, list)
         # assert all(col in df.columns for col in clean_cols)
 
-        # clean_cols = ['year manufactured',
-        # 				'mfg_year','price', 
-        # 				'id','datetime', 'last_updated',
-        # 				'created','has_image',
-        # 				'length overall (LOA)',
-        # 				'engine hours (total)', 
-        # 				'condition']
-        
-        for col in df.columns: 
-            if col == 'year manufactured': # extract year from name
-                years = df['name'].str.strip().str.extract(r'(?P<Year>\s{0,1}[1-2]\d{2,3}\s*)')
-                df[col] = df[col].fillna(years.squeeze())
-                # df[col] = pd.to_datetime(df[col]).dt.year
-            elif col == 'price': # remove all special chars
-                # pandas 2.0 made regex=False the default for Series.str.replace
-                df[col] = (
-                    df[col].astype(str)
-                    .str.replace(r'[^\d.]', '', regex=True)
-                    .replace('', pd.NA)
-                    .astype(float)
-                )
-            elif col == 'id': # id as int
-                df[col] = df[col].astype(int)
-            elif col in ['datetime', 'last_updated','created']: # date as datetime
-                df[col] = pd.to_datetime(df[col])
-            elif col == 'has_image': # has image as bool 
-                df[col] = df[col].astype(bool)
-            elif col in ['length overall (LOA)','engine hours (total)']: # to float
-                df[col] = df[col].astype(float)
-                # [geotag, 'longitud total']
+        names = df['name'] if 'name' in df.columns else None
+        for col in df.columns:
+            values = df[col]
+            cleaned = self.clean_sailboat_column(col, values, names)
+            if cleaned is not values:
+                df[col] = cleaned
 
         # extract length from name
         # df['name'].str.strip().str.extract(r'(?P<Length>\d{2,3}\s*)')
@@ -415,25 +683,96 @@ class Boats(Search):
         # drop dup cols
         return df.loc[:,~df.columns.duplicated()] 
 
-    def prep_daily_sailboats_data(self):
-    
+    def clean_sailboat_column(self, column, values, names=None):
+        """
+        Clean one column the way clean_city_sailboats_data does. Returns
+        values itself when the column needs nothing, so callers can tell
+        whether anything new was allocated.
+        """
+        if column == 'year manufactured' and names is not None: # extract year from name
+            years = names.str.strip().str.extract(r'(?P<Year>\s{0,1}[1-2]\d{2,3}\s*)')
+            return values.fillna(years['Year'])
+        if column == 'price': # remove all special chars
+            # pandas 2.0 made regex=False the default for Series.str.replace
+            return (
+                values.astype(str)
+                .str.replace(r'[^\d.]', '', regex=True)
+                .replace('', pd.NA)
+                .astype(float)
+            )
+        if column == 'id': # id as int
+            return values.astype(int)
+        if column in ['datetime', 'last_updated', 'created']: # date as datetime
+            return pd.to_datetime(values)
+        if column == 'has_image': # has image as bool
+            return values.astype(bool)
+        if column in ['length overall (LOA)', 'engine hours (total)']: # to float
+            return values.astype(float)
+        return values
+
+    def prep_partition(self, df, attribute_columns=None):
+        """
+        Expand, combine and clean one slice of raw results, keeping its
+        index. Attributes go through long_attributes (aliases folded) and
+        one pivot; each column is cleaned on its own and the frame is put
+        together once at the end, without copying the columns again.
+        attribute_columns - the canonical attribute names across the whole
+        sweep - gives every slice the same columns, so a slice that lacks
+        e.g. 'year manufactured' is still cleaned the way the full frame
+        would be.
+        """
+        long_df = self.long_attributes(df['attrs'].reset_index(drop=True))
+        if attribute_columns is None:
+            attribute_columns = list(dict.fromkeys(long_df['key']))
+        # A column the raw results already carry wins over an attribute.
+        attribute_columns = [column for column in attribute_columns if column not in df.columns]
+
+        if len(long_df):
+            wide = long_df.pivot(index='row', columns='key', values='value')
+        else:
+            wide = pd.DataFrame()
+        wide = wide.reindex(index=range(len(df)), columns=attribute_columns).astype(TEXT_DTYPE)
+
+        columns = {column: df[column] for column in df.columns if column != 'attrs'}
+        columns.update({column: wide[column].set_axis(df.index) for column in attribute_columns})
+        names = columns.get('name')
+        return pd.DataFrame(
+            {column: self.clean_sailboat_column(column, values, names) for column, values in columns.items()},
+            index=df.index,
+            copy=False,
+        )
+
+    def prep_frame(self, df, workers=None, partition='rows'):
+        """
+        Turn raw get_all_daily_postings output into the fully expanded,
+        cleaned frame, optionally across a process pool (see
+        map_partitions). The result is the same as the single-process path.
+        """
+        with self.METRICS.stage('prep') as stage:
+            stage['rows'] = len(df)
+            columns = list(dict.fromkeys(
+                self.COLUMN_ALIASES.get(column.strip(), column.strip())
+                for column in self.attribute_columns(df['attrs'])
+            ))
+            prepped, stage['workers'] = self.map_partitions('prep_partition', df, workers, partition, columns)
+            return self.strip_nan_columns(prepped.reset_index(drop=True))
+
+    def prep_daily_sailboats_data(self, workers=None):
+
         # current_df = craigslist_sailboats.get_city_items('keys')		
         download_time, current_df = self.get_all_daily_postings()
-            
-        attribute_df = self.expand_all_attributes(current_df['attrs'])
-        expanded_df = pd.concat([current_df, attribute_df], axis=1).drop('attrs', axis=1)
-        
-        combined_df = self.combine_city_sailboats_data(expanded_df)
-        cleaned_df = self.clean_city_sailboats_data(combined_df)
-        
+
         # strip_cols = ['repost_of', 'name', 'url', 'where', 'body', 
         # 		  'condition', 'boat_propulsion_type', 'make / manufacturer', 
         # 		  'propulsion type', 'model name / number']
         # cleaned_df[strip_cols] = self.clean_str_columns(cleaned_df[strip_cols])
-        
-        stripped_df = self.strip_nan_columns(cleaned_df)
-        
-        return download_time, stripped_df
+
+        return download_time, self.prep_frame(current_df, workers=workers)
+
+def _call_method(search, method, df, *args):
+    # Module level so ProcessPoolExecutor can pickle it.
+    return getattr(search, method)(df, *args)
+
 
 class Bikes(Search):
     """
@@ -441,6 +780,28 @@ class Bikes(Search):
     'bia' search category.
     """
 
+    CATEGORY_CODE = 'bia'
+    COLUMN_ALIASES = {
+        'condición': 'condition',
+        'marca / fabricante': 'make / manufacturer',
+        'nombre / número de modelo': 'model name / number',
+    }
+    PROMOTED_ATTRIBUTES = (
+        'bicycle type',
+        'frame size',
+        'frame material',
+        'wheel size',
+        'suspension',
+        'brake type',
+        'electric assist',
+        'condition',
+        'make / manufacturer',
+        'model name / number',
+    )
+    COLUMN_TYPES = {'price': 'float'} | {column: 'text' for column in PROMOTED_ATTRIBUTES}
+    TEXT_EXTRACTS = {'make / manufacturer': 'make', 'model name / number': 'model'}
+    COMPARABLE_LABELS = ('bicycle type', 'frame size')
+
     def combine_city_bike_data(self, df, eval_cols=()):
         """
         """
@@ -465,6 +826,45 @@ class RVs(Search):
     for the 'rva' search category.
     """
 
+    CATEGORY_CODE = 'rva'
+    COLUMN_ALIASES = {
+        'año de fabricación': 'year manufactured',
+        'condición': 'condition',
+        'marca / fabricante': 'make / manufacturer',
+        'nombre / número de modelo': 'model name / number',
+        'cuentakilómetros': 'odometer',
+    }
+    PROMOTED_ATTRIBUTES = (
+        'year manufactured',
+        'rv type',
+        'condition',
+        'odometer',
+        'fuel',
+        'transmission',
+        'title status',
+        'make / manufacturer',
+        'model name / number',
+    )
+    COLUMN_TYPES = {
+        'price': 'float',
+        'year manufactured': 'year',
+        'odometer': 'int',
+        'rv type': 'text',
+        'condition': 'text',
+        'fuel': 'text',
+        'transmission': 'text',
+        'title status': 'text',
+        'make / manufacturer': 'text',
+        'model name / number': 'text',
+    }
+    TEXT_EXTRACTS = {
+        'make / manufacturer': 'make',
+        'model name / number': 'model',
+        'year manufactured': 'year',
+    }
+    COMPARABLE_FEATURES = {'year manufactured': 1.0, 'odometer': 0.5}
+    COMPARABLE_LABELS = ('make / manufacturer', 'rv type')
+
     def combine_city_rv_data(self, df, eval_cols=()):
         """
         """
@@ -504,6 +904,10 @@ class Properties(Search):
     for the 'properties' search category.
     """
 
+    # Real estate for sale. Listing details arrive as
+    # unlabelled tags ("3BR / 2Ba"), so only price is typed.
+    CATEGORY_CODE = 'rea'
+
     def combine_city_property_data(self, df, eval_cols=()):
         """
         """
@@ -0,0 +1,196 @@
+"""
+Seeded synthetic craigslist data for benchmarks and load tests.
+
+The generated results have the shape CraigslistForSale.get_results(...,
+include_details=True) yields, including the mess the real site produces:
+attribute names in spanish (see Boats.COLUMN_ALIASES), prices that are
+formatted, blank or not a number at all, and geotags that are missing or
+already stringified by a CSV round trip.
+
+Same seed, same data - so timings from two runs are comparable.
+"""
+import numpy as np
+import pandas as pd
+
+# Rough site centroids so geotags land near the city they are filed under.
+CITY_CENTROIDS = {
+    'sfbay': (37.77, -122.42),
+    'seattle': (47.61, -122.33),
+    'losangeles': (34.05, -118.24),
+    'sandiego': (32.72, -117.16),
+    'portland': (45.52, -122.68),
+    'newyork': (40.71, -74.01),
+    'boston': (42.36, -71.06),
+    'miami': (25.76, -80.19),
+    'annapolis': (38.98, -76.49),
+    'chicago': (41.88, -87.63),
+}
+
+MAKES = {
+    'Catalina': ['22', '25', '27', '30', '34', '36', '42'],
+    'Hunter': ['23', '26', '280', '310', '33', '356'],
+    'Beneteau': ['Oceanis 331', 'First 35', 'Oceanis 40'],
+    'Pearson': ['26', '30', '323', '36'],
+    'Islander': ['28', '30', '36'],
+    'Ericson': ['27', '32', '35'],
+    'C&C': ['27', '30', '35'],
+    'O\'Day': ['22', '25', '27'],
+    'Hobie': ['16', '18'],
+    'MacGregor': ['26X', '26M'],
+}
+
+PROPULSION = ['sail', 'power', 'human']
+CONDITIONS = ['excellent', 'good', 'fair', 'like new', 'salvage']
+SPANISH_CONDITIONS = ['excelente', 'bueno', 'regular', 'como nuevo']
+HOODS = ['marina', 'downtown', 'harbor', 'yacht club', 'north shore', 'east bay', None]
+
+BODY_WORDS = (
+    'well maintained sloop new sails bottom paint survey available diesel '
+    'outboard trailer included slip transferable cushions roller furling '
+    'autopilot gps chartplotter solar panel dinghy motivated seller cash only '
+    'no lowballers serious inquiries clean title upgraded rigging'
+).split()
+
+
+def generate_results(n, seed=0, cities=None):
+    """
+    n raw result dicts, each tagged with the `city` it was fetched from.
+    """
+    return generate_frame(n, seed=seed, cities=cities).to_dict('records')
+
+
+def generate_city_results(n, seed=0, cities=None):
+    """
+    n raw results grouped {city: [result, ...]} - the per-city lists
+    Search.get_city_items builds before converting them to a DataFrame.
+    """
+    frame = generate_frame(n, seed=seed, cities=cities)
+    return {
+        city: group.drop(columns='city').to_dict('records')
+        for city, group in frame.groupby('city', sort=False)
+    }
+
+
+def generate_frame(n, seed=0, cities=None):
+    """
+    n synthetic listings as the DataFrame get_all_daily_postings returns:
+    one row per result, a `city` column and an unexpanded `attrs` column.
+    """
+    rng = np.random.default_rng(seed)
+    cities = list(cities or CITY_CENTROIDS)
+
+    city = rng.choice(cities, size=n)
+    make_names = list(MAKES)
+    make = rng.choice(make_names, size=n)
+    model = [MAKES[name][index % len(MAKES[name])] for name, index in zip(make, rng.integers(0, 100, size=n))]
+    year = rng.integers(1965, 2024, size=n)
+    length = rng.integers(14, 46, size=n)
+    hours = rng.integers(0, 3000, size=n)
+    price_value = np.round(rng.lognormal(mean=9.3, sigma=0.9, size=n), -2)
+
+    # Unique, unordered ids without sampling from a huge range.
+    ids = 7_600_000_000 + rng.permutation(n) * 37 + rng.integers(0, 37, size=n)
+    posted = pd.Timestamp('2026-08-01') + pd.to_timedelta(rng.integers(0, 60 * 24 * 30, size=n), unit='min')
+    posted_text = posted.strftime('%Y-%m-%d %H:%M')
+
+    spanish = rng.random(n) < 0.15
+    year_in_name = rng.random(n) < 0.6
+
+    rows = {
+        'id': ids.astype(str),
+        'repost_of': np.where(rng.random(n) < 0.1, (ids - 12345).astype(str), None),
+        'name': [
+            f'{y} {m} {mo}' if with_year else f'{m} {mo} {l}ft'
+            for y, m, mo, l, with_year in zip(year, make, model, length, year_in_name)
+        ],
+        'url': [f'https://{c}.craigslist.org/boa/d/{i}.html' for c, i in zip(city, ids)],
+        'datetime': posted_text,
+        'last_updated': posted_text,
+        'price': _messy_prices(rng, price_value),
+        'where': rng.choice(np.array(HOODS, dtype=object), size=n),
+        'has_image': rng.random(n) < 0.9,
+        'geotag': _messy_geotags(rng, city),
+        'deleted': False,
+        'body': _bodies(rng, n),
+        'created': (posted - pd.Timedelta(hours=6)).strftime('%Y-%m-%d %H:%M'),
+        'images': [[] for _ in range(n)],
+        'attrs': [
+            _attrs(*values)
+            for values in zip(year, make, model, length, hours, spanish, rng.random((n, 6)))
+        ],
+        'city': city,
+    }
+    return pd.DataFrame(rows)
+
+
+def _messy_prices(rng, values):
+    styles = rng.random(len(values))
+    prices = np.empty(len(values), dtype=object)
+    for index, (value, style) in enumerate(zip(values, styles)):
+        if style < 0.75:
+            prices[index] = f'${value:,.0f}'
+        elif style < 0.85:
+            prices[index] = f'{value:.0f}'
+        elif style < 0.9:
+            prices[index] = f'$ {value:,.0f} obo'
+        elif style < 0.95:
+            prices[index] = None
+        else:
+            prices[index] = 'please call'
+    return prices
+
+
+def _messy_geotags(rng, cities):
+    jitter = rng.normal(scale=0.15, size=(len(cities), 2))
+    styles = rng.random(len(cities))
+    geotags = np.empty(len(cities), dtype=object)
+    for index, (city, style) in enumerate(zip(cities, styles)):
+        lat, lon = CITY_CENTROIDS.get(city, (39.5, -98.35))
+        lat, lon = round(lat + jitter[index, 0], 5), round(lon + jitter[index, 1], 5)
+        if style < 0.8:
+            geotags[index] = (lat, lon)
+        elif style < 0.9:
+            geotags[index] = f'({lat}, {lon})'
+        else:
+            geotags[index] = None
+    return geotags
+
+
+def _bodies(rng, n):
+    sizes = rng.integers(10, 80, size=n)
+    words = np.array(BODY_WORDS, dtype=object)[rng.integers(0, len(BODY_WORDS), size=sizes.sum())]
+    ends = np.cumsum(sizes)
+    return [' '.join(words[end - size:end]) for size, end in zip(sizes, ends)]
+
+
+def _attrs(year, make, model, length, hours, spanish, draw):
+    """
+    One listing's attribute strings, in english or with the spanish aliases
+    Boats.combine_city_sailboats_data coalesces. draw is six uniform floats.
+    """
+    if spanish:
+        attrs = [
+            f'año de fabricación: {year}',
+            f'condición: {SPANISH_CONDITIONS[int(draw[0] * len(SPANISH_CONDITIONS))]}',
+            f'marca / fabricante: {make}',
+            f'nombre / número de modelo: {model}',
+            f'tipo de propulsión: {PROPULSION[int(draw[1] * len(PROPULSION))]}',
+        ]
+        if draw[2] < 0.5:
+            attrs.append(f'horas del motor (en total): {hours}')
+        return attrs
+
+    attrs = [
+        f'condition: {CONDITIONS[int(draw[0] * len(CONDITIONS))]}',
+        f'length overall (LOA): {length}',
+        f'make / manufacturer: {make}',
+        f'model name / number: {model}',
+        f'propulsion type: {PROPULSION[int(draw[1] * len(PROPULSION))]}',
+    ]
+    if draw[2] < 0.7:
+        attrs.append(f'year manufactured: {year}' if draw[3] < 0.7 else f'mfg_year: {year}')
+    if draw[4] < 0.5:
+        attrs.append(f'engine hours (total): {hours}')
+    if draw[5] < 0.1:
+        attrs.append('cryptocurrency ok')  # no colon - dropped by expand_attributes
+    return attrs
@@ -0,0 +1,131 @@
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+import craigsail.db as craigsail_db
+from craigsail.archive import RawArchive, prepped_in_order, reprocess
+from craigsail.cli import main
+from craigsail.db import CraigsailDB
+from craigsail.search import Boats
+
+DAY_ONE = pd.Timestamp('2026-09-01T08:00:00+00:00')
+DAY_TWO = pd.Timestamp('2026-09-02T08:00:00+00:00')
+
+
+def result(listing_id, price, attrs=('condition: good',)):
+    return {
+        'id': listing_id, 'name': f'1980 Catalina {listing_id}', 'url': f'http://x/{listing_id}',
+        'price': price, 'geotag': (37.8, -122.4), 'has_image': True, 'attrs': list(attrs),
+    }
+
+
+@pytest.fixture(params=['zst', 'gz'])
+def archive(request, tmp_path):
+    return RawArchive(tmp_path / 'raw', codec=request.param)
+
+
+def test_appends_read_back_as_one_stream(archive):
+    archive.append('boo', 'sfbay', [result('1', '$100')], fetched=DAY_ONE)
+    path = archive.append('boo', 'sfbay', [result('2', '$200')], fetched=DAY_ONE + pd.Timedelta(hours=1))
+
+    assert path == archive.root / 'boo' / '2026-09-01' / f'sfbay.jsonl.{archive.codec}'
+    lines = list(archive.read(path))
+    assert [entry['id'] for _, entry in lines] == ['1', '2']
+    assert lines[0][0] == DAY_ONE.isoformat()
+    assert lines[0][1]['geotag'] == [37.8, -122.4]
+
+
+def test_partitions_filter_by_day_and_category(archive):
+    archive.append('boo', 'sfbay', [result('1', '$1')], fetched=DAY_ONE)
+    archive.append('boo', 'seattle', [result('2', '$1')], fetched=DAY_TWO)
+    archive.append('bia', 'sfbay', [result('3', '$1')], fetched=DAY_TWO)
+
+    assert [(p.day, p.category, p.city) for p in archive.partitions()] == [
+        ('2026-09-01', 'boo', 'sfbay'), ('2026-09-02', 'bia', 'sfbay'), ('2026-09-02', 'boo', 'seattle'),
+    ]
+    assert [p.city for p in archive.partitions(since='2026-09-02', categories=['boo'])] == ['seattle']
+    assert [p.day for p in archive.partitions(until='2026-09-01')] == ['2026-09-01']
+
+
+def test_gzip_archive_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(craigsail_db, 'zstd', False)
+    assert RawArchive(tmp_path).codec == 'gz'
+
+
+@patch('craigsail.search.clfs')
+def test_get_city_items_archives_raw_results(mock_clfs, archive):
+    mock_clfs.return_value.get_results.return_value = [result('1', '$100')]
+
+    Boats(search_category='boo', data_path='test_path', archive=archive).get_city_items('sfbay')
+
+    (partition,) = archive.partitions()
+    assert (partition.category, partition.city) == ('boo', 'sfbay')
+    assert [entry['attrs'] for _, entry in archive.read(partition.path)] == [['condition: good']]
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_reprocess_rebuilds_listings_in_order(archive, tmp_path, workers):
+    archive.append('boo', 'sfbay', [result('1', '$1,000'), result('2', '$500')], fetched=DAY_ONE)
+    archive.append('boo', 'sfbay', [result('1', '$900')], fetched=DAY_TWO)
+    db = CraigsailDB(str(tmp_path / 'rebuilt.db'))
+
+    partitions, saved = reprocess(archive, db, workers=workers)
+
+    assert partitions == 2
+    assert (saved.inserted, saved.price_changes) == (2, 3)
+    assert db.price_history('1')['observed'].tolist() == [DAY_ONE.isoformat(), DAY_TWO.isoformat()]
+    listings = db.load_listings(with_blobs=True).set_index('id')
+    assert listings.loc['1', 'price'] == 900.0
+    assert listings.loc['1', 'last_seen'] == DAY_TWO.isoformat()
+    assert '"condition": "good"' in listings.loc['1', 'attributes']
+
+
+def test_prepped_partitions_are_submitted_a_bounded_window_ahead():
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, partition):
+            submitted.append(partition)
+            future = Future()
+            future.set_result([(partition, None)])
+            return future
+
+    consumed = 0
+    for partition, batches in prepped_in_order(Pool(), range(10), window=3):
+        assert batches == [(partition, None)]
+        assert partition == consumed
+        assert len(submitted) <= consumed + 1 + 3
+        consumed += 1
+
+    assert submitted == list(range(10))
+
+
+def test_replaying_old_results_never_moves_a_listing_backwards(archive, tmp_path):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(pd.DataFrame([result('1', '$700', attrs=())]), category='boo')
+    db.mark_delisted('boo', 'sfbay', seen_ids=['other'])
+    before = db.load_listings().iloc[0]
+
+    archive.append('boo', 'sfbay', [result('1', '$1,000')], fetched=DAY_ONE)
+    reprocess(archive, db, since='2026-09-01')
+
+    after = db.load_listings(with_blobs=True).iloc[0]
+    assert after['price'] == 700.0
+    assert after['last_seen'] == before['last_seen']
+    assert after['delisted_at'] == before['delisted_at']
+    assert '"condition": "good"' in after['attributes']  # the content is refreshed
+    assert db.price_history('1')['price'].tolist() == [700.0]
+
+
+def test_reprocess_subcommand(archive, tmp_path, capsys):
+    archive.append('boo', 'sfbay', [result('1', '$1')], fetched=DAY_ONE)
+    archive.append('boo', 'sfbay', [result('2', '$1')], fetched=DAY_TWO)
+
+    code = main(['reprocess', '--archive-dir', str(archive.root), '--db', str(tmp_path / 'x.db'),
+                 '--since', '2026-09-02', '--workers', '1'])
+
+    assert code == 0
+    assert '1 partitions reprocessed' in capsys.readouterr().out
+    assert CraigsailDB(str(tmp_path / 'x.db')).load_listings()['id'].tolist() == ['2']
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+
+import pandas as pd
+
+from craigsail.db import CraigsailDB
+from web_app.app import create_app
+from web_app.asgi import AsgiAdapter, create_asgi_app
+
+
+def request(app, path, query_string=b'', headers=()):
+    """
+    Drive one ASGI http request and collect what the app sends.
+    """
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+        'headers': list(headers), 'http_version': '1.1', 'scheme': 'http',
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5555), 'root_path': '',
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)  # the client never disconnects
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await app(scope, receive, send)
+    return run(), sent
+
+
+def response(sent):
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def test_serves_flask_routes(tmp_path):
+    db_path = tmp_path / 'craigsail.db'
+    CraigsailDB(str(db_path)).save_listings(pd.DataFrame([
+        {'id': '1', 'name': 'Boat', 'url': 'http://x/1', 'city': 'sfbay',
+         'price': '$1,000', 'geotag': (37.85, -122.48)},
+    ]), category='boo')
+    app = create_asgi_app(str(db_path))
+
+    call, sent = request(app, '/map', query_string=b'city=sfbay')
+    asyncio.run(call)
+
+    status, headers, body = response(sent)
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert json.loads(body)['count'] == 1
+
+
+def test_environ_carries_query_and_headers():
+    environ = AsgiAdapter.environ({
+        'method': 'GET', 'path': '/map', 'query_string': b'city=sfbay',
+        'headers': [(b'accept', b'text/html'), (b'content-length', b'0'), (b'x-a', b'1'), (b'x-a', b'2')],
+    }, b'')
+
+    assert environ['PATH_INFO'] == '/map'
+    assert environ['QUERY_STRING'] == 'city=sfbay'
+    assert environ['HTTP_ACCEPT'] == 'text/html'
+    assert environ['CONTENT_LENGTH'] == '0'
+    assert environ['HTTP_X_A'] == '1,2'
+
+
+def test_requests_past_the_concurrency_limit_get_503():
+    release = threading.Event()
+
+    def slow_app(environ, start_response):
+        release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'done']
+
+    app = AsgiAdapter(slow_app, threads=2, max_concurrency=1, queue_timeout=0.05)
+    first, first_sent = request(app, '/')
+    second, second_sent = request(app, '/')
+
+    async def run():
+        pending = asyncio.ensure_future(first)
+        await asyncio.sleep(0.01)
+        await second
+        release.set()
+        await pending
+    asyncio.run(run())
+
+    assert response(first_sent)[0] == 200
+    status, headers, _ = response(second_sent)
+    assert status == 503
+    assert headers[b'retry-after'] == b'1'
+    assert app.rejected == 1
+
+
+def test_event_streams_are_relayed_chunk_by_chunk():
+    def stream_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+        return iter([b'id: 1\n\n', b'id: 2\n\n'])
+
+    app = AsgiAdapter(stream_app, threads=1)
+    call, sent = request(app, '/map/stream')
+    asyncio.run(call)
+
+    assert [message.get('body') for message in sent[1:]] == [b'id: 1\n\n', b'id: 2\n\n', b'']
+    assert all(message['more_body'] for message in sent[1:3])
+    assert app.streams == 0
+
+
+def test_stream_limit():
+    def stream_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/event-stream')])
+        return iter([b'id: 1\n\n'])
+
+    app = AsgiAdapter(stream_app, threads=1, max_streams=1)
+    app.streams = 1  # one already open
+    call, sent = request(app, '/map/stream')
+    asyncio.run(call)
+
+    assert response(sent)[0] == 503
+
+
+def test_metrics_report_adapter_load(tmp_path):
+    app = create_asgi_app(str(tmp_path / 'craigsail.db'))
+    call, sent = request(app, '/metrics')
+    asyncio.run(call)
+
+    text = response(sent)[2].decode()
+    assert 'craigsail_asgi_inflight_requests 1' in text  # the /metrics request itself
+    assert 'craigsail_asgi_open_streams 0' in text
+    assert '# TYPE craigsail_asgi_rejected_requests_total counter' in text
+    assert 'craigsail_asgi_rejected_requests_total 0' in text
+
+
+def test_adapter_wraps_any_flask_app(tmp_path):
+    app = AsgiAdapter(create_app(str(tmp_path / 'craigsail.db')))
+    call, sent = request(app, '/healthz')
+    asyncio.run(call)
+
+    assert json.loads(response(sent)[2])['status'] == 'ok'
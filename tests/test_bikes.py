@@ -15,3 +15,14 @@ def test_combine_city_bike_data(bikes_instance):
 def test_clean_city_bike_data(bikes_instance):
     # Placeholder for actual test
     pass
+
+def test_prep_results_promotes_bike_attributes(bikes_instance):
+    df = pd.DataFrame({
+        'price': ['$450'],
+        'attrs': [['bicycle type: road', 'frame size: 56 cm', 'condición: excelente']],
+    })
+    prepped = bikes_instance.prep_results(df)
+    assert prepped['bicycle type'].tolist() == ['road']
+    assert prepped['frame size'].tolist() == ['56 cm']
+    assert prepped['condition'].tolist() == ['excelente']
+    assert prepped['price'].tolist() == [450.0]
@@ -1,8 +1,12 @@
 import pytest
+import tracemalloc
 from unittest.mock import patch, MagicMock
 import pandas as pd
 from pathlib import Path
+import craigsail.search as search_module
+from craigsail.instrument import RunMetrics
 from craigsail.search import Boats
+from craigsail.synthetic import generate_frame
 
 @pytest.fixture
 def boats_instance():
@@ -17,3 +21,89 @@ def test_clean_city_sailboats_data(boats_instance):
     df = pd.DataFrame({'name': ['Boat 1999'], 'price': ['$1,000']})
     cleaned_df = boats_instance.clean_city_sailboats_data(df)
     assert cleaned_df['price'].iloc[0] == 1000.0
+
+def raw_boats():
+    # seattle never reports 'year manufactured'; only sfbay does.
+    return pd.DataFrame({
+        'id': ['1', '2', '3', '4'],
+        'name': ['1979 Catalina 27', 'Hunter 26', '1985 Pearson 30', 'O\'Day 22'],
+        'price': ['$1,000', '$2,500', '', '$700'],
+        'city': ['seattle', 'sfbay', 'seattle', 'sfbay'],
+        'attrs': [
+            ['condición: good'],
+            ['year manufactured: 1990', 'condition: fair'],
+            ['length overall (LOA): 30'],
+            ['condition: good'],
+        ],
+    })
+
+def test_parallel_prep_matches_serial(monkeypatch):
+    monkeypatch.setattr(search_module, 'MIN_PARALLEL_ROWS', 0)
+    boats = Boats(search_category='boo', data_path='test_path')
+    serial = boats.prep_frame(raw_boats())
+
+    for partition in ('rows', 'city'):
+        parallel = boats.prep_frame(raw_boats(), workers=2, partition=partition)
+        pd.testing.assert_frame_equal(parallel, serial)
+
+    # The seattle slice still gets its year pulled from the title.
+    assert serial['year manufactured'].str.strip().tolist()[:3] == ['1979', '1990', '1985']
+    assert pd.isna(serial['year manufactured'][3])
+    # condición is folded into condition in every slice.
+    assert serial['condition'].isna().tolist() == [False, False, True, False]
+    assert 'condición' not in serial.columns
+
+def test_prep_frame_peak_memory_stays_near_the_output_size():
+    raw = generate_frame(10_000, seed=3)
+    boats = Boats(search_category='boo', data_path='test_path')
+
+    tracemalloc.start()
+    try:
+        prepped = boats.prep_frame(raw)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # One pivot of the attributes and one frame at the end; a frame per
+    # listing and a copy per step peaked at over 15x.
+    assert peak < 2.5 * prepped.memory_usage(deep=True).sum()
+
+def test_prep_records_a_stage():
+    metrics = RunMetrics()
+    Boats(search_category='boo', data_path='test_path', metrics=metrics).prep_frame(raw_boats(), workers=4)
+    assert metrics.summary()['stages']['prep']['rows'] == 4
+    assert metrics.stages[0]['workers'] == 1  # too small to be worth a pool
+
+def test_prep_results_promotes_and_types_attributes(boats_instance):
+    prepped = boats_instance.prep_results(raw_boats())
+
+    assert prepped['year manufactured'].tolist() == [1979, 1990, 1985, None]
+    assert prepped['condition'].tolist()[:2] == ['good', 'fair']
+    assert prepped['length overall (LOA)'].tolist()[2] == 30.0
+    assert prepped['price'].tolist()[:2] == [1000.0, 2500.0]
+    assert 'attrs' in prepped.columns  # everything else still reaches the attributes blob
+
+def test_prep_results_prefers_canonical_attribute_over_alias(boats_instance):
+    df = pd.DataFrame({'name': ['Boat'], 'attrs': [['mfg_year: 1970', 'year manufactured: 1975']]})
+    assert boats_instance.prep_results(df)['year manufactured'].tolist() == [1975]
+
+def test_long_attributes_fold_aliases_without_a_wide_frame():
+    attrs = pd.Series([
+        ['mfg_year: 1970', 'year manufactured: 1975', 'condition: '],
+        None,
+        ['marca / fabricante: Hunter', 'marca / fabricante: Catalina', 'engine hours (total):1:30'],
+    ], index=[10, 11, 12])
+    long_df = Boats.long_attributes(attrs)
+
+    assert sorted(long_df.itertuples(index=False, name=None)) == [
+        (10, 'year manufactured', '1975'),
+        (12, 'engine hours (total)', '1:30'),
+        (12, 'make / manufacturer', 'Hunter'),
+    ]
+
+def test_prep_results_matches_in_a_pool(monkeypatch, boats_instance):
+    monkeypatch.setattr(search_module, 'MIN_PARALLEL_ROWS', 0)
+    pd.testing.assert_frame_equal(
+        boats_instance.prep_results(raw_boats(), workers=2),
+        boats_instance.prep_results(raw_boats()),
+    )
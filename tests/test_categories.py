@@ -0,0 +1,95 @@
+import pytest
+
+import craigsail.categories as categories
+from craigsail.categories import CATEGORIES, CategoryRegistry, validate_category
+from craigsail.search import Bikes, Boats, Properties, RVs, Search
+
+
+class Motorcycles(Search):
+    CATEGORY_CODE = 'mca'
+    PROMOTED_ATTRIBUTES = ('odometer',)
+    COLUMN_TYPES = {'price': 'float', 'odometer': 'int'}
+
+
+class FakeEntryPoint:
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+
+    def load(self):
+        if isinstance(self.target, Exception):
+            raise self.target
+        return self.target
+
+
+def registry_with_plugins(monkeypatch, *plugins):
+    monkeypatch.setattr(categories, 'entry_points', lambda group: list(plugins))
+    return CategoryRegistry([Boats, Bikes])
+
+
+def test_builtin_categories():
+    assert CATEGORIES['boo'] is Boats
+    assert CATEGORIES['bia'] is Bikes
+    assert CATEGORIES['rva'] is RVs
+    assert CATEGORIES['rea'] is Properties
+    assert CATEGORIES.get('unknown', Search) is Search
+
+
+def test_plugins_are_discovered_from_entry_points(monkeypatch):
+    registry = registry_with_plugins(monkeypatch, FakeEntryPoint('mca', Motorcycles))
+    assert registry['mca'] is Motorcycles
+    assert set(registry) == {'boo', 'bia', 'mca'}
+
+
+def test_plugin_can_replace_a_builtin(monkeypatch):
+    class BetterBoats(Boats):
+        pass
+
+    registry = registry_with_plugins(monkeypatch, FakeEntryPoint('boo', BetterBoats))
+    assert registry['boo'] is BetterBoats
+
+
+@pytest.mark.parametrize('plugin', [
+    FakeEntryPoint('mca', ImportError('no module named motorcycles')),
+    FakeEntryPoint('mca', object),
+    FakeEntryPoint('moto', Motorcycles),  # name does not match CATEGORY_CODE
+])
+def test_broken_plugins_are_skipped_with_a_warning(monkeypatch, plugin):
+    registry = registry_with_plugins(monkeypatch, plugin)
+    with pytest.warns(UserWarning, match='Skipping category plugin'):
+        assert 'mca' not in registry
+    assert registry['boo'] is Boats
+
+
+def test_validate_category_rejects_bad_declarations():
+    class NoCode(Search):
+        pass
+
+    class BadType(Motorcycles):
+        COLUMN_TYPES = {'odometer': 'miles'}
+
+    class PromotesAlias(Motorcycles):
+        COLUMN_ALIASES = {'kilometraje': 'odometer'}
+        PROMOTED_ATTRIBUTES = ('kilometraje',)
+
+    with pytest.raises(ValueError, match='CATEGORY_CODE'):
+        validate_category(NoCode)
+    with pytest.raises(ValueError, match='miles'):
+        validate_category(BadType)
+    with pytest.raises(ValueError, match='kilometraje'):
+        validate_category(PromotesAlias)
+
+    class TextFeature(Motorcycles):
+        COMPARABLE_FEATURES = {'make / manufacturer': 1.0}
+
+    with pytest.raises(ValueError, match='COMPARABLE_FEATURES'):
+        validate_category(TextFeature)
+    with pytest.raises(TypeError):
+        validate_category(dict)
+
+
+def test_register_as_decorator():
+    registry = CategoryRegistry(group=None)
+    assert registry.register(Motorcycles) is Motorcycles
+    assert dict(registry) == {'mca': Motorcycles}
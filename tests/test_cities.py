@@ -0,0 +1,58 @@
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from craigsail.cities import SITES, CityRegistry, Site, haversine_km
+from craigsail.globals import CRAIGSLIST_CITIES
+from craigsail.search import Search
+
+
+def test_registry_covers_the_display_names():
+    registered = {(site.state, site.name) for site in SITES.values()}
+    listed = {(state, name) for state, names in CRAIGSLIST_CITIES.items() for name in names}
+
+    assert registered <= listed
+    # Only sites craigslist lists under a second state (and west palm beach,
+    # part of south florida) are left out.
+    assert len(listed - registered) <= 4
+    assert SITES['sfbay'] == Site('sfbay', 'san francisco bay area', 'California', 37.77, -122.42)
+
+
+def test_lookups_by_state_and_name():
+    assert 'portland' in [site.slug for site in SITES.in_state('oregon')]
+    assert {site.state for site in SITES.named('Springfield')} == {'Illinois', 'Missouri'}
+    with pytest.raises(ValueError, match='Unknown state'):
+        SITES.in_state('Ontario')
+
+
+def test_near_matches_a_full_scan():
+    point = (45.5, -122.7)
+    expected = sorted(
+        (haversine_km(*point, site.latitude, site.longitude), site.slug)
+        for site in SITES.values()
+        if haversine_km(*point, site.latitude, site.longitude) <= 300
+    )
+
+    found = SITES.near(*point, radius_km=300)
+
+    assert [(round(km, 6), site.slug) for site, km in found] == [(round(km, 6), slug) for km, slug in expected]
+    assert found[0][0].slug == 'portland'
+    assert SITES.near(*point, radius_km=0) == []
+
+
+def test_near_wraps_the_antimeridian():
+    registry = CityRegistry([Site('east', 'east', 'X', 0.0, 179.9), Site('west', 'west', 'X', 0.0, -179.9)])
+    assert [site.slug for site, _ in registry.near(0.0, 179.95, radius_km=50)] == ['east', 'west']
+
+
+def test_duplicate_slugs_are_rejected():
+    with pytest.raises(ValueError, match='Duplicate'):
+        CityRegistry([Site('a', 'a', 'X', 0, 0), Site('a', 'b', 'X', 1, 1)])
+
+
+def test_strict_validation_works_offline():
+    with patch.dict(sys.modules, {'craigslist.base': None}):
+        assert Search.validate_cities([' SFBay', 'portland'], strict=True) == ['sfbay', 'portland']
+        with pytest.raises(ValueError, match='seattle-tacoma: seattle'):
+            Search.validate_cities(['seattle-tacoma'], strict=True)
@@ -1,10 +1,16 @@
+import json
+import threading
+from argparse import ArgumentTypeError
 from unittest.mock import patch
 
 import pandas as pd
 import pytest
 
-from craigsail.cli import CATEGORY_CLASSES, main, parse_filters
+from craigsail.cli import CATEGORY_CLASSES, main, parse_age, parse_filters
+import craigsail.search as search_module
+from craigsail.cities import SITES
 from craigsail.db import CraigsailDB
+from craigsail.fakelist import FakeCraigslist
 from craigsail.search import Boats, Search
 
 
@@ -31,7 +37,7 @@ def test_bad_city_exits_without_traceback(tmp_path, capsys):
     assert 'Unknown craigslist site' in capsys.readouterr().err
 
 
-def test_main_persists_results_to_db(tmp_path):
+def test_main_persists_results_to_db(tmp_path, capsys):
     postings = pd.DataFrame([{
         'id': '99', 'name': 'Test boat', 'url': 'http://x/99', 'city': 'sfbay',
         'price': '$3,000', 'where': 'marina', 'geotag': (37.8, -122.4), 'has_image': True,
@@ -47,6 +53,7 @@ def test_main_persists_results_to_db(tmp_path):
     saved = CraigsailDB(str(tmp_path / 'craigsail.db')).load_listings()
     assert len(saved) == 1
     assert saved['price'].iloc[0] == 3000.0
+    assert '1 new, 0 changed, 0 unchanged' in capsys.readouterr().out
 
 
 def test_main_csv_flag_writes_snapshot(tmp_path):
@@ -58,3 +65,300 @@ def test_main_csv_flag_writes_snapshot(tmp_path):
         main(['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay', '--csv'])
 
     assert list(tmp_path.glob('search_results_*.csv'))
+
+
+def test_compact_subcommand(tmp_path, capsys):
+    db_path = tmp_path / 'craigsail.db'
+    CraigsailDB(str(db_path))
+
+    code = main(['compact', '--db', str(db_path), '--keep-days', '30'])
+
+    assert code == 0
+    assert 'daily and 0 weekly rollups' in capsys.readouterr().out
+
+
+def test_compact_rejects_inverted_windows(tmp_path):
+    code = main(['compact', '--db', str(tmp_path / 'x.db'), '--keep-days', '90', '--weekly-after-days', '30'])
+    assert code == 2
+
+
+def test_fakelist_rejects_impossible_rates():
+    assert main(['fakelist', '--error-rate', '0.8', '--throttle-rate', '0.5']) == 2
+
+
+def test_search_sweeps_several_cities_from_the_fake_craigslist(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(search_module, 'clfs', None)
+    with FakeCraigslist(listings=20) as server, server.proxied():
+        code = main([
+            '--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay', 'seattle', 'boise',
+            '--no-archive',
+        ])
+
+    assert code == 0
+    assert 'boo: 60 listings from 3 cities' in capsys.readouterr().out
+    listings = CraigsailDB(str(tmp_path / 'craigsail.db')).load_listings()
+    assert listings.groupby('city').size().to_dict() == {'boise': 20, 'seattle': 20, 'sfbay': 20}
+    assert listings['latitude'].notna().any()
+
+
+def test_workers_sweep_what_the_coordinator_plans(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(search_module, 'clfs', None)
+    db_path = str(tmp_path / 'craigsail.db')
+    codes = {}
+
+    def run(name, argv):
+        codes[name] = main(argv)
+
+    with FakeCraigslist(listings=20) as server, server.proxied():
+        coordinator = threading.Thread(target=run, args=('coordinator', [
+            'coordinate', '--search_category', 'boo', '--data_path', str(tmp_path),
+            '--cities', 'sfbay', 'seattle', 'boise', 'portland', '--poll-seconds', '0.05',
+        ]))
+        coordinator.start()
+        workers = [
+            threading.Thread(target=run, args=(name, [
+                'worker', '--db', db_path, '--data_path', str(tmp_path), '--name', name, '--no-archive',
+                '--fetch-workers', '2', '--poll-seconds', '0.05', '--idle-exit', '1',
+            ]))
+            for name in ('node1', 'node2')
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in [*workers, coordinator]:
+            thread.join(timeout=120)
+
+    assert codes == {'coordinator': 0, 'node1': 0, 'node2': 0}
+    assert 'boo: 80 listings from 4 cities' in capsys.readouterr().out
+    db = CraigsailDB(db_path)
+    listings = db.load_listings()
+    assert listings.groupby('city').size().to_dict() == {'boise': 20, 'portland': 20, 'seattle': 20, 'sfbay': 20}
+    with db.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM work_items WHERE state = 'done' AND attempts = 1").fetchone()[0] == 4
+
+
+def test_main_delists_listings_missing_from_sweep(tmp_path):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    sold = pd.DataFrame([{'id': 'old', 'name': 'Sold', 'city': 'sfbay', 'price': '$1', 'has_image': True}])
+    db.save_listings(sold, category='boo')
+    postings = pd.DataFrame([{'id': 'new', 'name': 'Boat', 'price': '$10', 'city': 'sfbay'}])
+
+    with patch.object(Search, 'validate_cities', return_value=['sfbay']), \
+         patch.object(Boats, 'get_all_daily_postings',
+                      return_value=(pd.Timedelta(seconds=1), postings)):
+        main(['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay'])
+
+    assert db.load_listings(live_only=True)['id'].tolist() == ['new']
+
+
+def test_profile_json_prints_stage_summary_and_stores_run(tmp_path, capsys):
+    postings = pd.DataFrame([{'id': '1', 'name': 'Boat', 'price': '$10', 'city': 'sfbay'}])
+
+    with patch.object(Search, 'validate_cities', return_value=['sfbay']), \
+         patch.object(Boats, 'get_all_daily_postings',
+                      return_value=(pd.Timedelta(seconds=1), postings)):
+        main(['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay',
+              '--profile', 'json', '--profile-dump', str(tmp_path / 'run.prof')])
+
+    out = capsys.readouterr().out
+    summary = json.loads(out[out.index('{'):])
+    assert {'to_records', 'save', 'delist'} <= set(summary['stages'])
+    assert (tmp_path / 'run.prof').exists()
+
+    with CraigsailDB(str(tmp_path / 'craigsail.db')).connect() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM run_stages').fetchone()[0] >= 3
+
+
+def test_main_runs_category_prep_before_saving(tmp_path):
+    postings = pd.DataFrame([{
+        'id': '7', 'name': '1982 Catalina 30', 'url': 'http://x/7', 'city': 'sfbay',
+        'price': '$9,500', 'geotag': (37.8, -122.4),
+        'attrs': ['condición: bueno', 'length overall (LOA): 30'],
+    }])
+
+    with patch.object(Search, 'validate_cities', return_value=['sfbay']), \
+         patch.object(Boats, 'get_all_daily_postings',
+                      return_value=(pd.Timedelta(seconds=1), postings)):
+        code = main(['--search_category', 'boo', '--data_path', str(tmp_path),
+                     '--cities', 'sfbay', '--workers', '2'])
+
+    assert code == 0
+    saved = CraigsailDB(str(tmp_path / 'craigsail.db')).load_listings(with_blobs=True)
+    attributes = json.loads(saved['attributes'].iloc[0])
+    assert attributes['year manufactured'] == 1982
+    assert attributes['condition'] == 'bueno'
+    assert attributes['length overall (LOA)'] == 30.0
+
+
+def fake_postings(search):
+    # One listing per (category, city) shard, keyed so the shards never collide.
+    key = f'{search.CATEGORY}-{search.CITIES[0]}'
+    return pd.Timedelta(seconds=1), pd.DataFrame([{
+        'id': key, 'name': key, 'price': '$10', 'city': search.CITIES[0], 'has_image': True,
+    }])
+
+
+def test_main_sweeps_every_category_and_city(tmp_path, capsys):
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', fake_postings):
+        code = main(['--search_category', 'boo', 'bia', '--data_path', str(tmp_path),
+                     '--cities', 'sfbay', 'seattle', '--fetch-workers', '4', '--csv'])
+
+    assert code == 0
+    saved = CraigsailDB(str(tmp_path / 'craigsail.db')).load_listings()
+    assert sorted(saved['id']) == ['bia-seattle', 'bia-sfbay', 'boo-seattle', 'boo-sfbay']
+
+    out = capsys.readouterr().out
+    assert 'boo: 2 listings from 2 cities' in out
+    assert 'bia: 2 listings from 2 cities' in out
+    assert {p.name.split('_')[2] for p in tmp_path.glob('search_results_*.csv')} == {'boo', 'bia'}
+
+
+def test_main_reads_sweep_config(tmp_path):
+    config = tmp_path / 'sweep.json'
+    config.write_text(json.dumps({
+        'data_path': str(tmp_path),
+        'cities': ['sfbay'],
+        'filters': {'has_image': False},
+        'categories': {'boo': {'filters': {'max_price': 500}}, 'rva': {'cities': ['seattle']}},
+    }))
+    seen = []
+
+    def record(search):
+        seen.append((search.CATEGORY, search.CITIES[0], search.FILTERS['has_image'], search.FILTERS.get('max_price')))
+        return fake_postings(search)
+
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', record):
+        assert main(['--config', str(config)]) == 0
+
+    assert sorted(seen) == [
+        ('boo', 'sfbay', False, 500),
+        ('rva', 'seattle', False, None),
+    ]
+
+
+def test_failed_shard_is_reported_and_not_delisted(tmp_path, capsys):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(pd.DataFrame([{'id': 'old', 'name': 'Boat', 'city': 'seattle', 'price': '$1'}]), category='boo')
+
+    def flaky(search):
+        if search.CITIES[0] == 'seattle':
+            raise ConnectionError('timed out')
+        return fake_postings(search)
+
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', flaky):
+        code = main(['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay', 'seattle'])
+
+    assert code == 1
+    assert 'boo/seattle fetch failed: timed out' in capsys.readouterr().err
+    assert sorted(db.load_listings(live_only=True)['id']) == ['boo-sfbay', 'old']
+
+
+def test_max_age_answers_fresh_shards_from_the_db(tmp_path, capsys):
+    args = ['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay', 'seattle']
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', fake_postings):
+        assert main(args) == 0
+
+    # boo was just swept in both cities; bia never has been.
+    fetched = []
+
+    def record(search):
+        fetched.append((search.CATEGORY, search.CITIES[0]))
+        return fake_postings(search)
+
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', record):
+        capsys.readouterr()
+        assert main(args + ['--max-age', '1h', '--search_category', 'boo', 'bia']) == 0
+
+    assert sorted(fetched) == [('bia', 'seattle'), ('bia', 'sfbay')]
+    out = capsys.readouterr().out
+    assert 'boo: 2 listings from 2 cities' in out
+    assert 'boo: 2 of those cities answered from the database' in out
+
+
+def test_max_age_scrapes_when_filters_differ(tmp_path):
+    args = ['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay']
+    fetched = []
+
+    def record(search):
+        fetched.append(search.FILTERS.get('max_price'))
+        return fake_postings(search)
+
+    with patch.object(Search, 'validate_cities', side_effect=lambda cities, strict=False: cities), \
+         patch.object(Search, 'get_all_daily_postings', record):
+        main(args)
+        main(args + ['--max-age', '1d', '--filters', 'max_price=500'])
+        main(args + ['--max-age', '1d', '--filters', 'max_price=500'])
+
+    assert fetched == [None, 500]
+
+
+def test_parse_age():
+    assert parse_age('15min') == pd.Timedelta(minutes=15)
+    assert parse_age('90') == pd.Timedelta(seconds=90)
+    with pytest.raises(ArgumentTypeError):
+        parse_age('soon')
+
+
+def test_state_and_near_select_cities(tmp_path):
+    fetched = []
+
+    def record(search):
+        fetched.append(search.CITIES[0])
+        return fake_postings(search)
+
+    with patch.object(Search, 'get_all_daily_postings', record):
+        code = main(['--search_category', 'boo', '--data_path', str(tmp_path), '--no-archive',
+                     '--state', 'Oregon', '--near', '47.6,-122.3', '--radius-km', '100'])
+
+    assert code == 0
+    assert sorted(fetched) == sorted([site.slug for site in SITES.in_state('oregon')] + ['seattle', 'skagit'])
+
+
+def test_unknown_state_exits_cleanly(tmp_path, capsys):
+    code = main(['--search_category', 'boo', '--data_path', str(tmp_path), '--state', 'Narnia'])
+    assert code == 2
+    assert 'Unknown state' in capsys.readouterr().err
+
+
+def priced_boats(count, prefix=''):
+    return pd.DataFrame([
+        {'id': f'{prefix}{i}', 'name': f'{1970 + i} Boat', 'price': f'${1000 + 150 * i}', 'city': 'sfbay',
+         'has_image': True, 'year manufactured': 1970 + i}
+        for i in range(count)
+    ])
+
+
+def test_search_refits_stale_deal_models(tmp_path, capsys):
+    argv = ['--search_category', 'boo', '--data_path', str(tmp_path), '--cities', 'sfbay']
+    with patch.object(Search, 'validate_cities', return_value=['sfbay']), \
+         patch.object(Boats, 'get_all_daily_postings',
+                      return_value=(pd.Timedelta(seconds=1), priced_boats(40))):
+        main(argv)
+        assert 'boo: deal model refit on 40 listings.' in capsys.readouterr().out
+
+        main(argv)  # fit moments ago
+        assert 'deal model refit' not in capsys.readouterr().out
+
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    assert db.load_listings()['deal_score'].notna().all()
+
+
+def test_rescore_subcommand(tmp_path, capsys):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(priced_boats(40), category='boo')
+    db.save_listings(priced_boats(3, prefix='bike-'), category='bia')
+    with db.connect() as conn:
+        conn.execute("DELETE FROM listing_features WHERE category = 'bia'")
+
+    code = main(['rescore', '--db', str(db.db_path)])
+
+    assert code == 0
+    out = capsys.readouterr().out
+    assert 'bia: comparable features written for 3 listings' in out
+    assert 'boo: deal model fit on 40 listings' in out
+    assert 'bia: too few priced listings' in out
+    assert db.deal_model_fitted('boo') is not None
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import craigsail.comparables as comparables
+from craigsail.comparables import ComparablesIndex
+from craigsail.db import CraigsailDB
+from craigsail.search import Boats
+
+
+def boat(listing_id, year, loa, make='catalina', price=10_000, geotag=(37.8, -122.4), hours=None):
+    return {
+        'id': listing_id, 'name': f'{year} {make} {loa}', 'url': f'http://x/{listing_id}',
+        'city': 'sfbay', 'price': price, 'geotag': geotag, 'has_image': True,
+        'year manufactured': year, 'length overall (LOA)': loa, 'engine hours (total)': hours,
+        'make / manufacturer': make, 'propulsion type': 'sail',
+    }
+
+
+@pytest.fixture(params=['kdtree', 'numpy'])
+def db(request, tmp_path, monkeypatch):
+    if request.param == 'numpy':
+        monkeypatch.setattr(comparables, 'spatial', False)
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(pd.DataFrame([
+        boat('1', 1980, 27.0, price=12_000),
+        boat('2', 1981, 27.0, price=11_000),
+        boat('3', 1979, 28.0, price=13_000),
+        boat('4', 2015, 45.0, make='beneteau', price=250_000),
+        boat('5', 1980, 27.0, price=9_000, geotag=(47.6, -122.3)),   # seattle
+        boat('6', 1980, 27.0, make='hunter', price=10_000),
+    ]), category='boo')
+    return db
+
+
+def test_nearest_listings_come_first_with_prices(db):
+    found = db.comparables('1', k=3)
+
+    assert found['id'].tolist() == ['2', '3', '6']
+    assert found['price'].tolist() == [11_000.0, 13_000.0, 10_000.0]
+    assert found['distance'].is_monotonic_increasing
+    assert found.loc[0, 'year manufactured'] == 1981
+    assert found.loc[0, 'make / manufacturer'] == 'catalina'
+
+
+def test_distance_and_labels_count_against_a_match(db):
+    ids = db.comparables('1', k=5)['id'].tolist()
+
+    # The same boat 1,000km away, or by another make, ranks behind close
+    # neighbours; a 45ft boat ranks last.
+    assert ids.index('5') > ids.index('3')
+    assert ids.index('6') > ids.index('2')
+    assert ids[-1] == '4'
+
+
+def test_unknown_listing_raises_key_error(db):
+    with pytest.raises(KeyError):
+        db.comparables('nope')
+
+
+def test_index_loads_only_what_an_ingest_changed(db):
+    db.comparables('1')
+    index = db.comparables_indexes['boo']
+    seq = index.seq
+
+    db.save_listings(pd.DataFrame([boat('7', 1980, 27.0, price=12_500)]), category='boo')
+    db.save_listings(pd.DataFrame([boat('2', 1981, 27.0, price=10_500)]), category='boo')
+
+    found = db.comparables('1', k=2)
+    assert db.comparables_indexes['boo'] is index
+    assert len(index) == 7
+    assert index.seq == seq + 2
+    assert found['id'].tolist() == ['7', '2']
+    assert found['price'].tolist() == [12_500.0, 10_500.0]
+
+
+def test_saves_write_features_and_refresh_backfills_the_rest(db):
+    assert db.refresh_features('boo') == 0
+
+    # A database written before listing_features existed.
+    with db.connect() as conn:
+        conn.execute("DELETE FROM listing_features WHERE listing_id IN ('1', '2')")
+    assert db.refresh_features('boo') == 2
+    assert db.refresh_features('boo') == 0
+
+
+def test_index_only_reads_and_picks_up_a_backfill(db):
+    with db.connect() as conn:
+        conn.execute("DELETE FROM listing_features WHERE listing_id IN ('2', '3')")
+
+    assert db.comparables('1', k=5)['id'].tolist() == ['6', '5', '4']
+    with db.connect() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM listing_features').fetchone()[0] == 4
+
+    db.refresh_features('boo')
+    assert db.comparables('1', k=2)['id'].tolist() == ['2', '3']
+
+
+def test_missing_features_sit_at_the_mean():
+    index = ComparablesIndex(Boats)
+    vector = lambda *values: np.array(values, dtype=float).tobytes()
+    index.update([
+        (1, 'a', vector(1980, 27, np.nan), '[null, null]', None, None),
+        (2, 'b', vector(1980, 27, 100), '[null, null]', None, None),
+        (3, 'c', vector(1980, 27, 900), '[null, null]', None, None),
+    ])
+
+    assert index.features_of('a')['engine hours (total)'] is None
+    assert [match for match, _ in index.query('a', k=2)] == ['b', 'c']
+    assert np.isfinite(index.points).all()
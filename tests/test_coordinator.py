@@ -0,0 +1,123 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from craigsail.cli import Shard
+from craigsail.coordinator import Worker, WorkQueue
+from craigsail.db import CraigsailDB
+
+
+def postings(ids, city='sfbay', price='$10'):
+    return pd.DataFrame([
+        {'id': str(i), 'name': f'Boat {i}', 'price': price, 'city': city, 'has_image': True} for i in ids
+    ])
+
+
+@pytest.fixture
+def db(tmp_path):
+    return CraigsailDB(str(tmp_path / 'craigsail.db'))
+
+
+@pytest.fixture
+def queue(db):
+    return WorkQueue(db, lease_seconds=60)
+
+
+def shards(*cities, category='boo'):
+    return [Shard(category, city, {'has_image': True}) for city in cities]
+
+
+def states(db):
+    with db.connect() as conn:
+        return {row['city']: row['state'] for row in conn.execute('SELECT city, state FROM work_items')}
+
+
+def test_plan_queues_one_item_per_shard(queue):
+    sweep = queue.plan(shards('sfbay', 'seattle'))
+    queue.plan(shards('sfbay'), sweep=sweep)
+
+    assert queue.progress(sweep) == {'pending': 2}
+    item = queue.claim('a')
+    assert (item.sweep, item.category, item.city, item.filters, item.attempts) == \
+        (sweep, 'boo', 'sfbay', {'has_image': True}, 1)
+
+
+def test_concurrent_claims_never_share_an_item(db):
+    sweep = WorkQueue(db).plan(shards(*(f'city{i}' for i in range(40))))
+    claimed = []
+
+    def claim_all(name):
+        queue = WorkQueue(db)
+        while (item := queue.claim(name)) is not None:
+            claimed.append(item.city)
+
+    threads = [threading.Thread(target=claim_all, args=(f'w{i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(f'city{i}' for i in range(40))
+    assert WorkQueue(db).progress(sweep) == {'leased': 40}
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_post_is_refused(db, queue):
+    queue.plan(shards('sfbay'))
+    stale = queue.claim('a', now=0)
+
+    assert queue.claim('b', now=30) is None                   # still leased to a
+    fresh = queue.claim('b', now=61)
+    assert (fresh.id, fresh.attempts) == (stale.id, 2)
+
+    assert queue.renew([stale], 'a') == [stale.id]
+    assert not queue.post(stale, 'a', db.to_records(postings(range(3)), 'boo'))
+    assert queue.post(fresh, 'b', db.to_records(postings(range(2)), 'boo'))
+
+    queue.write_fetched()
+    assert sorted(db.load_listings()['id']) == ['0', '1']
+
+
+def test_items_fail_once_their_attempts_are_used(db, queue):
+    sweep = queue.plan(shards('sfbay', 'seattle'), max_attempts=2)
+    queue.release(queue.claim('a'), 'a', 'HTTP 503')
+    queue.release(queue.claim('a'), 'a', 'HTTP 503')          # sfbay again: out of attempts
+    queue.claim('a', now=0)                                   # seattle, then the worker dies
+    queue.claim('b', now=61)
+
+    assert queue.expire(now=200) == 1
+    assert queue.claim('c', now=300) is None
+    assert queue.failures(sweep) == [('boo', 'sfbay', 'HTTP 503'), ('boo', 'seattle', 'lease expired')]
+
+
+def test_write_fetched_saves_delists_and_clears_results(db, queue):
+    db.save_listings(postings(range(4)), category='boo')
+    sweep = queue.plan(shards('sfbay'))
+    item = queue.claim('a')
+    queue.post(item, 'a', db.to_records(postings(range(3), price='$20'), 'boo'), batch_rows=2)
+
+    [(written, saved, delisted)] = queue.write_fetched()
+
+    assert written.id == item.id
+    assert (saved.changed, saved.price_changes, delisted) == (3, 3, 1)
+    assert queue.progress(sweep) == {'done': 1}
+    assert db.last_swept('boo', 'sfbay', {'has_image': True}) is not None
+    with db.connect() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM work_results').fetchone()[0] == 0
+    listings = db.load_listings().set_index('id')
+    assert listings.loc['3', 'delisted_at'] is not None
+    assert (listings.loc[['0', '1', '2'], 'price'] == 20).all()
+
+
+def test_worker_posts_and_releases_until_idle(db, queue):
+    queue.plan(shards('sfbay', 'seattle', 'boise'))
+
+    def fetch(item):
+        if item.city == 'boise':
+            raise RuntimeError('HTTP 503')
+        return db.to_records(postings(range(2), city=item.city), item.category)
+
+    counts = Worker(queue, fetch, name='a', slots=2, poll_seconds=0.01, idle_seconds=0.1, log_stream=None).run()
+
+    assert counts == {'posted': 2, 'rows': 4, 'failed': 3, 'lost': 0}
+    assert states(db) == {'sfbay': 'fetched', 'seattle': 'fetched', 'boise': 'failed'}
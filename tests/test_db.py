@@ -1,7 +1,13 @@
+import gzip
+import json
+import sqlite3
+
 import pandas as pd
 import pytest
 
-from craigsail.db import CraigsailDB, _parse_geotag
+import craigsail.db as craigsail_db
+from craigsail.db import CraigsailDB, _parse_geotag, filter_predicates, filters_hash
+from craigsail.instrument import RunMetrics
 
 
 @pytest.fixture
@@ -68,10 +74,92 @@ def test_price_change_is_recorded(db):
 
 def test_non_core_columns_land_in_attributes(db):
     db.save_listings(listing(), category='boo')
-    attrs = db.load_listings()['attributes'].iloc[0]
+    attrs = db.load_listings(with_blobs=True)['attributes'].iloc[0]
     assert 'length overall (LOA)' in attrs
 
 
+def test_blobs_are_only_returned_on_request(db):
+    df = listing()
+    df['body'] = 'Well kept sloop, new sails.'
+    db.save_listings(df, category='boo')
+
+    assert 'body' not in db.load_listings().columns
+    assert db.load_listings(with_blobs=True)['body'].iloc[0] == 'Well kept sloop, new sails.'
+
+
+def test_identical_bodies_share_one_blob(db):
+    first, second = listing(listing_id='1'), listing(listing_id='2')
+    first['body'] = second['body'] = 'Same repost text.'
+    db.save_listings(first, category='boo')
+    db.save_listings(second, category='boo')
+
+    with db.connect() as conn:
+        hashes = [row[0] for row in conn.execute('SELECT body_hash FROM listings')]
+        blob_count = conn.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+
+    assert hashes[0] == hashes[1]
+    assert blob_count == 2  # one body and one attributes blob, shared by both rows
+
+
+def test_unchanged_body_is_not_recompressed(db, monkeypatch):
+    df = listing()
+    df['body'] = 'Unchanged.'
+    db.save_listings(df, category='boo')
+
+    def fail(text):
+        raise AssertionError('unchanged content should not be compressed again')
+
+    monkeypatch.setattr(craigsail_db, '_compress', fail)
+    db.save_listings(df, category='boo')
+
+
+def test_prune_blobs_removes_replaced_bodies(db):
+    df = listing()
+    df['body'] = 'Original text.'
+    db.save_listings(df, category='boo')
+    df['body'] = 'Edited text.'
+    db.save_listings(df, category='boo')
+
+    assert db.prune_blobs() == 1
+    assert db.load_listings(with_blobs=True)['body'].iloc[0] == 'Edited text.'
+
+
+def test_zlib_is_used_without_zstandard(db, monkeypatch):
+    monkeypatch.setattr(craigsail_db, 'zstd', False)
+    df = listing()
+    df['body'] = 'Compressed with zlib.'
+    db.save_listings(df, category='boo')
+
+    with db.connect() as conn:
+        codecs = {row[0] for row in conn.execute('SELECT codec FROM blobs')}
+    assert codecs == {'zlib'}
+    assert db.load_listings(with_blobs=True)['body'].iloc[0] == 'Compressed with zlib.'
+
+
+def test_legacy_inline_text_is_migrated(tmp_path):
+    path = tmp_path / 'legacy.db'
+    conn = sqlite3.connect(str(path))
+    conn.executescript('''
+        CREATE TABLE listings (
+            id TEXT PRIMARY KEY, name TEXT, url TEXT, city TEXT, category TEXT,
+            price REAL, where_ TEXT, geotag TEXT, latitude REAL, longitude REAL,
+            has_image INTEGER, datetime TEXT, last_updated TEXT, created TEXT,
+            repost_of TEXT, body TEXT, attributes TEXT,
+            first_seen TEXT NOT NULL, last_seen TEXT NOT NULL
+        );
+        INSERT INTO listings (id, name, price, body, attributes, first_seen, last_seen)
+        VALUES ('1', 'Old boat', 500, 'legacy body', '{"condition": "fair"}', '2025-01-01', '2025-01-01');
+    ''')
+    conn.commit()
+    conn.close()
+
+    saved = CraigsailDB(str(path)).load_listings(with_blobs=True)
+
+    assert saved['body'].iloc[0] == 'legacy body'
+    assert saved['attributes'].iloc[0] == '{"condition": "fair"}'
+    assert 'body_hash' in saved.columns
+
+
 def test_listing_without_id_is_skipped(db):
     df = pd.DataFrame([{'id': None, 'name': 'no id', 'price': '$5'}])
     inserted, updated, changes = db.save_listings(df, category='boo')
@@ -109,3 +197,392 @@ def test_parse_geotag(raw, expected):
 def test_unparseable_price_becomes_null(db):
     db.save_listings(listing(price='please call'), category='boo')
     assert pd.isna(db.load_listings()['price'].iloc[0])
+
+
+def test_unchanged_listing_is_only_touched(db):
+    db.save_listings(listing(), category='boo')
+    first_seen_before = db.load_listings()['last_seen'].iloc[0]
+
+    result = db.save_listings(listing(), category='boo')
+
+    assert (result.changed, result.touched) == (0, 1)
+    assert db.load_listings()['last_seen'].iloc[0] >= first_seen_before
+
+
+def test_edited_listing_is_rewritten(db):
+    db.save_listings(listing(name='Catalina 30'), category='boo')
+    result = db.save_listings(listing(name='Catalina 30 - reduced'), category='boo')
+
+    assert (result.inserted, result.changed, result.touched) == (0, 1, 0)
+    assert db.load_listings()['name'].iloc[0] == 'Catalina 30 - reduced'
+
+
+def test_save_result_unpacks_and_adds(db):
+    first = db.save_listings(listing(listing_id='1'), category='boo')
+    second = db.save_listings(listing(listing_id='1'), category='boo')
+
+    inserted, updated, changes = first + second
+    assert (inserted, updated, changes) == (1, 1, 1)
+
+
+def test_duplicate_id_within_one_frame(db):
+    df = pd.concat([listing(price='$1,000'), listing(price='$900')], ignore_index=True)
+    result = db.save_listings(df, category='boo')
+
+    assert (result.inserted, result.changed, result.price_changes) == (1, 1, 2)
+    assert len(db.load_listings()) == 1
+
+
+NOW = pd.Timestamp('2026-08-15T12:00:00+00:00')
+
+
+def seed_history(db, listing_id, observations, delisted_at=None):
+    """
+    Insert a listing plus explicit (days_ago, price) price_history rows.
+    """
+    db.save_listings(listing(listing_id=listing_id, price=observations[-1][1]), category='boo')
+    with db.connect() as conn:
+        conn.execute('DELETE FROM price_history WHERE listing_id = ?', (listing_id,))
+        conn.execute('UPDATE listings SET delisted_at = ? WHERE id = ?', (delisted_at, listing_id))
+        conn.executemany(
+            'INSERT INTO price_history (listing_id, price, observed) VALUES (?, ?, ?)',
+            [(listing_id, price, (NOW - pd.Timedelta(days_ago)).isoformat())
+             for days_ago, price in observations],
+        )
+
+
+def rows_stored(db):
+    with db.connect() as conn:
+        return conn.execute(
+            'SELECT (SELECT COUNT(*) FROM price_history) + (SELECT COUNT(*) FROM price_rollups)').fetchone()[0]
+
+
+def test_price_history_returns_every_recorded_observation(db):
+    seed_history(db, '1', [('20 days', 1000), ('10 days', 1000), ('5 days', 900)])
+
+    assert list(db.price_history('1')['price']) == [1000.0, 1000.0, 900.0]
+
+
+def test_compaction_folds_old_intraday_churn_into_a_daily_rollup(db):
+    seed_history(db, '1', [
+        ('200 days 2 hours', 1000), ('200 days 1 hour', 950), ('200 days', 980),
+        ('100 days', 900), ('5 days', 850),
+    ])
+    drops_before = db.price_drops()
+
+    stats = db.compact_price_history(keep_days=90, weekly_after_days=365, now=NOW)
+
+    assert (stats['daily_rollups'], stats['deleted']) == (1, 2)
+    pd.testing.assert_frame_equal(db.price_drops(), drops_before)
+    history = db.price_history('1')
+    assert list(history['price']) == [1000.0, 980.0, 900.0, 850.0]    # the first observation is never folded
+    assert history['observed'].iloc[1] == (NOW - pd.Timedelta(days=200)).strftime('%Y-%m-%d')
+
+    with db.connect() as conn:
+        rollup = conn.execute("SELECT open, low, high, close, observations FROM price_rollups").fetchone()
+    assert tuple(rollup) == (950.0, 950.0, 980.0, 980.0, 2)
+
+
+def test_compaction_leaves_single_observation_days_alone_and_is_idempotent(db):
+    seed_history(db, '1', [('150 days', 1000), ('120 days', 900), ('10 days', 800)])
+    history_before = db.price_history('1')
+
+    first = db.compact_price_history(keep_days=90, now=NOW)
+    second = db.compact_price_history(keep_days=90, now=NOW)
+
+    assert (first['daily_rollups'], first['deleted']) == (0, 0)
+    assert (second['daily_rollups'], second['deleted']) == (0, 0)
+    pd.testing.assert_frame_equal(db.price_history('1'), history_before)
+
+
+def test_compaction_folds_old_days_into_weeks(db):
+    monday = (NOW - pd.Timedelta(days=500)).normalize()
+    monday -= pd.Timedelta(days=monday.weekday())
+    days_ago = (NOW - monday).days
+    seed_history(db, '1', [
+        (f'{days_ago} days', 1000), (f'{days_ago - 1} days', 700),
+        (f'{days_ago - 2} days 1 hour', 800), (f'{days_ago - 2} days', 820),
+        ('10 days', 750),
+    ])
+
+    stats = db.compact_price_history(keep_days=90, weekly_after_days=365, now=NOW)
+
+    assert (stats['daily_rollups'], stats['weekly_rollups'], stats['deleted']) == (1, 1, 3)
+    assert list(db.price_history('1')['price']) == [1000.0, 820.0, 750.0]
+    with db.connect() as conn:
+        periods = [tuple(row) for row in conn.execute(
+            'SELECT period, open, low, high, close, observations FROM price_rollups')]
+    assert periods == [('week', 700.0, 700.0, 820.0, 820.0, 3)]
+
+
+def test_compaction_shrinks_a_change_only_history(db):
+    for listing_id in map(str, range(10)):
+        observations = []
+        for day in range(700, 0, -1):
+            if day % 2:
+                observations.append((f'{day} days 2 hours', 1000 + day))
+            if day % 5 == 0:
+                observations.append((f'{day} days', 900 + day))
+        seed_history(db, listing_id, observations)
+    rows_before = rows_stored(db)
+    drops_before = db.price_drops()
+
+    db.compact_price_history(keep_days=90, weekly_after_days=365, now=NOW)
+
+    assert rows_stored(db) < rows_before * 2 / 3
+    pd.testing.assert_frame_equal(db.price_drops(), drops_before)
+
+
+def test_compaction_archives_and_deletes_delisted_history(db, tmp_path):
+    seed_history(db, 'gone', [('300 days 2 hours', 500), ('300 days 1 hour', 450), ('300 days', 400)],
+                 delisted_at=(NOW - pd.Timedelta(days=250)).isoformat())
+    seed_history(db, 'live', [('300 days 1 hour', 500), ('300 days', 450)])
+    drops_before = db.price_drops()
+
+    stats = db.compact_price_history(keep_days=90, archive_dir=tmp_path / 'archive', now=NOW)
+
+    archive = next((tmp_path / 'archive').glob('price_history_*.jsonl.gz'))
+    with gzip.open(archive, 'rt') as handle:
+        lines = [json.loads(line) for line in handle]
+
+    assert (stats['archived'], stats['deleted']) == (3, 2)
+    assert {line['listing_id'] for line in lines} == {'gone'}
+    assert [line['price'] for line in lines] == [500.0, 450.0, 400.0]
+    assert list(db.price_history('gone')['price']) == [500.0]           # first kept for price_drops
+    assert list(db.price_history('live')['price']) == [500.0, 450.0]
+    pd.testing.assert_frame_equal(db.price_drops(), drops_before)
+
+
+def test_sweep_marks_missing_listings_delisted(db):
+    db.save_listings(pd.concat([listing(listing_id='1'), listing(listing_id='2')]), category='boo')
+
+    delisted = db.mark_delisted('boo', 'sfbay', seen_ids=['1'], when=NOW.isoformat())
+
+    assert delisted == 1
+    live = db.load_listings(live_only=True)
+    assert list(live['id']) == ['1']
+    gone = db.load_listings().set_index('id').loc['2']
+    assert gone['delisted_at'] == NOW.isoformat()
+    assert gone['final_price'] == 1000.0
+    assert gone['days_on_market'] == pytest.approx(0, abs=0.01)
+
+
+def test_sweep_only_delists_its_own_shard(db):
+    db.save_listings(listing(listing_id='1'), category='boo')
+    db.save_listings(listing(listing_id='2'), category='bia')
+
+    assert db.mark_delisted('boo', 'seattle', seen_ids=['x']) == 0
+    assert db.mark_delisted('boo', 'sfbay', seen_ids=['x']) == 1
+    assert db.load_listings(live_only=True)['id'].tolist() == ['2']
+
+
+def test_filtered_sweep_only_delists_what_it_could_have_returned(db):
+    db.save_listings(pd.concat([
+        listing(listing_id='1', price='$1,000'),
+        listing(listing_id='2', price='$8,000'),
+        listing(listing_id='3', price='$2,000'),
+    ]), category='boo')
+
+    assert db.mark_delisted('boo', 'sfbay', seen_ids=['1'], filters={'max_price': 5000}) == 1
+    assert db.mark_delisted('boo', 'sfbay', seen_ids=['1'], filters={'search_distance': 10}) == 0
+    assert sorted(db.load_listings(live_only=True)['id']) == ['1', '2']
+
+
+def test_empty_sweep_delists_nothing(db):
+    db.save_listings(listing(), category='boo')
+    assert db.mark_delisted('boo', 'sfbay', seen_ids=[]) == 0
+    with db.connect() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM sweeps').fetchone()[0] == 1
+
+
+def test_relisted_listing_comes_back_live(db):
+    db.save_listings(listing(), category='boo')
+    db.mark_delisted('boo', 'sfbay', seen_ids=['other'])
+    db.save_listings(listing(), category='boo')
+
+    saved = db.load_listings(live_only=True)
+    assert len(saved) == 1
+    assert pd.isna(saved['days_on_market'].iloc[0])
+
+
+def test_sold_within(db):
+    db.save_listings(listing(listing_id='1'), category='boo')
+    with db.connect() as conn:
+        conn.execute("UPDATE listings SET first_seen = '2026-08-01T00:00:00+00:00', "
+                     "last_seen = '2026-08-11T00:00:00+00:00' WHERE id = '1'")
+    db.mark_delisted('boo', 'sfbay', seen_ids=['other'])
+
+    assert db.sold_within(7).empty
+    sold = db.sold_within(14, category='boo')
+    assert sold['days_on_market'].iloc[0] == pytest.approx(10)
+    assert sold['final_price'].iloc[0] == 1000.0
+
+
+def test_metrics_count_statements_and_stages(tmp_path):
+    metrics = RunMetrics()
+    db = CraigsailDB(str(tmp_path / 'metrics.db'), metrics=metrics)
+    db.save_listings(listing(), category='boo')
+
+    stages = {record['stage']: record for record in metrics.stages}
+    assert stages['to_records']['rows'] == 1
+    assert stages['save']['statements'] > 0
+    assert metrics.counters['db_commit_seconds'] > 0
+
+
+def test_record_run_stores_stage_rows(db):
+    metrics = RunMetrics()
+    with metrics.stage('fetch', city='sfbay') as stage:
+        stage['rows'] = 7
+
+    run_id = db.record_run(metrics, category='boo', listings=7)
+
+    with db.connect() as conn:
+        run = conn.execute('SELECT category, listings, metrics FROM runs WHERE id = ?', (run_id,)).fetchone()
+        stage = conn.execute('SELECT stage, city, rows FROM run_stages WHERE run_id = ?', (run_id,)).fetchone()
+    assert (run['category'], run['listings']) == ('boo', 7)
+    assert json.loads(run['metrics'])['stages']['fetch']['rows'] == 7
+    assert tuple(stage) == ('fetch', 'sfbay', 7)
+
+
+def test_data_version_moves_only_on_visible_changes(db):
+    assert db.data_version() == 0
+    assert db.last_ingest() is None
+
+    db.save_listings(listing(), category='boo')
+    after_insert = db.data_version()
+    db.save_listings(listing(), category='boo')  # unchanged - only touched
+
+    assert after_insert == 1
+    assert db.data_version() == 1
+    assert db.last_ingest() is not None
+
+    db.mark_delisted('boo', 'sfbay', seen_ids=['other'])
+    assert db.data_version() == 2
+
+
+def test_change_feed_records_map_visible_changes(db):
+    db.save_listings(listing(listing_id='1'), category='boo')
+    db.save_listings(listing(listing_id='1'), category='boo')  # unchanged - no event
+    db.save_listings(listing(listing_id='1', price='$900'), category='boo')
+    db.save_listings(listing(listing_id='2', name='Renamed'), category='boo')
+    db.mark_delisted('boo', 'sfbay', seen_ids=['2'])
+    db.save_listings(listing(listing_id='1', price='$900'), category='boo')  # relisted
+
+    changes = db.changes_since(0)
+    assert [(change['id'], change['kind']) for change in changes] == [
+        ('1', 'insert'), ('1', 'price'), ('2', 'insert'), ('1', 'delist'), ('1', 'insert'),
+    ]
+    assert changes[1]['price'] == 900.0
+    assert db.latest_change() == changes[-1]['seq']
+    assert db.changes_since(changes[2]['seq']) == changes[3:]
+
+
+def test_change_feed_filters_and_skips_unmappable_listings(db):
+    db.save_listings(listing(listing_id='1'), category='boo')
+    db.save_listings(listing(listing_id='2', geotag=None), category='boo')
+    db.save_listings(listing(listing_id='3'), category='bia')
+
+    assert [change['id'] for change in db.changes_since(0)] == ['1', '3']
+    assert [change['id'] for change in db.changes_since(0, category='bia')] == ['3']
+    assert db.changes_since(0, city='seattle') == []
+
+
+def test_prune_changes(db):
+    db.save_listings(listing(), category='boo')
+
+    assert db.prune_changes(keep_days=7) == 0
+    assert db.prune_changes(keep_days=7, now=pd.Timestamp.now('UTC') + pd.Timedelta(days=8)) == 1
+    assert db.changes_since(0) == []
+
+
+def test_last_swept_is_keyed_on_filters(db):
+    db.save_listings(listing(), category='boo')
+    db.mark_delisted('boo', 'sfbay', seen_ids=['7612345678'], when=NOW.isoformat(),
+                     filters={'max_price': 5000, 'has_image': True})
+
+    assert db.last_swept('boo', 'sfbay', {'has_image': True, 'max_price': 5000}) == NOW
+    assert db.last_swept('boo', 'sfbay', {'has_image': True}) is None
+    assert db.last_swept('boo', 'seattle', {'has_image': True, 'max_price': 5000}) is None
+    assert filters_hash({'a': 1, 'b': 2}) == filters_hash({'b': 2, 'a': 1})
+
+
+def test_empty_sweep_is_not_fresh(db):
+    db.mark_delisted('boo', 'sfbay', seen_ids=[])
+    assert db.last_swept('boo', 'sfbay') is None
+
+
+def test_cached_listings_apply_filters_as_sql(db):
+    db.save_listings(pd.concat([
+        listing(listing_id='1', price='$1,000', name='Catalina 30'),
+        listing(listing_id='2', price='$9,000', name='Catalina 36'),
+        listing(listing_id='3', price='$500', name='Hunter 26'),
+    ]).assign(body=['', '', 'a tidy catalina trailer']), category='boo')
+
+    def ids(**filters):
+        return sorted(db.cached_listings('boo', 'sfbay', filters)['id'])
+
+    assert ids(max_price=5000) == ['1', '3']
+    assert ids(min_price=800, has_image=True) == ['1', '2']
+    assert ids(query='catalina', search_titles=True) == ['1', '2']
+    assert ids(query='CATALINA trailer', search_titles=False) == ['3']
+    assert ids(query='catalina', search_titles=False, max_price=5000) == ['1', '3']
+
+
+def test_unanswerable_filters_are_rejected():
+    with pytest.raises(ValueError, match='search_distance'):
+        filter_predicates({'search_distance': 10, 'max_price': 1})
+
+
+def test_sweeps_table_gains_filter_hash(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        'CREATE TABLE sweeps (id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT NOT NULL, '
+        'city TEXT NOT NULL, finished TEXT NOT NULL, seen INTEGER NOT NULL, delisted INTEGER NOT NULL)'
+    )
+    conn.commit()
+    conn.close()
+
+    db = CraigsailDB(str(path))
+    db.mark_delisted('boo', 'sfbay', seen_ids=['1'], filters={'max_price': 1})
+    assert db.last_swept('boo', 'sfbay', {'max_price': 1}) is not None
+
+
+def with_attrs(listing_id, attrs, **fields):
+    return listing(listing_id, **fields).assign(attrs=[attrs])
+
+
+def test_attributes_are_stored_long_and_pivoted_on_demand(db):
+    db.save_listings(pd.concat([
+        with_attrs('1', ['año de fabricación: 1980', 'condition: good']),
+        with_attrs('2', ['marca / fabricante: Hunter']),
+        with_attrs('3', None),
+    ]), category='boo')
+
+    wide = db.attributes(['year manufactured', 'make / manufacturer'])
+    assert wide.fillna('').to_dict('index') == {
+        '1': {'year manufactured': '1980', 'make / manufacturer': ''},
+        '2': {'year manufactured': '', 'make / manufacturer': 'Hunter'},
+    }
+    assert db.attributes(['condition'], ids=['2', '3']).empty
+
+    listings = db.load_listings(attributes=['condition']).set_index('id')
+    assert listings['condition'].fillna('').to_dict() == {'1': 'good', '2': '', '3': ''}
+
+
+def test_rewritten_listing_replaces_its_attributes(db):
+    db.save_listings(with_attrs('1', ['condition: good', 'propulsion type: sail']), category='boo')
+    db.save_listings(with_attrs('1', ['condition: fair'], price='$900'), category='boo')
+
+    with db.connect() as conn:
+        rows = conn.execute('SELECT key, value FROM listing_attributes').fetchall()
+    assert [tuple(row) for row in rows] == [('condition', 'fair')]
+
+
+def test_refresh_attributes_backfills_older_listings(db):
+    db.save_listings(pd.concat([with_attrs('1', ['condition: good']), with_attrs('2', None)]), category='boo')
+    with db.connect() as conn:
+        conn.execute('DELETE FROM listing_attributes')
+
+    assert db.refresh_attributes('boo') == 1
+    assert db.attributes(['condition'])['condition'].to_dict() == {'1': 'good'}
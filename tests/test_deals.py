@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from craigsail.db import CraigsailDB
+from craigsail.deals import MIN_FIT_ROWS, DealModel, huber_irls
+
+FEATURES = ['year manufactured', 'length overall (LOA)', 'engine hours (total)']
+
+
+def synthetic(n=300, seed=0, outliers=0):
+    rng = np.random.default_rng(seed)
+    years = rng.integers(1970, 2020, n).astype(float)
+    loa = rng.uniform(16, 50, n)
+    hours = np.where(rng.random(n) < 0.5, np.nan, rng.uniform(0, 3000, n))
+    cities = rng.choice(['sfbay', 'seattle'], n)
+    log_price = 8 + 0.04 * (years - 1995) + 0.06 * (loa - 30) + np.where(cities == 'seattle', -0.2, 0)
+    prices = np.exp(log_price + rng.normal(0, 0.1, n))
+    prices[:outliers] *= 20  # typos: $12,0000
+    return np.column_stack([years, loa, hours]), prices, cities
+
+
+def test_huber_shrugs_off_outliers():
+    rng = np.random.default_rng(1)
+    X = np.column_stack([np.ones(200), rng.normal(size=200)])
+    y = 1.0 + 2.0 * X[:, 1] + rng.normal(0, 0.1, 200)
+    y[:10] += 50
+
+    coefficients, scale = huber_irls(X, y)
+
+    assert coefficients == pytest.approx([1.0, 2.0], abs=0.05)
+    assert scale == pytest.approx(0.1, abs=0.03)
+
+
+def test_fit_recovers_the_price_model():
+    vectors, prices, cities = synthetic(outliers=10)
+    model = DealModel.fit(FEATURES, vectors, prices, cities)
+
+    # The commoner city is the baseline; the other gets a level.
+    assert len(model.cities) == 1
+    assert model.scale == pytest.approx(0.1, abs=0.03)
+    expected = np.log(prices[10:])
+    assert model.predict(vectors[10:], cities[10:]) == pytest.approx(expected, abs=0.4)
+
+    scores = model.score(vectors, prices, cities)
+    # The inflated typos look like terrible deals; the rest sit near zero.
+    assert (scores[:10] < -10).all()
+    assert np.abs(np.median(scores[10:])) < 0.2
+
+
+def test_cheap_listing_scores_high_and_unpriced_scores_nan():
+    vectors, prices, cities = synthetic()
+    model = DealModel.fit(FEATURES, vectors, prices, cities)
+
+    row = vectors[:1]
+    fair = np.exp(model.predict(row, ['sfbay'])[0])
+    scores = model.score(np.vstack([row, row, row]), [fair / 2, fair, None], ['sfbay'] * 3)
+
+    assert scores[0] > 5
+    assert scores[1] == pytest.approx(0, abs=1e-9)
+    assert np.isnan(scores[2])
+
+
+def test_too_few_priced_rows_are_not_fit():
+    vectors, prices, cities = synthetic(n=MIN_FIT_ROWS - 1)
+    assert DealModel.fit(FEATURES, vectors, prices, cities) is None
+
+
+def test_model_round_trips_through_json():
+    vectors, prices, cities = synthetic()
+    model = DealModel.fit(FEATURES, vectors, prices, cities)
+    restored = DealModel.from_json(model.to_json())
+
+    np.testing.assert_allclose(restored.score(vectors, prices, cities), model.score(vectors, prices, cities))
+
+
+def boats(vectors, prices, cities):
+    return pd.DataFrame([
+        {'id': str(i), 'name': 'Boat', 'url': f'http://x/{i}', 'city': city,
+         'price': price, 'geotag': (37.8, -122.4), 'year manufactured': int(year),
+         'length overall (LOA)': loa, 'engine hours (total)': None if np.isnan(hours) else hours}
+        for i, ((year, loa, hours), price, city) in enumerate(zip(vectors, prices, cities))
+    ])
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(boats(*synthetic()), category='boo')
+    return db
+
+
+def test_fit_deal_model_scores_every_listing(db):
+    assert db.deal_model_fitted('boo') is None
+    assert db.load_listings()['deal_score'].isna().all()
+
+    model = db.fit_deal_model('boo', now='2026-10-01T00:00:00+00:00')
+
+    assert model.rows == 300
+    assert db.deal_model_fitted('boo') == pd.Timestamp('2026-10-01T00:00:00+00:00')
+    assert db.load_listings()['deal_score'].notna().all()
+
+
+def test_saves_score_only_the_rows_they_change(db):
+    db.fit_deal_model('boo')
+    before = db.load_listings().set_index('id')['deal_score']
+    with db.connect() as conn:
+        conn.execute("UPDATE listings SET deal_score = 99 WHERE id = '0'")
+
+    unchanged = boats(*synthetic())
+    repriced = unchanged.iloc[[1]].assign(price=unchanged.loc[1, 'price'] / 3)
+    db.save_listings(pd.concat([unchanged.iloc[[0]], repriced]), category='boo')
+
+    scores = db.load_listings().set_index('id')['deal_score']
+    assert scores['0'] == 99                                  # touched, not rewritten
+    assert scores['1'] > before['1'] + 5                      # rescored at a third of the price
+
+
+def test_top_deals_come_off_the_index_best_first(db):
+    db.fit_deal_model('boo')
+    top = db.load_listings(category='boo', top_deals=5)
+
+    assert len(top) == 5
+    assert top['deal_score'].is_monotonic_decreasing
+    assert top['deal_score'].iloc[0] == db.load_listings()['deal_score'].max()
+
+    with db.connect() as conn:
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM listings WHERE category = ? AND delisted_at IS NULL '
+            'AND deal_score IS NOT NULL ORDER BY deal_score DESC LIMIT 5', ('boo',),
+        ).fetchall()
+    assert 'idx_listings_deal' in plan[0]['detail']
+
+
+def test_price_drops_by_deal(db):
+    db.fit_deal_model('boo')
+    cheaper = boats(*synthetic())
+    cheaper['price'] = cheaper['price'] * np.linspace(0.5, 0.9, len(cheaper))
+    db.save_listings(cheaper.iloc[:20], category='boo')
+
+    drops = db.price_drops(order_by='deal')
+    assert len(drops) == 20
+    assert drops['deal_score'].is_monotonic_decreasing
+    with pytest.raises(AssertionError):
+        db.price_drops(order_by='price')
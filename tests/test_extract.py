@@ -0,0 +1,106 @@
+import re
+
+import pandas as pd
+import pytest
+
+from craigsail.extract import MakeDictionary, extract_fields, extract_from, trie_pattern
+from craigsail.search import Boats
+
+BOAT_EXTRACTS = {
+    'make / manufacturer': 'make',
+    'model name / number': 'model',
+    'year manufactured': 'year',
+    'length overall (LOA)': 'length',
+    'engine hours (total)': 'hours',
+}
+
+
+def test_trie_pattern_matches_exactly_its_words():
+    words = ['cal', 'catalina', 'cape dory', 'c&c']
+    pattern = trie_pattern(words)
+
+    assert pattern.startswith('c')
+    for word in words:
+        assert re.fullmatch(pattern, word)
+    assert not re.fullmatch(pattern, 'ca')
+    assert re.match(pattern, 'cape dory 25').group() == 'cape dory'
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('1979 Catalina 27 - new sails', {'make': 'Catalina', 'model': '27', 'year': 1979}),
+    ('Beneteau Oceanis 331 34ft', {'make': 'Beneteau', 'model': 'Oceanis 331', 'length': 34}),
+    ('oday 25 fixer', {'make': "O'Day", 'model': '25'}),
+    ('C&C 30 w/ 1,200 hours', {'make': 'C&C', 'model': '30', 'hours': 1200}),
+    ("Boston Whaler 13'", {'make': 'Boston Whaler', 'length': 13}),
+    ('Sea Ray 240 Sundancer 2004 350 hrs', {'make': 'Sea Ray', 'model': '240', 'year': 2004, 'hours': 350}),
+    ("O'Day 22 sailboat 2000 hours", {'make': "O'Day", 'model': '22', 'hours': 2000}),
+    ('Hunter 2000', {'make': 'Hunter', 'model': '2000'}),
+    ('1988 Hunter 2000', {'make': 'Hunter', 'model': '2000', 'year': 1988}),
+])
+def test_titles(name, expected):
+    found = extract_from(pd.Series([name]), 'boo', set(BOAT_EXTRACTS.values()))
+    values = {kind: series.iloc[0] for kind, series in found.items() if pd.notna(series.iloc[0])}
+    assert values == expected
+
+
+def test_bodies_need_a_label_for_a_year_and_out_of_range_numbers_are_dropped():
+    found = extract_from(pd.Series([
+        'Built 1985. New sails 2019. LOA: 30.5, 2,100 hours on the diesel',
+        'Sails replaced in 2019, 900 ft of chain, 400000 hrs',
+    ]), 'boo', {'year', 'length', 'hours'}, source='body')
+
+    assert found['year'].tolist()[0] == 1985 and pd.isna(found['year'].iloc[1])
+    assert found['length'].iloc[0] == 30.5 and pd.isna(found['length'].iloc[1])
+    assert found['hours'].iloc[0] == 2100 and pd.isna(found['hours'].iloc[1])
+
+
+def test_fill_only_what_the_attrs_left_out():
+    df = pd.DataFrame({
+        'name': ['1979 Catalina 27', '1979 Catalina 27', 'Sailboat'],
+        'body': ['', '', 'A 1982 Hunter 25, year 1982, 400 hours'],
+        'make / manufacturer': ['catalina yachts', None, None],
+        'year manufactured': [1980, None, None],
+    })
+    filled = extract_fields(df, 'boo', BOAT_EXTRACTS)
+
+    assert filled['make / manufacturer'].tolist() == ['catalina yachts', 'Catalina', 'Hunter']
+    assert filled['year manufactured'].tolist() == [1980, 1979, 1982]
+    assert filled['model name / number'].tolist() == ['27', '27', '25']
+    assert filled['engine hours (total)'].iloc[2] == 400
+
+
+def test_a_model_number_that_looks_like_a_year_leaves_the_year_to_the_body():
+    df = pd.DataFrame({'name': ['Hunter 2000'], 'body': ['Built 1988, new bottom paint.']})
+    filled = extract_fields(df, 'boo', BOAT_EXTRACTS)
+
+    assert filled['model name / number'].iloc[0] == '2000'
+    assert filled['year manufactured'].iloc[0] == 1988
+
+
+def test_unknown_category_fills_numbers_only():
+    filled = extract_fields(pd.DataFrame({'name': ['2010 Gizmo 5']}), 'zzz', {'make': 'make', 'year': 'year'})
+    assert pd.isna(filled['make'].iloc[0])
+    assert filled['year'].iloc[0] == 2010
+
+
+def test_make_dictionary_from_csv(tmp_path):
+    path = tmp_path / 'makes.csv'
+    path.write_text("category,make,aliases\nboo,O'Day,o'day|oday\n", encoding='utf-8')
+    makes = MakeDictionary.load(path)
+
+    assert makes.aliases('boo') == {"o'day": "O'Day", 'oday': "O'Day"}
+    assert makes.aliases('rva') == {}
+
+
+def test_boats_prep_fills_typed_columns_from_the_title():
+    raw = pd.DataFrame([{
+        'id': '1', 'name': '1979 Catalina 27 - 30ft', 'url': 'http://x/1', 'price': '$9,000',
+        'attrs': ['propulsion type: sail'],
+    }])
+    prepped = Boats(search_category='boo', data_path='test_path').prep_results(raw)
+
+    row = prepped.iloc[0]
+    assert row['make / manufacturer'] == 'Catalina'
+    assert row['model name / number'] == '27'
+    assert row['year manufactured'] == 1979
+    assert row['length overall (LOA)'] == 30.0
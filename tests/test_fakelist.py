@@ -0,0 +1,92 @@
+import http.client
+import json
+import re
+
+import pytest
+import requests
+
+import craigsail.search as search_module
+from craigsail.fakelist import FakeCraigslist
+from craigsail.search import Boats
+
+
+def proxied_get(server, url):
+    # What requests sends through an HTTP proxy: the absolute URL.
+    host, port = server.server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        connection.request('GET', url)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read().decode('utf-8')
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    # Import python-craigslist afresh in case an earlier test patched it.
+    monkeypatch.setattr(search_module, 'clfs', None)
+
+    def fetch(server, city='sfbay'):
+        with server.proxied():
+            return Boats(search_category='boo', data_path='test_path').get_city_items(city)
+    return fetch
+
+
+def test_search_pages_are_paged_like_craigslist():
+    with FakeCraigslist(listings=150) as server:
+        assert server.pages == 2
+        status, _, first = proxied_get(server, 'http://sfbay.craigslist.org/search/boo?sort=date')
+        _, _, second = proxied_get(server, 'http://sfbay.craigslist.org/search/boo?s=100')
+
+    assert status == 200
+    assert '<span class="totalcount">150</span>' in first
+    assert first.count('class="result-row"') == 100
+    assert second.count('class="result-row"') == 50
+    assert not set(re.findall(r'data-pid="(\d+)"', first)) & set(re.findall(r'data-pid="(\d+)"', second))
+
+
+def test_unknown_sites_and_postings_are_404():
+    with FakeCraigslist(listings=5) as server:
+        assert proxied_get(server, 'http://nowhere.craigslist.org/search/boo')[0] == 404
+        assert proxied_get(server, 'http://sfbay.craigslist.org/boo/d/1.html')[0] == 404
+        assert 'sfbay.craigslist.org' in proxied_get(server, 'http://www.craigslist.org/about/sites')[2]
+
+
+def test_craigslist_fetch_path_runs_against_it(fetch):
+    with FakeCraigslist(listings=30, seed=1) as server:
+        city_df = fetch(server)
+        again = fetch(server)
+        stats = server.stats()
+
+    assert len(city_df) == 30
+    assert city_df['city'].eq('sfbay').all()
+    assert city_df['id'].is_unique
+    assert city_df['attrs'].map(len).gt(0).all()
+    assert city_df['body'].str.len().gt(0).all()
+    assert city_df['geotag'].notna().any()
+    # Same server settings, same sweep.
+    assert city_df['id'].tolist() == again['id'].tolist()
+    assert stats['statuses'] == {'200': stats['requests']}
+
+
+def test_injected_errors_and_throttling(fetch):
+    with FakeCraigslist(listings=5, error_rate=1.0) as server:
+        with pytest.raises(requests.HTTPError, match='503'):
+            fetch(server)
+
+    with FakeCraigslist(listings=5, throttle_rate=1.0) as server:
+        status, headers, _ = proxied_get(server, 'http://sfbay.craigslist.org/search/boo')
+        assert status == 429
+        assert headers['Retry-After'] == '1'
+
+
+def test_stats_endpoint_reports_request_latency():
+    with FakeCraigslist(listings=5, latency=0.02) as server:
+        proxied_get(server, 'http://sfbay.craigslist.org/search/boo')
+        status, _, body = proxied_get(server, f'{server.url}/_fakelist/stats')
+
+    stats = json.loads(body)
+    assert status == 200
+    assert stats['requests'] == 1
+    assert stats['latencies'][0] >= 0.02
@@ -0,0 +1,101 @@
+import threading
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from craigsail.db import CraigsailDB
+from craigsail.ingest import IngestWriter
+from craigsail.instrument import RunMetrics
+
+
+def postings(ids, city='sfbay', price='$10'):
+    return pd.DataFrame([{'id': str(i), 'name': f'Boat {i}', 'price': price, 'city': city} for i in ids])
+
+
+@pytest.fixture
+def db(tmp_path):
+    return CraigsailDB(str(tmp_path / 'craigsail.db'), metrics=RunMetrics())
+
+
+def test_writer_totals_match_save_listings(db):
+    with IngestWriter(db) as writer:
+        writer.put(postings(range(3)), 'boo')
+        writer.put(postings(range(2), price='$20'), 'boo')
+        writer.put(postings([9]), 'bia')
+
+    assert tuple(writer.result) == (4, 2, 6)
+    assert tuple(writer.totals['boo']) == (3, 2, 5)
+    assert len(db.load_listings()) == 4
+
+
+def test_writer_groups_batches_into_one_commit(db):
+    writer = IngestWriter(db, batch_rows=1000, flush_seconds=5)
+    for start in range(0, 50, 10):
+        writer.put(postings(range(start, start + 10)), 'boo')
+    writer.start().close()
+
+    assert writer.commits == 1
+    save = db.metrics.summary()['stages']['save']
+    assert (save['calls'], save['rows'], save['batches']) == (1, 50, 5)
+    assert len(db.load_listings()) == 50
+
+
+def test_writer_commits_when_batch_fills(db):
+    writer = IngestWriter(db, batch_rows=10, flush_seconds=5)
+    for start in range(0, 30, 10):
+        writer.put(postings(range(start, start + 10)), 'boo')
+    writer.start().close()
+
+    assert writer.commits == 3
+
+
+def test_delist_sees_the_shard_saved_before_it(db):
+    db.save_listings(postings(['old']), category='boo')
+
+    with IngestWriter(db) as writer:
+        writer.put(postings(['new']), 'boo')
+        writer.delist('boo', 'sfbay', ['new'])
+
+    assert writer.delisted['boo'] == 1
+    assert db.load_listings(live_only=True)['id'].tolist() == ['new']
+
+
+def test_put_blocks_while_the_queue_is_full(db):
+    release = threading.Event()
+    original = db.write_records
+
+    def slow_write(conn, records):
+        release.wait(5)
+        return original(conn, records)
+
+    writer = IngestWriter(db, max_batches=1, batch_rows=1)
+    with patch.object(db, 'write_records', slow_write):
+        writer.start()
+        writer.put(postings([1]), 'boo')   # taken by the writer, which stalls
+        writer.put(postings([2]), 'boo')   # fills the queue
+
+        blocked = threading.Thread(target=writer.put, args=(postings([3]), 'boo'))
+        blocked.start()
+        blocked.join(0.3)
+        assert blocked.is_alive()
+
+        release.set()
+        blocked.join(5)
+        assert not blocked.is_alive()
+        writer.close()
+
+    assert writer.result.inserted == 3
+
+
+def test_writer_failure_reaches_producers(db):
+    writer = IngestWriter(db, max_batches=1, batch_rows=1)
+    with patch.object(db, 'write_records', side_effect=RuntimeError('disk full')):
+        writer.start()
+        with pytest.raises(RuntimeError, match='ingest writer failed'):
+            for i in range(10):
+                writer.put(postings([i]), 'boo')
+        with pytest.raises(RuntimeError):
+            writer.close()
+
+    assert isinstance(writer.error, RuntimeError)
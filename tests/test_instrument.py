@@ -0,0 +1,63 @@
+import io
+import json
+import pstats
+
+from craigsail.instrument import NULL_METRICS, RunMetrics, profiled
+
+
+def test_stage_records_time_and_counters():
+    metrics = RunMetrics()
+    with metrics.stage('fetch', city='sfbay') as stage:
+        stage['rows'] = 10
+    with metrics.stage('fetch', city='seattle') as stage:
+        stage['rows'] = 5
+
+    summary = metrics.summary()
+    assert summary['stages']['fetch']['calls'] == 2
+    assert summary['stages']['fetch']['rows'] == 15
+    assert summary['stages']['fetch']['seconds'] >= 0
+    assert [record['city'] for record in summary['cities']] == ['sfbay', 'seattle']
+
+
+def test_stage_is_recorded_even_when_it_raises():
+    metrics = RunMetrics()
+    try:
+        with metrics.stage('fetch', city='sfbay'):
+            raise RuntimeError('network down')
+    except RuntimeError:
+        pass
+    assert metrics.stages[0]['stage'] == 'fetch'
+
+
+def test_counters_accumulate():
+    metrics = RunMetrics()
+    metrics.count('db_statements')
+    metrics.count('db_statements', 2)
+    assert metrics.summary()['counters'] == {'db_statements': 3}
+
+
+def test_log_stream_gets_one_json_line_per_stage():
+    stream = io.StringIO()
+    metrics = RunMetrics(log_stream=stream)
+    with metrics.stage('save') as stage:
+        stage['rows'] = 3
+
+    line = json.loads(stream.getvalue())
+    assert line['stage'] == 'save'
+    assert line['rows'] == 3
+
+
+def test_null_metrics_records_nothing():
+    with NULL_METRICS.stage('fetch') as stage:
+        stage['rows'] = 1
+    NULL_METRICS.count('db_statements')
+
+    assert NULL_METRICS.stages == []
+    assert NULL_METRICS.summary()['counters'] == {}
+
+
+def test_profiled_writes_cprofile_stats(tmp_path):
+    path = tmp_path / 'run.prof'
+    with profiled(path):
+        sum(range(1000))
+    assert pstats.Stats(str(path)).total_calls > 0
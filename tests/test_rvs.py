@@ -14,4 +14,15 @@ def test_combine_city_rv_data(rvs_instance):
 
 def test_clean_city_rv_data(rvs_instance):
     # Placeholder for actual test
-    pass
\ No newline at end of file
+    pass
+
+def test_prep_results_types_odometer_and_year(rvs_instance):
+    df = pd.DataFrame({
+        'name': ['2004 Winnebago Adventurer'],
+        'price': ['$38,500'],
+        'attrs': [['odometer: 61,200', 'rv type: class A']],
+    })
+    prepped = rvs_instance.prep_results(df)
+    assert prepped['odometer'].tolist() == [61200]
+    assert prepped['year manufactured'].tolist() == [2004]
+    assert prepped['rv type'].tolist() == ['class A']
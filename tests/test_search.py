@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock
 import pandas as pd
 from pathlib import Path
+from craigsail.instrument import RunMetrics
 from craigsail.search import Search
 
 @pytest.fixture
@@ -79,6 +80,24 @@ def test_get_city_items(mock_clfs, search_instance):
     city_df = search_instance.get_city_items('city1')
     assert len(city_df) == 2
 
+@patch('craigsail.search.clfs')
+def test_get_city_items_records_fetch_metrics(mock_clfs):
+    metrics = RunMetrics()
+    search = Search(search_category='boo', data_path='test_path', cities=['city1'], metrics=metrics)
+    mock_clfs.return_value.get_results.return_value = [{'name': 'item1'}, {'name': 'item2'}]
+
+    search.get_city_items('city1')
+
+    stage = metrics.stages[0]
+    assert (stage['stage'], stage['city'], stage['rows']) == ('fetch', 'city1', 2)
+    assert stage['bytes'] > 0
+
+@patch('craigsail.search.json.dumps', side_effect=AssertionError('results serialised without metrics'))
+@patch('craigsail.search.clfs')
+def test_get_city_items_skips_byte_count_without_metrics(mock_clfs, mock_dumps, search_instance):
+    mock_clfs.return_value.get_results.return_value = [{'name': 'item1'}]
+    assert len(search_instance.get_city_items('city1')) == 1
+
 @patch('craigsail.search.pd.to_datetime')
 def test_get_all_daily_postings(mock_to_datetime, search_instance):
     mock_to_datetime.side_effect = [pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-02')]
@@ -124,3 +143,30 @@ def test_merge_multiple_csvs(search_instance, tmp_path):
     assert 'price_day1' in merged_df.columns
     assert 'price_day2' in merged_df.columns
     assert len(merged_df) == 2
+
+def test_attribute_columns_in_first_seen_order():
+    attrs = pd.Series([['b: 1', 'a: 2'], None, ['c: 3', 'no colon', 'a: 4']])
+    assert Search.attribute_columns(attrs) == ['b', 'a', 'c']
+
+def test_prep_results_tolerates_missing_attrs(search_instance):
+    df = pd.DataFrame({'id': ['1', '2'], 'price': ['$1,200', 'call']})
+    prepped = search_instance.prep_results(df)
+    assert prepped['price'].tolist()[0] == 1200.0
+    assert pd.isna(prepped['price'][1])
+    assert prepped['id'].tolist() == ['1', '2']
+
+def test_apply_column_types():
+    class Typed(Search):
+        COLUMN_TYPES = {'a': 'float', 'b': 'int', 'c': 'year', 'd': 'text', 'e': 'bool'}
+
+    df = pd.DataFrame({
+        'a': ['30 ft', None], 'b': ['12,345', 'n/a'], 'c': ['built 1979', '27'],
+        'd': [' good ', None], 'e': ['Yes', 'no'],
+    })
+    typed = Typed(search_category='x', data_path='p').apply_column_types(df)
+
+    assert typed['a'].tolist()[0] == 30.0 and pd.isna(typed['a'][1])
+    assert typed['b'].tolist() == [12345, None]
+    assert typed['c'].tolist() == [1979, None]
+    assert typed['d'].tolist()[0] == 'good' and pd.isna(typed['d'][1])
+    assert typed['e'].tolist() == [True, False]
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from craigsail.search import Boats
+from craigsail.synthetic import generate_city_results, generate_frame
+
+
+def test_generate_frame_is_seeded():
+    pd.testing.assert_frame_equal(generate_frame(50, seed=3), generate_frame(50, seed=3))
+    assert not generate_frame(50, seed=3).equals(generate_frame(50, seed=4))
+
+
+def test_generate_frame_looks_like_a_sweep():
+    df = generate_frame(500, seed=1, cities=['sfbay', 'seattle'])
+
+    assert len(df) == 500
+    assert df['id'].is_unique
+    assert set(df['city']) == {'sfbay', 'seattle'}
+    assert {'id', 'name', 'url', 'price', 'where', 'geotag', 'body', 'attrs'} <= set(df.columns)
+
+
+def test_generate_frame_includes_the_mess():
+    df = generate_frame(2000, seed=1)
+    attribute_keys = {attr.split(':', 1)[0] for attrs in df['attrs'] for attr in attrs}
+
+    assert set(Boats.COLUMN_ALIASES) & attribute_keys
+    assert df['price'].isna().any()
+    assert (df['price'] == 'please call').any()
+    assert df['geotag'].map(lambda geotag: isinstance(geotag, str)).any()
+
+
+def test_generate_city_results_groups_by_city():
+    results = generate_city_results(100, seed=2, cities=['sfbay', 'boston'])
+
+    assert set(results) == {'sfbay', 'boston'}
+    assert sum(len(rows) for rows in results.values()) == 100
+    assert 'city' not in results['sfbay'][0]
@@ -1,7 +1,17 @@
+import gzip
+import json
+import threading
+import time
+
 import pandas as pd
 import pytest
 
+from flask import Flask
+
 from craigsail.db import CraigsailDB
+import web_app.cache as web_cache
+from web_app.cache import ResponseCache
+from web_app.payload import BINARY_MIMETYPE, decode_binary
 from web_app.app import create_app
 
 
@@ -62,12 +72,137 @@ def test_map_filters_by_category(client):
     assert client.get('/map?category=bia').get_json()['count'] == 0
 
 
+def test_map_columnar_format_has_parallel_arrays(client):
+    data = client.get('/map?format=columnar').get_json()
+
+    assert data['count'] == 2
+    columns = data['columns']
+    assert len(columns['lat']) == len(columns['name']) == len(columns['city']) == 2
+    by_name = dict(zip(columns['name'], zip(columns['price'], columns['city'])))
+    assert by_name['Pricey boat'] == (9000.0, data['cities'].index('seattle'))
+    assert data['price_min'] == 1000.0
+
+
+def test_map_binary_format_round_trips(client):
+    response = client.get('/map', headers={'Accept': BINARY_MIMETYPE})
+
+    assert response.mimetype == BINARY_MIMETYPE
+    header, arrays = decode_binary(response.data)
+    assert header['count'] == 2
+    position = header['strings']['name'].index('Cheap boat')
+    assert arrays['lat'][position] == pytest.approx(37.85, abs=1e-4)
+    assert arrays['lon'][position] == pytest.approx(-122.48, abs=1e-4)
+    assert arrays['price'][position] == 1000.0
+    assert header['cities'][arrays['city'][position]] == 'sfbay'
+    assert header['strings']['url'][position] == 'http://x/1'
+
+
+def test_map_binary_payload_is_smaller_than_json(client):
+    json_size = len(client.get('/map').data)
+    binary_size = len(client.get('/map?format=binary').data)
+    assert binary_size < json_size
+
+
+def test_map_formats_are_cached_separately(client):
+    assert client.get('/map').is_json
+    assert client.get('/map', headers={'Accept': BINARY_MIMETYPE}).mimetype == BINARY_MIMETYPE
+    assert 'Accept' in client.get('/map').headers['Vary']
+
+
+def stream_events(client, query='', headers=None):
+    client.application.config.update(STREAM_POLL=0, STREAM_SECONDS=0)
+    response = client.get(f'/map/stream{query}', headers=headers or {})
+    assert response.mimetype == 'text/event-stream'
+
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+    return events
+
+
+def test_map_reports_change_seq_for_the_stream(client):
+    assert client.get('/map').get_json()['change_seq'] == 3  # one insert per fixture listing
+
+
+def test_map_stream_sends_deltas_after_since(client):
+    db = CraigsailDB(client.application.config['DB_PATH'])
+    db.save_listings(pd.DataFrame([
+        {'id': '1', 'name': 'Cheap boat', 'url': 'http://x/1', 'city': 'sfbay',
+         'price': '$800', 'where': 'sausalito', 'geotag': (37.85, -122.48), 'has_image': True},
+    ]), category='boo')
+    db.mark_delisted('boo', 'seattle', seen_ids=['other'])
+
+    events = stream_events(client, '?since=3')
+
+    assert [(kind, data['id']) for kind, _, data in events] == [('price', '1'), ('delist', '2')]
+    assert events[0][2]['price'] == 800.0
+    assert events[0][2]['location'] == [37.85, -122.48]
+
+    # A reconnecting EventSource resumes from Last-Event-ID.
+    resumed = stream_events(client, '?since=3', headers={'Last-Event-ID': str(events[0][1])})
+    assert [kind for kind, _, _ in resumed] == ['delist']
+    assert stream_events(client, '?since=3&city=sfbay') == events[:1]
+
+
+def test_map_stream_without_since_starts_at_latest(client):
+    assert stream_events(client) == []
+
+
+def test_map_stream_rejects_bad_event_id(client):
+    assert client.get('/map/stream?since=abc').status_code == 400
+
+
+def test_map_hides_delisted_listings(tmp_path):
+    db_path = tmp_path / 'craigsail.db'
+    db = CraigsailDB(str(db_path))
+    db.save_listings(pd.DataFrame([
+        {'id': '1', 'name': 'Sold boat', 'url': 'http://x/1', 'city': 'sfbay',
+         'price': '$1,000', 'geotag': (37.85, -122.48)},
+    ]), category='boo')
+    db.mark_delisted('boo', 'sfbay', seen_ids=['2'])
+
+    app = create_app(db_path=str(db_path))
+    assert app.test_client().get('/map').get_json()['count'] == 0
+
+
 def test_categories_endpoint(client):
     payload = client.get('/categories').get_json()
     assert payload['categories'] == ['boo']
     assert payload['cities'] == ['seattle', 'sfbay']
 
 
+def test_map_best_deals(tmp_path):
+    db = CraigsailDB(str(tmp_path / 'craigsail.db'))
+    db.save_listings(pd.DataFrame([
+        {'id': str(i), 'name': 'Boat', 'city': 'sfbay', 'price': 1000 + 100 * i, 'geotag': (37.8, -122.4)}
+        for i in range(40)
+    ]), category='boo')
+    db.fit_deal_model('boo')
+    client = create_app(db_path=str(db.db_path)).test_client()
+
+    markers = client.get('/map?best=3').get_json()['markers']
+
+    assert [marker['id'] for marker in markers] == ['0', '1', '2']  # cheapest for the same boat
+    assert client.get('/map?best=none').status_code == 400
+
+
+def test_comparables_endpoint(client):
+    payload = client.get('/comparables/1?k=2').get_json()
+
+    assert payload['listing_id'] == '1'
+    # A listing without a location ranks behind one 1,000km away.
+    assert [c['id'] for c in payload['comparables']] == ['2', '3']
+    assert [c['price'] for c in payload['comparables']] == [9000.0, 500.0]
+
+
+def test_comparables_endpoint_rejects_bad_requests(client):
+    assert client.get('/comparables/nope').status_code == 404
+    assert client.get('/comparables/1?k=zero').status_code == 400
+    assert client.get('/comparables/1?k=0').status_code == 400
+
+
 def test_empty_database_is_handled(tmp_path):
     app = create_app(db_path=str(tmp_path / 'empty.db'))
     app.config.update(TESTING=True)
@@ -76,3 +211,158 @@ def test_empty_database_is_handled(tmp_path):
     assert payload['count'] == 0
     assert payload['markers'] == []
     assert payload['map_center'] == [37.7749, -122.4194]
+
+
+def test_metrics_endpoint_reports_route_latency_and_rows(client):
+    client.get('/map')
+    client.get('/map?city=seattle')
+
+    text = client.get('/metrics').get_data(as_text=True)
+
+    assert 'craigsail_http_request_duration_seconds_count{route="/map",method="GET",status="200"} 2' in text
+    assert 'craigsail_db_rows_scanned_total{route="/map"} 3' in text
+    assert 'craigsail_http_response_bytes_bucket{route="/map",le="+Inf"} 2' in text
+    assert 'craigsail_data_age_seconds ' in text
+
+
+def test_metrics_content_type(client):
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+
+
+def test_healthz_reports_freshness(client):
+    payload = client.get('/healthz').get_json()
+
+    assert payload['status'] == 'ok'
+    assert payload['fresh'] is True
+    assert payload['data_version'] >= 1
+    assert payload['data_age_seconds'] < 60
+
+
+def test_healthz_on_empty_database(tmp_path):
+    app = create_app(db_path=str(tmp_path / 'empty.db'))
+    payload = app.test_client().get('/healthz').get_json()
+
+    assert payload['status'] == 'ok'
+    assert payload['last_ingest'] is None
+    assert payload['fresh'] is False
+
+
+def test_healthz_reports_unreachable_database(tmp_path):
+    app = create_app(db_path=str(tmp_path / 'not-a-dir' / 'x.db'))
+    (tmp_path / 'not-a-dir').write_text('a file where the directory should be')
+
+    response = app.test_client().get('/healthz')
+    assert response.status_code == 503
+
+
+def test_repeat_map_request_is_served_from_cache(client):
+    first = client.get('/map')
+    second = client.get('/map')
+
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.get_json() == second.get_json()
+    metrics = client.application.extensions['craigsail_metrics']
+    assert metrics.cache.get('/map', 'miss') == 1
+    assert metrics.cache.get('/map', 'hit') == 1
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.get('/map').headers['ETag']
+    response = client.get('/map', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_query_params_are_cached_separately(client):
+    assert client.get('/map?city=seattle').get_json()['count'] == 1
+    assert client.get('/map').get_json()['count'] == 2
+    assert client.get('/map?city=seattle').headers['ETag'] != client.get('/map').headers['ETag']
+
+
+def test_new_ingest_invalidates_cached_map(tmp_path):
+    db_path = tmp_path / 'craigsail.db'
+    db = CraigsailDB(str(db_path))
+    row = {'id': '1', 'name': 'Boat', 'url': 'http://x/1', 'city': 'sfbay',
+           'price': '$1,000', 'geotag': (37.85, -122.48)}
+    db.save_listings(pd.DataFrame([row]), category='boo')
+    client = create_app(db_path=str(db_path)).test_client()
+    etag = client.get('/map').headers['ETag']
+
+    db.save_listings(pd.DataFrame([row | {'price': '$800'}]), category='boo')
+    response = client.get('/map', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.get_json()['markers'][0]['price'] == 800.0
+
+
+def test_large_payload_is_gzipped(tmp_path):
+    db_path = tmp_path / 'craigsail.db'
+    CraigsailDB(str(db_path)).save_listings(pd.DataFrame([
+        {'id': str(i), 'name': f'Boat {i}', 'url': f'http://x/{i}', 'city': 'sfbay',
+         'price': f'${i},000', 'geotag': (37.8, -122.4)}
+        for i in range(1, 60)
+    ]), category='boo')
+    client = create_app(db_path=str(db_path)).test_client()
+
+    response = client.get('/map', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['count'] == 59
+    assert response.headers['ETag'].endswith('-gzip"')
+
+    # The gzip ETag still matches the identity representation's content.
+    assert client.get('/map', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def cached_app(max_bytes=64 * 1024 * 1024):
+    app = Flask(__name__)
+    cache = ResponseCache(version=lambda: 1, max_bytes=max_bytes)
+
+    @app.route('/page/<int:size>')
+    @cache.cached
+    def page(size):
+        return {'text': 'x' * size}
+
+    return app, cache
+
+
+def test_concurrent_first_requests_compress_once(monkeypatch):
+    app, cache = cached_app()
+    calls = []
+
+    def slow_encode(body, encoding):
+        calls.append(encoding)
+        time.sleep(0.05)
+        return gzip.compress(body, mtime=0)
+
+    monkeypatch.setattr(web_cache, '_encode', slow_encode)
+    app.test_client().get('/page/4000')                  # cached, identity only
+    threads = [
+        threading.Thread(target=app.test_client().get, args=('/page/4000',),
+                         kwargs={'headers': {'Accept-Encoding': 'gzip'}})
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['gzip']
+    assert cache.bytes == sum(entry.size for entry in cache.entries.values())
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    app, cache = cached_app(max_bytes=10_000)
+    client = app.test_client()
+
+    for path in ('/page/3000', '/page/3001', '/page/3002'):
+        client.get(path)
+    client.get('/page/3000')                             # now the most recent
+    client.get('/page/3003')
+
+    assert [key[0] for key in cache.entries] == ['/page/3002', '/page/3000', '/page/3003']
+    assert cache.bytes == sum(entry.size for entry in cache.entries.values()) <= 10_000
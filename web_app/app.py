@@ -5,37 +5,123 @@ Reads from the sqlite database populated by the craigsail CLI rather than
 scraping on every request - a live multi-city scrape takes minutes and would
 time out the browser.
 
+Operational endpoints:
+    /metrics  Prometheus text format: latency per route, response sizes,
+              sqlite query time, rows scanned, cache lookups, data age.
+    /healthz  DB reachability and data freshness, without touching listings.
+
+/map/stream pushes marker deltas as Server-Sent Events, so an open page
+follows an ingest without refetching /map.
+
+/comparables/<listing_id> returns the listings most like one listing, with
+their prices, from CraigsailDB.comparables.
+
+/map and /categories are served from a ResponseCache keyed on the database's
+data version, with ETags and gzip/brotli - see web_app/cache.py.
+
 Run:
     CRAIGSAIL_DB=data/craigsail.db flask --app web_app.app run
 """
+import json
 import os
+import sqlite3
+import time
 
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
+import pandas as pd
 
 from craigsail.db import CraigsailDB
+from web_app import payload
+from web_app.cache import ResponseCache
+from web_app.metrics import Registry
 
 # Fallback map centre (San Francisco) used when no listing has coordinates.
 DEFAULT_CENTER = [37.7749, -122.4194]
 
+# /healthz reports the data as stale once the last ingest is older than this.
+DEFAULT_STALE_AFTER = 2 * 24 * 3600
+
+# Most change rows /map/stream reads per poll.
+STREAM_BATCH = 1000
+
+# Most listings /comparables returns, whatever ?k= asks for.
+MAX_COMPARABLES = 200
+
 
 def create_app(db_path=None):
     app = Flask(__name__)
     app.config['DB_PATH'] = db_path or os.environ.get('CRAIGSAIL_DB', 'data/craigsail.db')
+    app.config['STALE_AFTER'] = int(os.environ.get('CRAIGSAIL_STALE_AFTER', DEFAULT_STALE_AFTER))
+    app.config['STREAM_POLL'] = float(os.environ.get('CRAIGSAIL_STREAM_POLL', 2))
+    app.config['STREAM_SECONDS'] = float(os.environ.get('CRAIGSAIL_STREAM_SECONDS', 300))
+
+    metrics = Registry()
+    app.extensions['craigsail_metrics'] = metrics
+    databases = {}
 
     def get_db():
-        return CraigsailDB(app.config['DB_PATH'])
+        # Opening a CraigsailDB runs the schema/migration check, so do it
+        # once per app rather than on every request.
+        path = app.config['DB_PATH']
+        if path not in databases:
+            databases[path] = CraigsailDB(path)
+        return databases[path]
+
+    def data_age_seconds():
+        try:
+            last_ingest = get_db().last_ingest()
+        except (sqlite3.Error, OSError):
+            return None
+        if last_ingest is None:
+            return None
+        return time.time() - _timestamp(last_ingest)
+
+    cache = ResponseCache(
+        version=lambda: get_db().data_version(),
+        max_bytes=int(os.environ.get('CRAIGSAIL_CACHE_BYTES', 64 * 1024 * 1024)),
+        on_lookup=lambda route, result: metrics.cache.inc(route, result),
+    )
+    app.extensions['craigsail_cache'] = cache
+
+    metrics.add_gauge(
+        'craigsail_data_age_seconds', 'Seconds since the last ingest wrote to the database.',
+        data_age_seconds,
+    )
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.request_seconds.observe(
+                time.perf_counter() - started, route, request.method, str(response.status_code)
+            )
+        if not response.is_streamed:
+            metrics.response_bytes.observe(response.calculate_content_length() or 0, route)
+        return response
+
+    def load_listings(route, **kwargs):
+        with metrics.db_seconds.time('load_listings'):
+            df = get_db().load_listings(**kwargs)
+        metrics.rows_scanned.inc(route, value=len(df))
+        return df
 
     @app.route('/')
     def index():
         return render_template('index.html')
 
     @app.route('/categories')
+    @cache.cached
     def categories():
         """
         Distinct category/city pairs, so the UI can offer real choices
         instead of hardcoded placeholders.
         """
-        df = get_db().load_listings()
+        df = load_listings('/categories')
         if df.empty:
             return jsonify({'categories': [], 'cities': []})
 
@@ -45,47 +131,151 @@ def create_app(db_path=None):
         })
 
     @app.route('/map')
+    @cache.cached(vary=('Accept',))
     def map_view():
         """
-        GeoJSON-ish marker payload for Leaflet, filtered by optional
-        ?category= and ?city= query params.
+        Marker payload for Leaflet, filtered by optional ?category= and
+        ?city= query params. ?best=N keeps only the N best deals (highest
+        deal_score), best first. ?format=columnar|binary (or the matching
+        Accept type) returns the compact encodings from web_app/payload.py.
         """
-        df = get_db().load_listings(
+        best = request.args.get('best')
+        if best is not None and not (best.isdigit() and int(best) > 0):
+            return jsonify({'error': f'invalid best {best!r}'}), 400
+
+        change_seq = get_db().latest_change()
+        df = load_listings(
+            '/map',
             category=request.args.get('category'),
             city=request.args.get('city'),
             with_geo_only=True,
+            live_only=True,
+            top_deals=None if best is None else int(best),
         )
+        columns = payload.marker_columns(df)
 
-        if df.empty:
-            return jsonify({'map_center': DEFAULT_CENTER, 'markers': [], 'count': 0})
-
-        prices = df['price'].dropna()
-        price_min = float(prices.min()) if not prices.empty else None
-        price_max = float(prices.max()) if not prices.empty else None
-
-        markers = []
-        for _, row in df.iterrows():
-            price = None if row['price'] is None or row['price'] != row['price'] else float(row['price'])
-            markers.append({
-                'location': [float(row['latitude']), float(row['longitude'])],
-                'name': row['name'],
-                'url': row['url'],
-                'city': row['city'],
-                'price': price,
-                'where': row['where_'],
-            })
+        encoding = payload.negotiate_format(request)
+        if encoding == 'binary':
+            body = payload.encode_binary(columns, DEFAULT_CENTER, change_seq)
+            return Response(body, mimetype=payload.BINARY_MIMETYPE)
+        if encoding == 'columnar':
+            return jsonify(payload.encode_columnar(columns, DEFAULT_CENTER, change_seq))
+        return jsonify(payload.encode_json(columns, DEFAULT_CENTER, change_seq))
+
+    @app.route('/map/stream')
+    def map_stream():
+        """
+        Server-Sent Events feed of marker deltas - insert, price and delist
+        events - after ?since= (the change_seq /map returned) or the
+        Last-Event-ID a reconnecting EventSource sends. Takes the same
+        ?category= and ?city= filters as /map.
+
+        Each connection polls listing_changes every STREAM_POLL seconds and
+        closes after STREAM_SECONDS; EventSource reconnects on its own and
+        resumes from the last event id.
+        """
+        category = request.args.get('category')
+        city = request.args.get('city')
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            return jsonify({'error': f'invalid event id {since!r}'}), 400
+
+        db = get_db()
+        poll = app.config['STREAM_POLL']
+        deadline = time.monotonic() + app.config['STREAM_SECONDS']
+
+        def events(seq):
+            if seq is None:
+                seq = db.latest_change()
+            yield f'retry: {int(poll * 1000)}\n\n'
+            while True:
+                with metrics.db_seconds.time('changes_since'):
+                    changes = db.changes_since(seq, category=category, city=city, limit=STREAM_BATCH)
+                for change in changes:
+                    seq = change['seq']
+                    data = json.dumps(payload.change_event(change))
+                    yield f'id: {seq}\nevent: {change["kind"]}\ndata: {data}\n\n'
+                if len(changes) == STREAM_BATCH:
+                    continue  # more backlog waiting; don't sleep on it
+                if time.monotonic() >= deadline:
+                    return
+                time.sleep(poll)
+                yield ': keepalive\n\n'
+
+        return Response(
+            events(since),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @app.route('/comparables/<listing_id>')
+    @cache.cached
+    def comparables(listing_id):
+        """
+        The ?k= (default 20) listings most like listing_id, nearest first,
+        with their prices and the features they were matched on.
+        """
+        try:
+            k = int(request.args.get('k', 20))
+        except ValueError:
+            return jsonify({'error': f'invalid k {request.args["k"]!r}'}), 400
+        if not 0 < k <= MAX_COMPARABLES:
+            return jsonify({'error': f'k must be between 1 and {MAX_COMPARABLES}'}), 400
+
+        try:
+            with metrics.db_seconds.time('comparables'):
+                df = get_db().comparables(listing_id, k=k)
+        except KeyError:
+            return jsonify({'error': f'unknown listing {listing_id!r}'}), 404
+        metrics.rows_scanned.inc('/comparables/<listing_id>', value=len(df))
 
         return jsonify({
-            'map_center': [float(df['latitude'].mean()), float(df['longitude'].mean())],
-            'markers': markers,
-            'count': len(markers),
-            'price_min': price_min,
-            'price_max': price_max,
+            'listing_id': listing_id,
+            'comparables': df.astype(object).where(df.notna(), None).to_dict('records'),
+        })
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.route('/healthz')
+    def healthz():
+        """
+        Cheap liveness/freshness probe: reads two meta rows, never listings.
+        """
+        try:
+            with metrics.db_seconds.time('healthz'):
+                db = get_db()
+                last_ingest = db.last_ingest()
+                data_version = db.data_version()
+        except (sqlite3.Error, OSError) as exc:
+            return jsonify({'status': 'error', 'database': 'unreachable', 'error': str(exc)}), 503
+
+        age = None if last_ingest is None else time.time() - _timestamp(last_ingest)
+        return jsonify({
+            'status': 'ok',
+            'database': 'ok',
+            'last_ingest': last_ingest,
+            'data_age_seconds': age,
+            'data_version': data_version,
+            'fresh': age is not None and age <= app.config['STALE_AFTER'],
         })
 
     return app
 
 
+def _timestamp(iso):
+    """
+    Seconds since the epoch for an ISO timestamp written by CraigsailDB.
+    """
+    timestamp = pd.Timestamp(iso)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.timestamp()
+
+
 app = create_app()
 
 
@@ -0,0 +1,258 @@
+"""
+ASGI serving mode for the map service.
+
+The Flask routes are unchanged; AsgiAdapter runs each request's WSGI call
+on a bounded thread pool, so the event loop keeps accepting connections
+while pandas loads listings, and caps how many requests run at once:
+
+    threads          DB/render threads shared by all requests.
+    max_concurrency  requests admitted at once (running or waiting for a
+                     thread). Past this a request queues on the event loop.
+    queue_timeout    how long a queued request waits before it gets a 503
+                     with Retry-After, so overload sheds load instead of
+                     piling up latency.
+    max_streams      concurrent /map/stream connections. These hold a
+                     thread from their own pool for as long as they are
+                     open, so they can never starve ordinary requests.
+
+Run (the `serve` extra installs uvicorn):
+    CRAIGSAIL_DB=data/craigsail.db uvicorn web_app.asgi:app --host 0.0.0.0 --port 5000
+
+Tuned with CRAIGSAIL_DB_THREADS, CRAIGSAIL_MAX_CONCURRENCY,
+CRAIGSAIL_QUEUE_TIMEOUT and CRAIGSAIL_MAX_STREAMS; WEB_CONCURRENCY sets
+uvicorn's worker process count.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import sys
+
+from web_app.app import create_app
+
+# Content types whose bodies are produced incrementally and must be sent
+# chunk by chunk rather than buffered.
+STREAMING_TYPES = ('text/event-stream',)
+
+
+def _latin1(value):
+    return value.encode('latin-1') if isinstance(value, str) else value
+
+
+class AsgiAdapter:
+    """
+    Serve a WSGI app over ASGI with a bounded thread pool and admission
+    control.
+
+    Usage:
+        app = AsgiAdapter(create_app(), threads=8, max_concurrency=64)
+    """
+
+    def __init__(self, wsgi_app, threads=8, max_concurrency=64, queue_timeout=5.0, max_streams=32):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_streams = max_streams
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='craigsail-db')
+        self.stream_executor = ThreadPoolExecutor(max_streams, thread_name_prefix='craigsail-stream')
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.inflight = 0
+        self.streams = 0
+        self.rejected = 0  # these three counters are only touched on the event loop
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f'Unsupported ASGI scope type {scope["type"]!r}.')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.stream_executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            await self._reject(send, 'server busy')
+            return
+
+        self.inflight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            environ = self.environ(scope, await self._read_body(receive))
+            status, headers, body = await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        finally:
+            self.inflight -= 1
+            self.slots.release()
+
+        if isinstance(body, bytes):
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': body})
+        else:
+            await self._stream(body, status, headers, receive, send)
+
+    async def _stream(self, chunks, status, headers, receive, send):
+        """
+        Relay a streaming body one chunk at a time from the stream pool,
+        stopping when the client disconnects.
+        """
+        loop = asyncio.get_running_loop()
+        if self.streams >= self.max_streams:
+            self.rejected += 1
+            await loop.run_in_executor(self.stream_executor, _close, chunks)
+            await self._reject(send, 'too many open streams')
+            return
+
+        self.streams += 1
+        iterator = iter(chunks)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(self.stream_executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await loop.run_in_executor(self.stream_executor, _close, chunks)
+            self.streams -= 1
+
+    def _call_wsgi(self, environ):
+        """
+        Run the WSGI app on a pool thread. Returns (status, headers, body):
+        body is the full bytes, or for a streaming content type the
+        WSGI iterable to relay.
+        """
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (_latin1(name.lower()), _latin1(value)) for name, value in response_headers
+            ]
+            return lambda data: None  # the legacy write() callable; Flask never uses it
+
+        result = self.wsgi_app(environ, start_response)
+        content_type = dict(started['headers']).get(b'content-type', b'').decode('latin-1')
+        if content_type.split(';', 1)[0].strip() in STREAMING_TYPES:
+            return started['status'], started['headers'], result
+        try:
+            return started['status'], started['headers'], b''.join(result)
+        finally:
+            _close(result)
+
+    @staticmethod
+    def environ(scope, body):
+        """
+        The PEP 3333 environ for an ASGI http scope.
+        """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return body
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    async def _reject(self, send, reason):
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'retry-after', b'1')],
+        })
+        await send({'type': 'http.response.body', 'body': reason.encode('utf-8')})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _close(iterable):
+    close = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+
+def create_asgi_app(db_path=None):
+    """
+    The Flask app wrapped for ASGI, configured from the environment, with
+    the adapter's load exported on /metrics.
+    """
+    flask_app = create_app(db_path)
+    adapter = AsgiAdapter(
+        flask_app,
+        threads=int(os.environ.get('CRAIGSAIL_DB_THREADS', 8)),
+        max_concurrency=int(os.environ.get('CRAIGSAIL_MAX_CONCURRENCY', 64)),
+        queue_timeout=float(os.environ.get('CRAIGSAIL_QUEUE_TIMEOUT', 5)),
+        max_streams=int(os.environ.get('CRAIGSAIL_MAX_STREAMS', 32)),
+    )
+
+    metrics = flask_app.extensions['craigsail_metrics']
+    metrics.add_gauge(
+        'craigsail_asgi_inflight_requests', 'Requests admitted and not yet rendered.',
+        lambda: adapter.inflight,
+    )
+    metrics.add_gauge(
+        'craigsail_asgi_open_streams', 'Open /map/stream connections.',
+        lambda: adapter.streams,
+    )
+    metrics.add_counter(
+        'craigsail_asgi_rejected_requests_total', 'Requests turned away with a 503.',
+        lambda: adapter.rejected,
+    )
+    return adapter
+
+
+app = create_asgi_app()
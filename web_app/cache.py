@@ -0,0 +1,210 @@
+"""
+Response cache for the read-only JSON endpoints.
+
+The map data only changes when a CLI sweep commits, and every such commit
+bumps CraigsailDB.data_version(). Responses are cached keyed on
+(path, query string, data version), so a cached entry is valid until the
+next write without any invalidation logic.
+
+Each entry carries a strong ETag; a browser sending it back in
+If-None-Match gets a bodyless 304. Bodies are compressed once per encoding
+(brotli when the optional `brotli` package is installed, otherwise gzip) and
+the compressed bytes are cached too.
+"""
+from collections import OrderedDict
+import functools
+import gzip
+import hashlib
+import threading
+
+from flask import Response, make_response, request
+
+# Compressing tiny bodies costs more than it saves.
+MIN_COMPRESS_BYTES = 1024
+
+# brotli is optional; gzip from the standard library is always available.
+brotli = None
+
+
+def _load_brotli():
+    global brotli
+    if brotli is None:
+        try:
+            import brotli as brotli_module
+        except ImportError:
+            brotli_module = False
+        brotli = brotli_module
+    return brotli
+
+
+def _encode(body, encoding):
+    if encoding == 'br':
+        return _load_brotli().compress(body, quality=5)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output, and so the ETag, deterministic.
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+class CacheEntry:
+
+    def __init__(self, body, status, content_type, etag):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.etag = etag
+        self.encoded = {'identity': body}
+        self.charged = 0  # bytes ResponseCache has counted for this entry
+        self.lock = threading.Lock()
+
+    def encoded_body(self, encoding):
+        body = self.encoded.get(encoding)
+        if body is not None:
+            return body
+        # Concurrent first requests wait for one compression rather than
+        # each running their own.
+        with self.lock:
+            if encoding not in self.encoded:
+                self.encoded[encoding] = _encode(self.body, encoding)
+            return self.encoded[encoding]
+
+    @property
+    def size(self):
+        return sum(len(body) for body in self.encoded.values())
+
+
+class ResponseCache:
+    """
+    Bounded LRU of rendered responses.
+
+    Usage:
+        cache = ResponseCache(version=lambda: db.data_version(), on_lookup=...)
+
+        @app.route('/map')
+        @cache.cached
+        def map_view(): ...
+    """
+
+    def __init__(self, version, max_bytes=64 * 1024 * 1024, on_lookup=None):
+        """
+        version is called per request and returns the current data version.
+        on_lookup(route, result) is told 'hit', 'miss' or 'not_modified'
+        for every lookup, for metrics.
+        """
+        self.version = version
+        self.max_bytes = max_bytes
+        self.on_lookup = on_lookup or (lambda route, result: None)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def key(self, version, vary=()):
+        return (
+            request.path,
+            tuple(sorted(request.args.items(multi=True))),
+            tuple(request.headers.get(header, '') for header in vary),
+            version,
+        )
+
+    def cached(self, view=None, vary=()):
+        """
+        Decorate a view returning a JSON response. vary lists request
+        headers (besides Accept-Encoding) that change the response.
+        """
+        if view is None:
+            return functools.partial(self.cached, vary=tuple(vary))
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            route = request.url_rule.rule if request.url_rule else request.path
+            key = self.key(self.version(), vary)
+
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+
+            if entry is None:
+                result = 'miss'
+                entry = self._render(view, *args, **kwargs)
+                if entry.status == 200:
+                    self._store(key, entry)
+            else:
+                result = 'hit'
+
+            encoding = self._negotiate(entry)
+            etag = entry.etag if encoding == 'identity' else f'{entry.etag}-{encoding}'
+
+            if entry.status == 200 and self._not_modified(entry.etag):
+                self.on_lookup(route, 'not_modified')
+                response = Response(status=304)
+            else:
+                self.on_lookup(route, result)
+                body = entry.encoded_body(encoding)
+                self._charge(key, entry)
+                response = Response(body, status=entry.status, content_type=entry.content_type)
+                if encoding != 'identity':
+                    response.headers['Content-Encoding'] = encoding
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'  # always revalidate; 304s are cheap
+            response.vary.update(('Accept-Encoding',) + tuple(vary))
+            return response
+
+        return wrapper
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _render(self, view, *args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        body = response.get_data()
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        return CacheEntry(body, response.status_code, response.content_type, etag)
+
+    def _store(self, key, entry):
+        with self.lock:
+            replaced = self.entries.pop(key, None)
+            if replaced is not None:
+                self.bytes -= replaced.charged
+            self.entries[key] = entry
+        self._charge(key, entry)
+
+    def _charge(self, key, entry):
+        """
+        Count whatever entry has grown by (a new encoding) against
+        max_bytes, then evict least recently used entries until the cache
+        fits. An entry already evicted is not counted.
+        """
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return
+            size = entry.size
+            self.bytes += size - entry.charged
+            entry.charged = size
+            while self.entries and self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.charged
+
+    @staticmethod
+    def _not_modified(base_etag):
+        # Any encoding of the same body counts: the client holds that content.
+        if request.if_none_match.star_tag:
+            return True
+        return any(
+            tag.split('-', 1)[0] == base_etag
+            for tag in request.if_none_match.as_set(include_weak=True)
+        )
+
+    @staticmethod
+    def _negotiate(entry):
+        if len(entry.body) < MIN_COMPRESS_BYTES:
+            return 'identity'
+        accepted = request.accept_encodings
+        if _load_brotli() and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return 'identity'
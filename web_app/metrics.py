@@ -0,0 +1,168 @@
+"""
+Minimal Prometheus text-format metrics for the map service.
+
+Only counters and histograms are needed, so this avoids a dependency on
+prometheus_client. Each app gets its own Registry (see create_app), which
+keeps test apps from sharing numbers.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+import time
+
+# Request latency buckets in seconds: a cached /categories should land in
+# the first few, an uncached /map over a big database in the last.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Response size buckets in bytes.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, value=1):
+        with self.lock:
+            self.values[label_values] += value
+
+    def get(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, label_values)} {value:g}')
+        return lines
+
+
+class Gauge:
+    """
+    A value computed when /metrics is scraped rather than tracked.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, collect):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+
+    def render(self):
+        value = self.collect()
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        if value is not None:
+            lines.append(f'{self.name} {value:g}')
+        return lines
+
+
+class CollectedCounter(Gauge):
+    """
+    A running total kept by someone else (the ASGI adapter, say), read when
+    /metrics is scraped. Only ever goes up, so it is typed as a counter.
+    """
+
+    kind = 'counter'
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            counts, totals = self.series.setdefault(label_values, ([0] * len(self.buckets), [0, 0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            totals[0] += 1
+            totals[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values):
+        series = self.series.get(label_values)
+        return series[1][0] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, (count, total)) in sorted(self.series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _labels(self.label_names + ('le',), label_values + (f'{bound:g}',))
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _labels(self.label_names + ('le',), label_values + ('+Inf',))
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {total:g}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """
+    The metrics one map service exposes.
+    """
+
+    def __init__(self):
+        self.request_seconds = Histogram(
+            'craigsail_http_request_duration_seconds', 'Request latency by route.',
+            labels=('route', 'method', 'status'),
+        )
+        self.response_bytes = Histogram(
+            'craigsail_http_response_bytes', 'Response body size by route.',
+            labels=('route',), buckets=SIZE_BUCKETS,
+        )
+        self.db_seconds = Histogram(
+            'craigsail_db_query_duration_seconds', 'Time spent in sqlite queries by query.',
+            labels=('query',),
+        )
+        self.rows_scanned = Counter(
+            'craigsail_db_rows_scanned_total', 'Listing rows read from sqlite by route.',
+            labels=('route',),
+        )
+        self.cache = Counter(
+            'craigsail_http_cache_requests_total', 'Response cache lookups by route and result.',
+            labels=('route', 'result'),
+        )
+        self.metrics = [
+            self.request_seconds, self.response_bytes, self.db_seconds, self.rows_scanned, self.cache,
+        ]
+
+    def add_gauge(self, name, help_text, collect):
+        self.metrics.append(Gauge(name, help_text, collect))
+
+    def add_counter(self, name, help_text, collect):
+        self.metrics.append(CollectedCounter(name, help_text, collect))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
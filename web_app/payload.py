@@ -0,0 +1,196 @@
+"""
+Marker payload encodings for /map.
+
+json      the original array of marker objects. Every marker repeats the
+          keys, which roughly triples the size of the data.
+columnar  one JSON array per field, with city names dictionary-encoded.
+binary    application/vnd.craigsail.markers: a small JSON header carrying
+          the string columns, followed by little-endian typed arrays the
+          browser can view without parsing:
+
+              4 bytes   magic b'CSM1'
+              4 bytes   uint32 header length H
+              H bytes   utf-8 JSON header, space-padded to a multiple of 4
+              4N bytes  float32 latitude
+              4N bytes  float32 longitude
+              4N bytes  float32 price (NaN = no price)
+              2N bytes  uint16 index into header['cities']
+
+The format is picked with ?format= or the Accept header; json stays the
+default so existing clients keep working.
+"""
+import json
+import struct
+
+import numpy as np
+
+BINARY_MAGIC = b'CSM1'
+BINARY_MIMETYPE = 'application/vnd.craigsail.markers'
+COLUMNAR_MIMETYPE = 'application/vnd.craigsail.columnar+json'
+
+FORMATS = ('json', 'columnar', 'binary')
+
+
+def negotiate_format(request):
+    """
+    ?format= wins; otherwise the first of our vendor types the client
+    accepts; otherwise plain json.
+    """
+    requested = request.args.get('format')
+    if requested in FORMATS:
+        return requested
+
+    best = request.accept_mimetypes.best_match([BINARY_MIMETYPE, COLUMNAR_MIMETYPE, 'application/json'])
+    if best == BINARY_MIMETYPE:
+        return 'binary'
+    if best == COLUMNAR_MIMETYPE:
+        return 'columnar'
+    return 'json'
+
+
+def marker_columns(df):
+    """
+    Pull the marker fields out of a listings frame as plain columns.
+    Strings are None where missing; prices are float64 with NaN.
+    """
+    def strings(column):
+        values = df[column].astype(object)
+        return values.where(values.notna(), None).tolist()
+
+    return {
+        'id': strings('id'),
+        'lat': df['latitude'].to_numpy(dtype='float64'),
+        'lon': df['longitude'].to_numpy(dtype='float64'),
+        'price': df['price'].to_numpy(dtype='float64'),
+        'name': strings('name'),
+        'url': strings('url'),
+        'city': strings('city'),
+        'where': strings('where_'),
+    }
+
+
+def summary(columns, default_center, change_seq=None):
+    """
+    The fields every format shares: count, centre, price range, and the
+    listing_changes position the data reflects, for /map/stream to resume
+    from.
+    """
+    count = len(columns['id'])
+    prices = columns['price'][~np.isnan(columns['price'])]
+    return {
+        'map_center': (
+            [float(columns['lat'].mean()), float(columns['lon'].mean())] if count else default_center
+        ),
+        'count': count,
+        'price_min': float(prices.min()) if prices.size else None,
+        'price_max': float(prices.max()) if prices.size else None,
+        'change_seq': change_seq,
+    }
+
+
+def _prices_or_none(prices):
+    return [None if np.isnan(price) else float(price) for price in prices]
+
+
+def encode_json(columns, default_center, change_seq=None):
+    markers = [
+        {
+            'id': listing_id,
+            'location': [lat, lon],
+            'name': name,
+            'url': url,
+            'city': city,
+            'price': price,
+            'where': where,
+        }
+        for listing_id, lat, lon, name, url, city, price, where in zip(
+            columns['id'], columns['lat'].tolist(), columns['lon'].tolist(), columns['name'],
+            columns['url'], columns['city'], _prices_or_none(columns['price']), columns['where'],
+        )
+    ]
+    return {**summary(columns, default_center, change_seq), 'markers': markers}
+
+
+def change_event(change):
+    """
+    One CraigsailDB.changes_since row as a /map/stream event: the marker in
+    the json format's shape, or just the id for a delisting.
+    """
+    if change['kind'] == 'delist':
+        return {'id': change['id']}
+    return {
+        'id': change['id'],
+        'location': [change['latitude'], change['longitude']],
+        'name': change['name'],
+        'url': change['url'],
+        'city': change['city'],
+        'price': change['price'],
+        'where': change['where_'],
+    }
+
+
+def _city_table(cities):
+    table = sorted({city for city in cities if city is not None})
+    index = {city: position for position, city in enumerate(table)}
+    # Missing cities point one past the end of the table.
+    return table, [index.get(city, len(table)) for city in cities]
+
+
+def encode_columnar(columns, default_center, change_seq=None):
+    cities, city_index = _city_table(columns['city'])
+    return {
+        **summary(columns, default_center, change_seq),
+        'format': 'columnar',
+        'cities': cities,
+        'columns': {
+            'id': columns['id'],
+            'lat': columns['lat'].tolist(),
+            'lon': columns['lon'].tolist(),
+            'price': _prices_or_none(columns['price']),
+            'name': columns['name'],
+            'url': columns['url'],
+            'city': city_index,
+            'where': columns['where'],
+        },
+    }
+
+
+def encode_binary(columns, default_center, change_seq=None):
+    cities, city_index = _city_table(columns['city'])
+    header = {
+        **summary(columns, default_center, change_seq),
+        'format': 'binary',
+        'cities': cities,
+        'strings': {key: columns[key] for key in ('id', 'name', 'url', 'where')},
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 4)  # keep the float32 arrays 4-byte aligned
+
+    return b''.join([
+        BINARY_MAGIC,
+        struct.pack('<I', len(header_bytes)),
+        header_bytes,
+        columns['lat'].astype('<f4').tobytes(),
+        columns['lon'].astype('<f4').tobytes(),
+        columns['price'].astype('<f4').tobytes(),
+        np.asarray(city_index, dtype='<u2').tobytes(),
+    ])
+
+
+def decode_binary(payload):
+    """
+    Inverse of encode_binary - the Python twin of the decoder in
+    index.html, used by the tests and handy for debugging.
+    """
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError('Not a craigsail marker payload.')
+    (header_length,) = struct.unpack('<I', payload[4:8])
+    header = json.loads(payload[8:8 + header_length])
+
+    count = header['count']
+    offset = 8 + header_length
+    arrays = {}
+    for name, dtype in (('lat', '<f4'), ('lon', '<f4'), ('price', '<f4'), ('city', '<u2')):
+        arrays[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += arrays[name].nbytes
+    return header, arrays